@@ -7,6 +7,8 @@ from alembic import context
 
 from db import Base
 from models.event import Event, Heartbeat
+from models.device import DeviceLiveness, HeartbeatMinute
+from models.attendance import DailyAttendance
 from core import config as settings
 
 import os
@@ -0,0 +1,30 @@
+"""created_at server default
+
+Revision ID: a9d2e4f7c130
+Revises: f3a1c6d9b827
+Create Date: 2026-10-17 19:26:48.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d2e4f7c130'
+down_revision: Union[str, None] = 'f3a1c6d9b827'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('events', 'created_at', server_default=sa.text('now()'))
+    op.alter_column('heartbeats', 'created_at', server_default=sa.text('now()'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('heartbeats', 'created_at', server_default=None)
+    op.alter_column('events', 'created_at', server_default=None)
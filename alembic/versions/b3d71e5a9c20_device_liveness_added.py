@@ -0,0 +1,48 @@
+"""device liveness added
+
+Revision ID: b3d71e5a9c20
+Revises: 432bd4f36f3b
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d71e5a9c20'
+down_revision: Union[str, None] = '432bd4f36f3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('device_liveness',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.String(), nullable=False),
+    sa.Column('last_seen', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('active_post_count', sa.Integer(), nullable=False),
+    sa.Column('event_state', sa.String(), nullable=False),
+    sa.Column('event_description', sa.String(), nullable=False),
+    sa.Column('beat_count', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id')
+    )
+    op.create_table('heartbeat_minutes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.String(), nullable=False),
+    sa.Column('minute', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('beat_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id', 'minute', name='uq_heartbeat_minutes_device_minute')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('heartbeat_minutes')
+    op.drop_table('device_liveness')
@@ -0,0 +1,40 @@
+"""unique device serial on events
+
+Revision ID: c8e4f2a61d93
+Revises: b3d71e5a9c20
+Create Date: 2026-10-17 10:04:17.552310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e4f2a61d93'
+down_revision: Union[str, None] = 'b3d71e5a9c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the first copy of every retransmitted event before adding the constraint. A
+    # retransmission repeats the time; the same serial at another time follows a device
+    # reset that restarted the numbering and is a different event.
+    op.execute(
+        """
+        DELETE FROM events a
+        USING events b
+        WHERE a.device_id = b.device_id
+          AND a.serial_no = b.serial_no
+          AND a.date_time = b.date_time
+          AND a.id > b.id
+        """
+    )
+    op.create_unique_constraint('uq_events_device_serial', 'events', ['device_id', 'serial_no', 'date_time'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_events_device_serial', 'events', type_='unique')
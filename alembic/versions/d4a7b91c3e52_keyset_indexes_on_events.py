@@ -0,0 +1,43 @@
+"""keyset indexes on events
+
+Revision ID: d4a7b91c3e52
+Revises: c8e4f2a61d93
+Create Date: 2026-10-17 14:21:48.107563
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7b91c3e52'
+down_revision: Union[str, None] = 'c8e4f2a61d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The composite indexes also serve equality lookups on their first column,
+# so the single-column indexes they replace are dropped.
+KEYSET_INDEXES = {
+    'ix_events_date_time_id': (['date_time', 'id'], 'ix_events_date_time', ['date_time']),
+    'ix_events_device_id_date_time_id': (['device_id', 'date_time', 'id'], 'ix_events_device_id', ['device_id']),
+    'ix_events_person_id_date_time_id': (['person_id', 'date_time', 'id'], 'ix_events_person_id', ['person_id']),
+    'ix_events_attendance_status_date_time_id': (['attendance_status', 'date_time', 'id'], 'ix_events_attendance_status', ['attendance_status']),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps ingestion running while the indexes are built
+    with op.get_context().autocommit_block():
+        for name, (columns, replaced, _) in KEYSET_INDEXES.items():
+            op.create_index(name, 'events', columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(replaced, table_name='events', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, (_, replaced, replaced_columns) in KEYSET_INDEXES.items():
+            op.create_index(replaced, 'events', replaced_columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(name, table_name='events', postgresql_concurrently=True, if_exists=True)
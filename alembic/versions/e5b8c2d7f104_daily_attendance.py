@@ -0,0 +1,45 @@
+"""daily attendance
+
+Revision ID: e5b8c2d7f104
+Revises: d4a7b91c3e52
+Create Date: 2026-10-17 15:02:11.734518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c2d7f104'
+down_revision: Union[str, None] = 'd4a7b91c3e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_attendance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('person_id', sa.String(), nullable=False),
+    sa.Column('local_date', sa.Date(), nullable=False),
+    sa.Column('person_name', sa.String(), nullable=True),
+    sa.Column('first_in', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_out', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('first_seen', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_seen', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('swipe_count', sa.Integer(), nullable=False),
+    sa.Column('device_ids', postgresql.ARRAY(sa.String()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('person_id', 'local_date', name='uq_daily_attendance_person_date')
+    )
+    op.create_index('ix_daily_attendance_local_date', 'daily_attendance', ['local_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_attendance_local_date', table_name='daily_attendance')
+    op.drop_table('daily_attendance')
@@ -0,0 +1,185 @@
+"""partition events and heartbeats by month
+
+Revision ID: f3a1c6d9b827
+Revises: e5b8c2d7f104
+Create Date: 2026-10-17 17:41:05.219304
+
+Rebuilds both tables as PARTITION BY RANGE (date_time) parents with one
+partition per UTC month that has rows and a default partition for rows
+outside the created months (devices with a wrong clock). Existing rows are copied, so
+this takes as long as a full rewrite of the tables and should run while
+ingest is stopped. Later months are created by operations.partitions.
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a1c6d9b827'
+down_revision: Union[str, None] = 'e5b8c2d7f104'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+EVENT_COLUMNS = [
+    'id', 'date_time', 'active_post_count', 'event_type', 'event_state', 'event_description', 'device_id',
+    'major_event', 'minor_event', 'serial_no', 'verify_no', 'person_id', 'person_name', 'purpose', 'zone_type',
+    'swipe_card_type', 'card_no', 'card_type', 'user_type', 'current_verify_mode', 'current_event',
+    'front_serial_no', 'attendance_status', 'pictures_number', 'mask', 'picture_url', 'created_at',
+]
+HEARTBEAT_COLUMNS = [
+    'id', 'date_time', 'active_post_count', 'event_type', 'event_state', 'event_description', 'created_at',
+]
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _event_columns(id_default: str) -> list:
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text(id_default), nullable=False),
+        sa.Column('date_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('active_post_count', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('event_state', sa.String(), nullable=False),
+        sa.Column('event_description', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('major_event', sa.Integer(), nullable=False),
+        sa.Column('minor_event', sa.Integer(), nullable=False),
+        sa.Column('serial_no', sa.Integer(), nullable=True),
+        sa.Column('verify_no', sa.Integer(), nullable=True),
+        sa.Column('person_id', sa.String(), nullable=True),
+        sa.Column('person_name', sa.String(), nullable=True),
+        sa.Column('purpose', postgresql.ENUM('att', 'info', name='person_purpose_enum', create_type=False), nullable=True),
+        sa.Column('zone_type', sa.Integer(), nullable=True),
+        sa.Column('swipe_card_type', sa.Integer(), nullable=True),
+        sa.Column('card_no', sa.String(), nullable=True),
+        sa.Column('card_type', sa.Integer(), nullable=True),
+        sa.Column('user_type', sa.String(), nullable=True),
+        sa.Column('current_verify_mode', sa.String(), nullable=True),
+        sa.Column('current_event', sa.Boolean(), nullable=True),
+        sa.Column('front_serial_no', sa.Integer(), nullable=True),
+        sa.Column('attendance_status', sa.String(), nullable=True),
+        sa.Column('pictures_number', sa.Integer(), nullable=True),
+        sa.Column('mask', sa.String(), nullable=True),
+        sa.Column('picture_url', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    ]
+
+
+def _heartbeat_columns(id_default: str) -> list:
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text(id_default), nullable=False),
+        sa.Column('date_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('active_post_count', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('event_state', sa.String(), nullable=False),
+        sa.Column('event_description', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    ]
+
+
+def _event_indexes() -> None:
+    op.create_index('ix_events_id', 'events', ['id'], unique=False)
+    op.create_index('ix_events_person_name', 'events', ['person_name'], unique=False)
+    op.create_index('ix_events_picture_url', 'events', ['picture_url'], unique=False)
+    op.create_index('ix_events_date_time_id', 'events', ['date_time', 'id'], unique=False)
+    op.create_index('ix_events_device_id_date_time_id', 'events', ['device_id', 'date_time', 'id'], unique=False)
+    op.create_index('ix_events_person_id_date_time_id', 'events', ['person_id', 'date_time', 'id'], unique=False)
+    op.create_index('ix_events_attendance_status_date_time_id', 'events', ['attendance_status', 'date_time', 'id'], unique=False)
+
+
+def _heartbeat_indexes() -> None:
+    op.create_index('ix_heartbeats_id', 'heartbeats', ['id'], unique=False)
+    op.create_index('ix_heartbeats_date_time', 'heartbeats', ['date_time'], unique=False)
+
+
+def _set_aside(table: str) -> str:
+    """Rename ``table`` and its indexes out of the way; returns the name of its id sequence."""
+    bind = op.get_bind()
+    op.rename_table(table, f'{table}_old')
+    indexes = bind.execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"),
+        {'table': f'{table}_old'},
+    ).scalars().all()
+    for index in indexes:
+        op.execute(f'ALTER INDEX {index} RENAME TO {index}_old')
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': f'{table}_old'}).scalar()
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    return sequence
+
+
+def _copy_back(table: str, columns: list[str], sequence: str) -> None:
+    names = ', '.join(columns)
+    op.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM {table}_old')
+    op.execute(f'DROP TABLE {table}_old')
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+
+def _create_partitions(table: str) -> None:
+    """A partition for every month that has rows, and for the current and the next MONTHS_AHEAD months."""
+    bind = op.get_bind()
+    months = set(bind.execute(
+        sa.text(f"SELECT DISTINCT date_trunc('month', date_time AT TIME ZONE 'UTC')::date FROM {table}_old")
+    ).scalars())
+    now = datetime.now(timezone.utc)
+    current = date(now.year, now.month, 1)
+    months.update(_add_months(current, offset) for offset in range(MONTHS_AHEAD + 1))
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00+00')"
+        )
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    sequence = _set_aside('events')
+    op.create_table('events',
+    *_event_columns(f"nextval('{sequence}'::regclass)"),
+    sa.PrimaryKeyConstraint('id', 'date_time'),
+    sa.UniqueConstraint('device_id', 'serial_no', 'date_time', name='uq_events_device_serial'),
+    postgresql_partition_by='RANGE (date_time)'
+    )
+    _event_indexes()
+    _create_partitions('events')
+    _copy_back('events', EVENT_COLUMNS, sequence)
+
+    sequence = _set_aside('heartbeats')
+    op.create_table('heartbeats',
+    *_heartbeat_columns(f"nextval('{sequence}'::regclass)"),
+    sa.PrimaryKeyConstraint('id', 'date_time'),
+    postgresql_partition_by='RANGE (date_time)'
+    )
+    _heartbeat_indexes()
+    _create_partitions('heartbeats')
+    _copy_back('heartbeats', HEARTBEAT_COLUMNS, sequence)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    sequence = _set_aside('events')
+    op.create_table('events',
+    *_event_columns(f"nextval('{sequence}'::regclass)"),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id', 'serial_no', 'date_time', name='uq_events_device_serial')
+    )
+    _event_indexes()
+    _copy_back('events', EVENT_COLUMNS, sequence)
+
+    sequence = _set_aside('heartbeats')
+    op.create_table('heartbeats',
+    *_heartbeat_columns(f"nextval('{sequence}'::regclass)"),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _heartbeat_indexes()
+    _copy_back('heartbeats', HEARTBEAT_COLUMNS, sequence)
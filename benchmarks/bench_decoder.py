@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the /hik/events decode path.
+
+Compares the old handler logic (sniff every form value with str(), json.loads,
+build a fresh TypeAdapter, validate_python) with operations.decoder.
+
+    python -m benchmarks.bench_decoder [iterations]
+"""
+import json
+import sys
+import timeit
+from dataclasses import dataclass
+
+from pydantic import TypeAdapter
+
+from operations.decoder import decode_event, find_event_part
+from schemas.events import EventUnion
+
+HEARTBEAT = json.dumps({
+    "dateTime": "2025-06-11T00:52:11+05:00",
+    "activePostCount": 1,
+    "eventType": "heartBeat",
+    "eventState": "active",
+    "eventDescription": "Heartbeat",
+}).encode()
+
+ACCESS_EVENT = json.dumps({
+    "dateTime": "2025-06-11T00:52:11+05:00",
+    "activePostCount": 1,
+    "eventType": "AccessControllerEvent",
+    "eventState": "active",
+    "eventDescription": "Access Controller Event",
+    "deviceID": "Daraja",
+    "AccessControllerEvent": {
+        "deviceName": "Access Controller",
+        "majorEventType": 5,
+        "subEventType": 75,
+        "name": "Umarjon Normurodov",
+        "cardReaderKind": 1,
+        "cardReaderNo": 1,
+        "verifyNo": 225,
+        "employeeNoString": "2ce5f8a3281946c383793db758476729",
+        "serialNo": 613,
+        "userType": "normal",
+        "currentVerifyMode": "cardOrfaceOrPw",
+        "frontSerialNo": 612,
+        "attendanceStatus": "checkIn",
+        "label": "Check In",
+        "statusValue": 0,
+        "mask": "no",
+        "picturesNumber": 1,
+        "purePwdVerifyEnable": True,
+        "FaceRect": {"height": 0.503, "width": 0.285, "x": 0.321, "y": 0.325},
+    },
+}).encode()
+
+
+@dataclass
+class Part:
+    name: str
+    content_type: str | None
+    data: bytes
+
+
+def legacy(payload: bytes):
+    form = {"event_log": payload.decode()}
+    json_string = next((v for k, v in form.items() if "eventType" in str(v)), None)
+    return TypeAdapter(EventUnion).validate_python(json.loads(json_string))
+
+
+def fast(payload: bytes):
+    return decode_event(find_event_part([Part("event_log", "application/json", payload)]))
+
+
+def main(iterations: int = 20000) -> None:
+    for label, payload in (("heartBeat", HEARTBEAT), ("AccessControllerEvent", ACCESS_EVENT)):
+        assert legacy(payload) == fast(payload)
+        old = min(timeit.repeat(lambda: legacy(payload), number=iterations, repeat=3)) / iterations
+        new = min(timeit.repeat(lambda: fast(payload), number=iterations, repeat=3)) / iterations
+        print(f"{label:<22} legacy {old * 1e6:8.2f} us  decoder {new * 1e6:8.2f} us  saved {(old - new) * 1e6:8.2f} us ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
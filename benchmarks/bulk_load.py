@@ -0,0 +1,74 @@
+"""
+Throughput of the COPY bulk loader against the 50k rows/s target.
+
+Loads synthetic events of BENCH_DEVICES devices spread over the last
+months (a share of them without a serial number), then loads the same rows
+again to time a rerun in which everything is skipped. The loader commits
+every chunk, so the rows are deleted again afterwards.
+
+    python -m benchmarks.bulk_load [rows] [chunk_size]
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core import config
+from operations.bulk_load import COLUMNS, load_events
+
+TARGET_ROWS_PER_SECOND = 50_000
+BENCH_DEVICES = 50
+# Every n-th event has no serial number, like some door status events
+NO_SERIAL_EVERY = 20
+
+
+def synthetic_rows(rows: int):
+    start = datetime.now(timezone.utc) - timedelta(days=90)
+    step = timedelta(days=90) / rows
+    for n in range(rows):
+        values = dict.fromkeys(COLUMNS)
+        values.update(
+            date_time=start + n * step,
+            active_post_count=1,
+            event_type="AccessControllerEvent",
+            event_state="active",
+            event_description="bulk load benchmark",
+            device_id=f"bench-load-{n % BENCH_DEVICES}",
+            major_event=5,
+            minor_event=75,
+            serial_no=None if n % NO_SERIAL_EVERY == 0 else n,
+            person_id=str(n % 2000),
+            attendance_status="checkIn" if n % 2 else "checkOut",
+        )
+        yield values
+
+
+def report(name: str, stats: dict) -> float:
+    rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"{name:<8} {stats['rows']:>10} read {stats['inserted']:>10} inserted "
+          f"{stats['seconds']:>8.2f} s {rate:>10.0f} rows/s")
+    return rate
+
+
+async def main(rows: int, chunk_size: int) -> int:
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        rate = report("load", await load_events(synthetic_rows(rows), chunk_size))
+        rerun = await load_events(synthetic_rows(rows), chunk_size)
+        report("rerun", rerun)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM events WHERE device_id LIKE 'bench-load-%'"))
+        await engine.dispose()
+    ok = rate >= TARGET_ROWS_PER_SECOND and rerun["inserted"] == 0
+    print(f"{'ok' if ok else 'FAIL'}: target {TARGET_ROWS_PER_SECOND} rows/s, rerun inserted {rerun['inserted']}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else config.BULK_LOAD_CHUNK_SIZE,
+    )))
@@ -0,0 +1,97 @@
+"""
+Plan check for the GET /hik/events query shapes.
+
+Seeds synthetic events inside a transaction, ANALYZEs, runs EXPLAIN on every
+shape the query API produces and fails when the planner falls back to a
+sequential scan of events or an explicit sort instead of walking one of the
+(…, date_time, id) indexes. Scans and sorts of near-empty partitions are
+cheap whatever the plan and are not counted. The transaction is rolled back, so neither the
+rows nor the statistics survive.
+
+    python -m benchmarks.explain_events [rows]
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core import config
+from operations.queries import EventFilter, encode_cursor, event_page_query
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# Plan nodes estimated below this many rows do not fail the check
+NEGLIGIBLE_ROWS = 1000
+CURSOR = encode_cursor(START + timedelta(days=20), 10**12)
+
+SHAPES = {
+    "all, newest first": (EventFilter(), None, True),
+    "all, oldest first": (EventFilter(), None, False),
+    "all, second page": (EventFilter(), CURSOR, True),
+    "device": (EventFilter(device_id="explain-3"), None, True),
+    "device, time window, second page": (
+        EventFilter(device_id="explain-3", since=START, until=START + timedelta(days=30)), CURSOR, True,
+    ),
+    "person": (EventFilter(person_id="7"), None, True),
+    "person, time window": (EventFilter(person_id="7", since=START + timedelta(days=10)), None, True),
+    "attendance status": (EventFilter(attendance_status="checkIn"), CURSOR, True),
+}
+
+
+async def seed(conn, rows: int) -> None:
+    await conn.execute(
+        text(
+            """
+            INSERT INTO events (date_time, active_post_count, event_type, event_state, event_description,
+                                device_id, major_event, minor_event, serial_no, person_id, attendance_status, created_at)
+            SELECT CAST(:start AS timestamptz) + n * interval '1 minute', 1, 'AccessControllerEvent', 'active', 'explain check',
+                   'explain-' || (n % 50), 5, 75, n, (n % 2000)::text,
+                   (ARRAY['checkIn', 'checkOut', 'breakOut', 'breakIn'])[1 + n % 4], now()
+            FROM generate_series(1, :rows) AS n
+            """
+        ),
+        {"start": START, "rows": rows},
+    )
+    await conn.execute(text("ANALYZE events"))
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def main(rows: int) -> int:
+    engine = create_async_engine(config.DATABASE_URL)
+    failures = 0
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await seed(conn, rows)
+            for name, (event_filter, cursor, descending) in SHAPES.items():
+                query = event_page_query(event_filter, cursor=cursor, limit=100, descending=descending)
+                sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+                result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+                plan = result.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                nodes = list(plan_nodes(plan[0]["Plan"]))
+                costly = [n for n in nodes if n.get("Plan Rows", 0) >= NEGLIGIBLE_ROWS]
+                # events itself or one of its monthly partitions
+                seq_scans = [n for n in costly if n["Node Type"] == "Seq Scan" and n.get("Relation Name", "").startswith("events")]
+                sorts = [n for n in costly if n["Node Type"] in ("Sort", "Incremental Sort")]
+                indexes = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+                ok = not seq_scans and not sorts and indexes
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {name:<36} {', '.join(indexes) or 'no index'}"
+                      f"{' + seq scan' if seq_scans else ''}{' + sort' if sorts else ''}")
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)) else 0)
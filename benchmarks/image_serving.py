@@ -0,0 +1,86 @@
+"""
+Throughput of GET /images under uvicorn, ImageResponse against plain FileResponse.
+
+Uvicorn offers no ``http.response.pathsend``, so ImageResponse cannot hand
+files to sendfile there; this measures what its single-read path gains over
+FileResponse's 64 KiB chunks. A small app serving IMAGES random files of
+the given size from a temporary directory is started in-process and
+fetched by CONCURRENCY clients.
+
+    python -m benchmarks.image_serving [requests] [image_kib]
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import FileResponse
+from starlette.routing import Route
+
+from operations.images import ImageResponse
+
+IMAGES = 200
+CONCURRENCY = 32
+
+
+def make_app(root: str) -> Starlette:
+    def serve(response_class):
+        async def endpoint(request):
+            path = os.path.join(root, request.path_params["name"])
+            return response_class(path, media_type="image/jpeg", stat_result=os.stat(path))
+        return endpoint
+
+    return Starlette(routes=[
+        Route("/file/{name}", serve(FileResponse)),
+        Route("/image/{name}", serve(ImageResponse)),
+    ])
+
+
+async def fetch_all(base_url: str, prefix: str, requests: int) -> float:
+    queue = asyncio.Queue()
+    for n in range(requests):
+        queue.put_nowait(f"{prefix}/{n % IMAGES}.jpg")
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            response = await client.get(queue.get_nowait())
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=CONCURRENCY)) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(CONCURRENCY)))
+        return time.perf_counter() - started
+
+
+async def main(requests: int, image_kib: int) -> None:
+    with tempfile.TemporaryDirectory() as root, socket.socket() as sock:
+        for n in range(IMAGES):
+            with open(os.path.join(root, f"{n}.jpg"), "wb") as f:
+                f.write(os.urandom(image_kib * 1024))
+        sock.bind(("127.0.0.1", 0))
+        server = uvicorn.Server(uvicorn.Config(make_app(root), log_level="warning"))
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+        base_url = "http://127.0.0.1:%d" % sock.getsockname()[1]
+        try:
+            # Warm the page cache and the connections
+            await fetch_all(base_url, "/file", IMAGES)
+            for name, prefix in (("FileResponse", "/file"), ("ImageResponse", "/image")):
+                seconds = await fetch_all(base_url, prefix, requests)
+                print(f"{name:<14} {requests / seconds:>8.0f} req/s {requests * image_kib / 1024 / seconds:>8.1f} MiB/s")
+        finally:
+            server.should_exit = True
+            await task
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 150,
+    ))
@@ -0,0 +1,87 @@
+"""
+Insert and range-query latency of the partitioned events table as history grows.
+
+Inside one transaction, history is added month by month going back from the
+current month; after every step a batch insert into the current month and a
+one-day query for one device are timed. With partition pruning both should
+stay flat however many months lie behind them. The transaction is rolled
+back, so nothing survives.
+
+    python -m benchmarks.partitions [months] [rows_per_month]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core import config
+from operations.partitions import add_months, create_partition_sql, month_start
+from operations.queries import EventFilter, event_page_query
+
+BATCH = 500
+REPEATS = 20
+
+SEED = """
+INSERT INTO events (date_time, active_post_count, event_type, event_state, event_description,
+                    device_id, major_event, minor_event, serial_no, person_id, attendance_status, created_at)
+SELECT CAST(:start AS timestamptz) + (n * CAST(:seconds AS float8) / :rows) * interval '1 second', 1, 'AccessControllerEvent',
+       'active', 'partition benchmark', 'bench-' || (n % 50), 5, 75, :serial + n, (n % 2000)::text,
+       (ARRAY['checkIn', 'checkOut', 'breakOut', 'breakIn'])[1 + n % 4], now()
+FROM generate_series(1, :rows) AS n
+"""
+
+
+async def timed(conn, statement, params=None) -> float:
+    started = time.perf_counter()
+    await conn.execute(statement, params or {})
+    return time.perf_counter() - started
+
+
+async def main(months: int, rows_per_month: int) -> None:
+    engine = create_async_engine(config.DATABASE_URL)
+    now = datetime.now(timezone.utc)
+    current = month_start(now)
+    day = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    query = event_page_query(EventFilter(device_id="bench-7", since=day, until=day + timedelta(days=1)), limit=100)
+    serial = 10**9
+
+    print(f"{'months':>6} {'rows':>10} {'insert p50 ms':>14} {'query p50 ms':>13}")
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            for step in range(months + 1):
+                if step:
+                    month = add_months(current, -step)
+                    await conn.execute(text(create_partition_sql("events", month)))
+                    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+                    seconds = (datetime(current.year, current.month, 1, tzinfo=timezone.utc) - start).total_seconds()
+                    await conn.execute(
+                        text(SEED),
+                        {"start": start, "seconds": min(seconds, 28 * 86400), "rows": rows_per_month, "serial": serial},
+                    )
+                    serial += rows_per_month
+                    await conn.execute(text("ANALYZE events"))
+
+                inserts = []
+                for _ in range(REPEATS):
+                    inserts.append(await timed(
+                        conn, text(SEED), {"start": day, "seconds": 86400, "rows": BATCH, "serial": serial},
+                    ))
+                    serial += BATCH
+                queries = [await timed(conn, query) for _ in range(REPEATS)]
+                print(f"{step:>6} {step * rows_per_month:>10} "
+                      f"{statistics.median(inserts) * 1000:>14.2f} {statistics.median(queries) * 1000:>13.2f}")
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 24,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100_000,
+    ))
@@ -18,3 +18,99 @@ USE_TZ = True
 SAVE_DIR = os.environ.get('SAVE_DIR', 'saved_images')
 
 LOGS_DIR = os.environ.get('LOGS_DIR', 'logs')
+
+# Write-behind batching of event/heartbeat inserts
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+WRITE_BEHIND_MAX_SIZE = int(os.environ.get('WRITE_BEHIND_MAX_SIZE', 10000))
+
+# Largest non-file multipart part (the event JSON) accepted on /hik/events
+MAX_EVENT_FIELD_SIZE = int(os.environ.get('MAX_EVENT_FIELD_SIZE', 64 * 1024))
+
+# Heartbeat storage: "rows" keeps one heartbeats row per beat, "coalesce" only
+# upserts the latest state per device into device_liveness every interval
+HEARTBEAT_MODE = os.environ.get('HEARTBEAT_MODE', 'rows')
+HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get('HEARTBEAT_FLUSH_INTERVAL', 30))
+# "minute" additionally keeps per-device beat counts per minute in heartbeat_minutes
+HEARTBEAT_HISTORY = os.environ.get('HEARTBEAT_HISTORY', 'none')
+
+# Recent event serial numbers remembered per device to drop retransmissions
+DEDUP_SERIALS_PER_DEVICE = int(os.environ.get('DEDUP_SERIALS_PER_DEVICE', 1024))
+
+# Serial gap detection and backfill from the device event log
+GAP_BACKFILL_ENABLED = os.environ.get('GAP_BACKFILL_ENABLED', 'true').lower() == 'true'
+GAP_BACKFILL_INTERVAL = float(os.environ.get('GAP_BACKFILL_INTERVAL', 60))
+# Seconds a gap stays open before backfilling, to let late or out-of-order pushes arrive
+GAP_BACKFILL_GRACE = float(os.environ.get('GAP_BACKFILL_GRACE', 120))
+# Seconds before a scan window searched for the event preceding its first one
+GAP_SCAN_LOOKBACK = float(os.environ.get('GAP_SCAN_LOOKBACK', 3600))
+GAP_MAX_OPEN = int(os.environ.get('GAP_MAX_OPEN', 10000))
+# Larger jumps in serial number are taken for a reset of the device numbering
+GAP_MAX_SIZE = int(os.environ.get('GAP_MAX_SIZE', 10000))
+
+# Async ISAPI client
+ISAPI_TIMEOUT = float(os.environ.get('ISAPI_TIMEOUT', 90))
+ISAPI_MAX_CONNECTIONS = int(os.environ.get('ISAPI_MAX_CONNECTIONS', 100))
+ISAPI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('ISAPI_MAX_KEEPALIVE_CONNECTIONS', 20))
+ISAPI_PER_DEVICE_CONCURRENCY = int(os.environ.get('ISAPI_PER_DEVICE_CONCURRENCY', 2))
+ISAPI_RETRIES = int(os.environ.get('ISAPI_RETRIES', 3))
+ISAPI_RETRY_BACKOFF = float(os.environ.get('ISAPI_RETRY_BACKOFF', 0.5))
+
+# Bulk person provisioning
+PROVISION_BATCH_SIZE = int(os.environ.get('PROVISION_BATCH_SIZE', 50))
+PROVISION_CONCURRENCY = int(os.environ.get('PROVISION_CONCURRENCY', 16))
+
+# Keep daily_attendance (per person and local day) up to date as events are stored;
+# python -m operations.attendance rebuilds it from the events table
+DAILY_ATTENDANCE_ENABLED = os.environ.get('DAILY_ATTENDANCE_ENABLED', 'true').lower() == 'true'
+
+# Monthly range partitions of events and heartbeats (operations.partitions): months
+# created ahead of time, and months kept before the current one until a partition is
+# detached (0 keeps all history). Detached partitions are dropped only with PARTITION_DROP_EXPIRED.
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+PARTITION_CHECK_INTERVAL = float(os.environ.get('PARTITION_CHECK_INTERVAL', 6 * 3600))
+EVENTS_RETENTION_MONTHS = int(os.environ.get('EVENTS_RETENTION_MONTHS', 0))
+HEARTBEATS_RETENTION_MONTHS = int(os.environ.get('HEARTBEATS_RETENTION_MONTHS', 0))
+PARTITION_DROP_EXPIRED = os.environ.get('PARTITION_DROP_EXPIRED', 'false').lower() == 'true'
+
+# Rows per COPY + merge transaction of the bulk loader (python -m operations.bulk_load)
+BULK_LOAD_CHUNK_SIZE = int(os.environ.get('BULK_LOAD_CHUNK_SIZE', 50000))
+
+# Rows fetched per server-side cursor round trip by event exports (/hik/events/export)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+
+# Gateway device registry (EhomeID -> devIndex), reloaded in the background
+DEVICE_REGISTRY_REFRESH_INTERVAL = float(os.environ.get('DEVICE_REGISTRY_REFRESH_INTERVAL', 300))
+DEVICE_REGISTRY_PAGE_SIZE = int(os.environ.get('DEVICE_REGISTRY_PAGE_SIZE', 100))
+# Least seconds between reloads triggered by lookups of unknown devices
+DEVICE_REGISTRY_MISS_REFRESH_INTERVAL = float(os.environ.get('DEVICE_REGISTRY_MISS_REFRESH_INTERVAL', 30))
+
+# Logging: "json" writes one structured record per line, "text" the classic format.
+# Records are handed to a background thread, so request handlers never block on output.
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# Development only: additionally render received events as rich panels
+LOG_PRETTY = os.environ.get('LOG_PRETTY', 'false').lower() == 'true'
+# Share of received events logged per eventType, e.g. "heartBeat=0.01,AccessControllerEvent=1"
+LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+
+# Requests slower than this many seconds are logged with their timing
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+
+# Metrics: with several uvicorn workers, each writes its snapshot to METRICS_DIR
+# and /metrics merges them. Empty means single-process metrics only.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get('METRICS_SNAPSHOT_INTERVAL', 5))
+
+# Thumbnails served as /images/<key>?size=thumb, generated in a process pool
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 320))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+# Thumbnails being generated at once; ingest skips eager generation beyond this
+THUMBNAIL_MAX_PENDING = int(os.environ.get('THUMBNAIL_MAX_PENDING', 256))
+# Seconds a request waits for a lazily generated thumbnail before getting the original
+THUMBNAIL_WAIT = float(os.environ.get('THUMBNAIL_WAIT', 5))
+
+# Image pack compaction (python -m operations.packs): images older than this are
+# moved into append-only pack files of about PACK_SIZE_MB each
+PACK_AFTER_DAYS = float(os.environ.get('PACK_AFTER_DAYS', 30))
+PACK_SIZE_MB = int(os.environ.get('PACK_SIZE_MB', 1024))
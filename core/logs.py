@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+from core import config
+
+# Logger for received events; its records carry the event fields in ``fields``
+event_logger = logging.getLogger("hik.events")
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured ``fields`` passed via ``extra`` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class EventSampler:
+    """Decides per eventType whether a received event is logged."""
+
+    def __init__(self, rates: dict[str, float], default: float = 1.0):
+        self.rates = rates
+        self.default = default
+        self.sampled: dict[str, int] = {}
+        self.skipped: dict[str, int] = {}
+
+    @classmethod
+    def from_string(cls, spec: str) -> "EventSampler":
+        """Parse ``"heartBeat=0.01,AccessControllerEvent=1"``; ``*`` sets the default rate."""
+        rates = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            event_type, _, rate = item.partition("=")
+            rates[event_type.strip()] = min(max(float(rate), 0.0), 1.0)
+        return cls(rates, rates.pop("*", 1.0))
+
+    def should_log(self, event_type: str) -> bool:
+        rate = self.rates.get(event_type, self.default)
+        keep = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+        counts = self.sampled if keep else self.skipped
+        counts[event_type] = counts.get(event_type, 0) + 1
+        return keep
+
+    def stats(self) -> dict:
+        return {"sampled": dict(self.sampled), "skipped": dict(self.skipped), "rates": self.rates, "default": self.default}
+
+
+sampler = EventSampler.from_string(config.LOG_SAMPLE_RATES)
+
+
+def setup_logging() -> None:
+    """
+    Route all logging through a queue drained by a background thread.
+
+    The root logger only gets a ``QueueHandler``; formatting and console I/O
+    happen in the listener thread. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if config.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    handlers = [stream_handler]
+    if config.LOG_PRETTY:
+        from utils import RichPanelHandler
+        handlers.append(RichPanelHandler())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(queue.SimpleQueue()))
+    root.setLevel(config.LOG_LEVEL.upper())
+
+    _listener = logging.handlers.QueueListener(root.handlers[0].queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out everything still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,371 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, roughly doubling from 1 ms to 30 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process and their exchange between worker processes.
+
+    uvicorn runs several workers, each with its own registry. With a
+    ``metrics_dir`` every worker periodically writes its snapshot to
+    ``<metrics_dir>/<pid>.json``; ``collect`` merges all of them, so any
+    worker answering ``/metrics`` reports the whole service. Counters and
+    histograms of workers that have exited are kept so totals never go
+    backwards; their gauges are dropped.
+    """
+
+    def __init__(self, metrics_dir: str | None = None):
+        self.metrics_dir = metrics_dir or None
+        self._metrics: dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        return {"pid": os.getpid(), "metrics": {name: metric.snapshot() for name, metric in self._metrics.items()}}
+
+    def write_snapshot(self) -> None:
+        if not self.metrics_dir:
+            return
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self) -> dict[str, dict]:
+        """This process's live metrics merged with the snapshots of the other workers."""
+        own = self.snapshot()
+        snapshots = [own]
+        if self.metrics_dir:
+            for path in glob.glob(os.path.join(self.metrics_dir, "*.json")):
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    logger.warning(f"Skipping unreadable metrics snapshot {path}")
+                    continue
+                if snapshot["pid"] != own["pid"]:
+                    snapshot["alive"] = _pid_alive(snapshot["pid"])
+                    snapshots.append(snapshot)
+
+        merged: dict[str, dict] = {}
+        for snapshot in snapshots:
+            for name, metric in snapshot["metrics"].items():
+                if metric["type"] == "gauge" and not snapshot.get("alive", True):
+                    continue
+                target = merged.setdefault(name, {**metric, "series": {}})
+                for labels, value in metric["series"]:
+                    labels = tuple(labels)
+                    current = target["series"].get(labels)
+                    if current is None:
+                        target["series"][labels] = value
+                    elif metric["type"] == "histogram":
+                        target["series"][labels] = [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+                    else:
+                        target["series"][labels] = current + value
+        return merged
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labelnames"]
+            for labels, value in sorted(metric["series"].items()):
+                pairs = list(zip(labelnames, labels))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], "+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: MetricsRegistry | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _series(self) -> list[list]:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        return {"type": self.type, "help": self.documentation, "labelnames": list(self.labelnames), "series": self._series()}
+
+
+class Counter(Metric):
+    """Monotonic count per label set."""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: MetricsRegistry | None = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _series(self) -> list[list]:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """
+    Current value per label set.
+
+    Either set explicitly or, with ``set_function``, read when a snapshot is
+    taken, which suits values owned by something else such as a pool size.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: MetricsRegistry | None = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Callable[[], dict[tuple[str, ...], float]] | None = None
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function: Callable[[], dict[tuple[str, ...], float]]) -> None:
+        """``function`` returns the value per label tuple."""
+        self._function = function
+
+    def _series(self) -> list[list]:
+        if self._function is not None:
+            try:
+                return [[list(labels), value] for labels, value in self._function().items()]
+            except Exception:
+                logger.exception(f"Reading gauge {self.name} failed")
+                return []
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """
+    Bucketed distribution per label set, in the Prometheus sense.
+
+    ``observe`` is a bisect and a few list updates. Label values are passed
+    positionally in the order of ``labelnames``.
+    """
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        registry: MetricsRegistry | None = None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+    def _series(self) -> list[list]:
+        with self._lock:
+            return [[list(labels), [list(counts), total]] for labels, (counts, total) in self._values.items()]
+
+    def summary(self) -> list[dict]:
+        """Count, mean and approximate p50/p95/p99 per label set, for /hik/stats."""
+        rows = []
+        for labels, (counts, total) in self._series():
+            count = sum(counts)
+            rows.append({
+                **dict(zip(self.labelnames, labels)),
+                "count": count,
+                "mean": round(total / count, 6) if count else 0.0,
+                "p50": self._quantile(counts, count, 0.5),
+                "p95": self._quantile(counts, count, 0.95),
+                "p99": self._quantile(counts, count, 0.99),
+            })
+        return rows
+
+    def _quantile(self, counts: list[int], count: int, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile; None if it is beyond the last bucket."""
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class SnapshotWriter:
+    """Writes the registry snapshot every ``interval`` seconds and once more on stop."""
+
+    def __init__(self, registry: MetricsRegistry, interval: float):
+        self.registry = registry
+        self.interval = interval
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None and self.registry.metrics_dir:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="metrics-snapshot")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                self.registry.write_snapshot()
+            except OSError:
+                logger.exception("Writing the metrics snapshot failed")
+            if self._stopping.is_set():
+                return
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: list[tuple[str, object]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+REGISTRY = MetricsRegistry(config.METRICS_DIR)
+snapshot_writer = SnapshotWriter(REGISTRY, config.METRICS_SNAPSHOT_INTERVAL)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Wall time of HTTP requests from the first ASGI call to the end of the response.",
+    ("method", "route", "status"),
+)
+ingest_stage_duration = Histogram(
+    "ingest_stage_duration_seconds",
+    "Time spent per ingest stage: parse, validate, image_write and enqueue per request, db_persist per write-behind batch.",
+    ("stage",),
+)
+events_received = Counter(
+    "events_received_total",
+    "Events and heartbeats accepted on /hik/events.",
+    ("device_id", "event_type"),
+)
+events_rejected = Counter(
+    "events_rejected_total",
+    "Uploads on /hik/events that were not stored, by reason.",
+    ("reason",),
+)
+images_stored = Counter(
+    "images_stored_total",
+    "Images written to the content-addressed store; duplicate means the content was already there.",
+    ("result",),
+)
+thumbnails_generated = Counter(
+    "thumbnails_generated_total",
+    "Thumbnail renders by outcome; skipped means the render queue was full.",
+    ("result",),
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Connections of the SQLAlchemy pool by state.",
+    ("state",),
+)
+write_behind_depth = Gauge(
+    "write_behind_queue_depth",
+    "Rows waiting in the write-behind queue.",
+)
+serial_gaps = Counter(
+    "serial_gaps_total",
+    "Holes in stored event serial numbers by outcome: detected, resolved, failed, discarded.",
+    ("result",),
+)
+serial_gaps_open = Gauge(
+    "serial_gaps_open",
+    "Serial gaps whose backfill failed and waits for another attempt.",
+)
+events_backfilled = Counter(
+    "events_backfilled_total",
+    "Events recovered from device event logs by the gap backfill.",
+)
+serial_gap_lag = Histogram(
+    "serial_gap_backfill_lag_seconds",
+    "Time from the detection of a serial gap to the end of its backfill, retries included.",
+    buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 24 * 3600),
+)
+device_registry_lookups = Counter(
+    "device_registry_lookups_total",
+    "Lookups of a deviceID in the cached gateway device list; the hit rate is hit over all.",
+    ("result",),
+)
+device_registry_refreshes = Counter(
+    "device_registry_refreshes_total",
+    "Reloads of the gateway device list by outcome: ok, failed.",
+    ("result",),
+)
+device_registry_devices = Gauge(
+    "device_registry_devices",
+    "Devices in the cached gateway device list.",
+)
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from core import config
+from core.metrics import db_pool_connections
 
 DATABASE_URL = config.DATABASE_URL
 
@@ -15,6 +16,12 @@ engine = create_async_engine(
     pool_pre_ping=True,
 )
 
+db_pool_connections.set_function(lambda: {
+    ("checked_out",): engine.pool.checkedout(),
+    ("idle",): engine.pool.checkedin(),
+    ("overflow",): max(engine.pool.overflow(), 0),
+})
+
 AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False, autocommit=False)
 
 class Base(DeclarativeBase):
@@ -1,39 +1,70 @@
 import os
-import json
 import logging
+import time
 from datetime import datetime
-from fastapi import FastAPI, Request, UploadFile, File, Depends, status
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import ValidationError, TypeAdapter
+from fastapi import FastAPI, Request, Depends, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from schemas.events import HeartbeatInfo, EventNotificationAlert, EventUnion
+from schemas.events import HeartbeatInfo, EventNotificationAlert
 from core import config
-from utils import log_pretty_event, log_pretty_heartbeat
-from operations import crud, operations
+from core.logs import sampler, setup_logging
+from utils import log_event, log_heartbeat
+from operations import attendance, crud
+from operations.write_behind import writer
+from operations.heartbeats import coalescer
+from operations.dedup import recent_serials
+from operations.gaps import backfiller
+from operations.devices import device_registry
+from operations.partitions import partition_manager
+from services.isapi.async_isapi_client import AsyncISAPIService
+from operations.multipart_stream import EventMultipartReader, MultipartStreamError
+from operations.images import image_response
+from operations import export
+from operations.queries import DEFAULT_EVENT_COLUMNS, MAX_PAGE_SIZE, EventFilter, InvalidQuery, list_events
+from operations.thumbnails import thumbnails
 from db import get_async_db
 from models import event as models
 from contextlib import asynccontextmanager
 
-from middleware import ASGIRawLoggerMiddleware
+from core.metrics import (
+    REGISTRY, events_received, events_rejected, http_request_duration, ingest_stage_duration, snapshot_writer,
+)
+from middleware import RequestTimingMiddleware
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up the FastAPI application.")
+    snapshot_writer.start()
+    partition_manager.start()
+    writer.start()
+    coalescer.start()
+    device_registry.start()
+    thumbnails.start()
+    if config.GAP_BACKFILL_ENABLED:
+        backfiller.start()
     yield
     logger.info("Shutting down the FastAPI application.")
+    await backfiller.stop()
+    await device_registry.stop()
+    await AsyncISAPIService.close()
+    await coalescer.stop()
+    await writer.stop()
+    await partition_manager.stop()
+    await snapshot_writer.stop()
+    thumbnails.shutdown()
+
+if config.DAILY_ATTENDANCE_ENABLED:
+    writer.on_insert(models.Event, attendance.EVENT_COLUMNS, attendance.record_events)
 
 app = FastAPI(lifespan=lifespan)
-
-app.mount("/images", StaticFiles(directory="event_images"), name="images")
+app.add_middleware(RequestTimingMiddleware)
 
 # Ensure save directory exists
 os.makedirs(config.SAVE_DIR, exist_ok=True)
@@ -41,76 +72,57 @@ os.makedirs(config.LOGS_DIR, exist_ok=True)
 
 
 @app.post("/hik/events")
-async def receive_event(
-    request: Request,
-    Picture: UploadFile = File(None),
-    db: AsyncSession = Depends(get_async_db)
-) -> dict[str, str]:
+async def receive_event(request: Request) -> dict[str, str]:
     try:
-        form = await request.form()
-
-        # Extract JSON part from form data
-        json_string = next(
-            (v for k, v in form.items() if not isinstance(v, UploadFile) and "eventType" in str(v)),
-            None
-        )
-        if not json_string:
-            return JSONResponse(status_code=400, content={"error": "No valid event JSON found."})
-
-        event_data = json.loads(json_string)
-        
-        # Save image
-        path_name = await operations.save_image(Picture, "Picture")
-        logger.info(f"Image saved at: {path_name}")
-
+        # Stream the body: images go to disk chunk by chunk, only the JSON part is kept.
+        # Retransmitted events are recognised before their images are written.
+        reader = EventMultipartReader(request.headers, request.stream(), accept_event=recent_serials.is_new)
+        started = time.perf_counter()
         try:
-            event = TypeAdapter(EventUnion).validate_python(event_data)
-            if isinstance(event, HeartbeatInfo):
-                log_pretty_heartbeat(event)
-                event_in = models.Heartbeat(
-                    date_time=event.date_time,
-                    active_post_count=event.active_post_count,
-                    event_type=event.event_type,
-                    event_state=event.event_state,
-                    event_description=event.event_description
-                )
-                await crud.create_heartbeat(event_in, db)
-            elif isinstance(event, EventNotificationAlert):
-                log_pretty_event(event)
-                event_in = models.Event(
-                    date_time=event.date_time,
-                    active_post_count=event.active_post_count,
-                    event_type=event.event_type,
-                    event_state=event.event_state,
-                    event_description=event.event_description,
-                    device_id=event.device_id,
-                    major_event=event.access_controller_event.major_event,
-                    minor_event=event.access_controller_event.minor_event,
-                    serial_no=event.access_controller_event.serial_no,
-                    verify_no=event.access_controller_event.verify_no,
-                    person_id=event.access_controller_event.person_id,
-                    person_name=event.access_controller_event.person_name,
-                    purpose=models.PersonPurpose.ATTENDANCE if event.access_controller_event.person_name else models.PersonPurpose.INFORMATION,
-                    zone_type=event.access_controller_event.zone_type,
-                    swipe_card_type=event.access_controller_event.swipe_card_type,
-                    card_no=event.access_controller_event.card_no,
-                    card_type=event.access_controller_event.card_type,
-                    user_type=event.access_controller_event.user_type,
-                    current_verify_mode=event.access_controller_event.current_verify_mode,
-                    current_event=event.access_controller_event.current_event,
-                    front_serial_no=event.access_controller_event.front_serial_no,
-                    attendance_status=event.access_controller_event.attendance_status,
-                    pictures_number=event.access_controller_event.pictures_number,
-                    mask=event.access_controller_event.mask,
-                    picture_url=path_name
-                )
-                await crud.create_event(event_in, db)
-            else:
-                logger.warning("Received unknown event type.")
+            form = await reader.read()
+        except MultipartStreamError as e:
+            events_rejected.inc("malformed")
+            return JSONResponse(status_code=400, content={"error": str(e)})
         except ValidationError as ve:
+            events_rejected.inc("invalid")
             logger.error(f"Validation error: {ve}")
             return JSONResponse(content={"error": str(ve)}, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
-
+        # "parse" is everything else the reader did, including waiting for the body to arrive
+        ingest_stage_duration.observe(time.perf_counter() - started - reader.validate_seconds - reader.image_write_seconds, "parse")
+        ingest_stage_duration.observe(reader.validate_seconds, "validate")
+        if form.files:
+            ingest_stage_duration.observe(reader.image_write_seconds, "image_write")
+
+        event = form.event
+        if event is None:
+            events_rejected.inc("no_event")
+            return JSONResponse(status_code=400, content={"error": "No valid event JSON found."})
+        if not form.accepted:
+            events_rejected.inc("duplicate")
+            logger.info(f"Dropped retransmitted event {event.access_controller_event.serial_no} from {event.device_id}")
+            return JSONResponse(content={"status": "ok"}, status_code=status.HTTP_200_OK)
+        events_received.inc(event.device_id or request.client.host, event.event_type)
+        started = time.perf_counter()
+
+        path_name = form.files.get("Picture")
+        if path_name:
+            logger.info(f"Image saved at: {path_name}")
+        for key in form.files.values():
+            thumbnails.submit(key)
+
+        if isinstance(event, HeartbeatInfo):
+            log_heartbeat(event)
+            if config.HEARTBEAT_MODE == "coalesce":
+                coalescer.record(event.device_id or request.client.host, event)
+            else:
+                await writer.put(models.Heartbeat, crud.heartbeat_values(event))
+        elif isinstance(event, EventNotificationAlert):
+            log_event(event)
+            await writer.put(models.Event, crud.event_values(event, picture_url=path_name))
+            recent_serials.remember(event)
+        else:
+            logger.warning("Received unknown event type.")
+        ingest_stage_duration.observe(time.perf_counter() - started, "enqueue")
 
         return JSONResponse(content={"status": "ok"}, status_code=status.HTTP_200_OK)
 
@@ -118,3 +130,77 @@ async def receive_event(
         logger.exception("Error handling /hik/events")
         logger.error(f"Error: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@app.get("/hik/events")
+async def query_events(
+    device_id: str | None = None,
+    person_id: str | None = None,
+    attendance_status: str | None = None,
+    since: datetime | None = Query(None, description="Inclusive lower bound on date_time"),
+    until: datetime | None = Query(None, description="Exclusive upper bound on date_time"),
+    fields: str | None = Query(None, description="Comma-separated columns to return"),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Page through stored events, newest first by default."""
+    columns = tuple(name.strip() for name in fields.split(",") if name.strip()) if fields else DEFAULT_EVENT_COLUMNS
+    event_filter = EventFilter(device_id, person_id, attendance_status, since, until)
+    try:
+        rows, next_cursor = await list_events(db, event_filter, columns, cursor, limit, order == "desc")
+    except InvalidQuery as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+@app.get("/hik/events/export")
+async def export_events(
+    device_id: str | None = None,
+    person_id: str | None = None,
+    attendance_status: str | None = None,
+    since: datetime | None = Query(None, description="Inclusive lower bound on date_time"),
+    until: datetime | None = Query(None, description="Exclusive upper bound on date_time"),
+    fields: str | None = Query(None, description="Comma-separated columns to export"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+):
+    """Stream every matching event, oldest first, as CSV or NDJSON."""
+    columns = tuple(name.strip() for name in fields.split(",") if name.strip()) if fields else DEFAULT_EVENT_COLUMNS
+    event_filter = EventFilter(device_id, person_id, attendance_status, since, until)
+    try:
+        body = export.export_events(event_filter, columns, format)
+    except InvalidQuery as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    filename = f"events-{datetime.now():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        body, media_type=export.MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.api_route("/images/{key:path}", methods=["GET", "HEAD"])
+async def get_image(key: str, request: Request, size: str | None = None):
+    """Serve an image by the key stored in ``picture_url``; ``?size=thumb`` for a thumbnail."""
+    return await image_response(request, key, size)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text format, merged over all uvicorn workers when METRICS_DIR is set."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/hik/stats")
+async def ingest_stats() -> dict:
+    return {
+        "write_behind": writer.stats(),
+        "heartbeats": coalescer.stats(),
+        "dedup": recent_serials.stats(),
+        "gaps": backfiller.stats(),
+        "devices": device_registry.stats(),
+        "isapi_auth": AsyncISAPIService.AUTH.stats(),
+        "log_sampling": sampler.stats(),
+        "http": http_request_duration.summary(),
+        "thumbnails": thumbnails.stats(),
+        "partitions": partition_manager.stats(),
+    }
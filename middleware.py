@@ -1,15 +1,62 @@
-from typing import Callable
-from starlette.types import ASGIApp, Receive, Scope, Send
 import logging
+import time
 
-logger = logging.getLogger("uvicorn.error")
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from core import config
+from core.metrics import http_request_duration
 
-class ASGIRawLoggerMiddleware:
-    def __init__(self, app: ASGIApp):
+logger = logging.getLogger("hik.http")
+
+
+class RequestTimingMiddleware:
+    """
+    Times every HTTP request and records it in ``http_request_duration``.
+
+    Requests are labelled by the matched route template rather than the raw
+    path, so image URLs do not create a series each. Requests slower than
+    ``slow_threshold`` seconds are logged with their sizes.
+    """
+
+    def __init__(self, app: ASGIApp, slow_threshold: float = config.SLOW_REQUEST_THRESHOLD):
         self.app = app
+        self.slow_threshold = slow_threshold
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
-        logger.info("Request: %s", scope)
-        await self.app(scope, receive, send)
-        logger.info("Response: %s", scope)
\ No newline at end of file
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(elapsed, scope["method"], route_path, str(status_code))
+            if elapsed >= self.slow_threshold:
+                request_bytes = next((value for key, value in scope["headers"] if key == b"content-length"), b"")
+                logger.warning(
+                    f"Slow request {scope['method']} {scope['path']} took {elapsed:.3f}s",
+                    extra={"fields": {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": route_path,
+                        "status": status_code,
+                        "duration": round(elapsed, 6),
+                        "request_bytes": int(request_bytes or 0),
+                        "response_bytes": response_bytes,
+                    }},
+                )
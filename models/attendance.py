@@ -0,0 +1,39 @@
+from sqlalchemy import Date, Index, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import DateTime
+
+from datetime import date, datetime
+from typing import Optional
+
+from db import Base
+
+
+class DailyAttendance(Base):
+    """
+    Attendance per person per local day (``config.TIME_ZONE``), maintained
+    from the events stored at ingest; ``python -m operations.attendance``
+    rebuilds it from ``events``.
+    """
+    __tablename__ = "daily_attendance"
+    __table_args__ = (
+        UniqueConstraint("person_id", "local_date", name="uq_daily_attendance_person_date"),
+        Index("ix_daily_attendance_local_date", "local_date"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    person_id: Mapped[str]
+    local_date: Mapped[date] = mapped_column(Date)
+    person_name: Mapped[Optional[str]] = mapped_column(default=None)
+
+    # Earliest checkIn and latest checkOut; null until the person has one that day
+    first_in: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=None)
+    last_out: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=None)
+    # Earliest and latest attendance event of any status
+    first_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    swipe_count: Mapped[int]
+    device_ids: Mapped[list[str]] = mapped_column(ARRAY(String))
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
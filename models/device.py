@@ -0,0 +1,35 @@
+from sqlalchemy import BigInteger, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import DateTime
+
+from datetime import datetime
+
+from db import Base
+
+
+class DeviceLiveness(Base):
+    """Latest heartbeat state per terminal; one row per device, upserted periodically."""
+    __tablename__ = "device_liveness"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    device_id: Mapped[str] = mapped_column(unique=True)
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    active_post_count: Mapped[int]
+    event_state: Mapped[str]
+    event_description: Mapped[str]
+    beat_count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class HeartbeatMinute(Base):
+    """Downsampled heartbeat history: number of beats per device per minute."""
+    __tablename__ = "heartbeat_minutes"
+    __table_args__ = (UniqueConstraint("device_id", "minute", name="uq_heartbeat_minutes_device_minute"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    device_id: Mapped[str]
+    minute: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    beat_count: Mapped[int]
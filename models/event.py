@@ -1,4 +1,4 @@
-from sqlalchemy import String
+from sqlalchemy import Index, String, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum
@@ -7,7 +7,7 @@ from sqlalchemy.ext.mutable import MutableDict
 
 from enum import Enum
 from typing import Optional
-from datetime import datetime, timezone
+from datetime import datetime
 
 from db import Base
 
@@ -28,23 +28,36 @@ person_purpose_enum = PgEnum(
 
 class Event(Base):
     __tablename__ = "events"
-
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    __table_args__ = (
+        # Terminals retransmit events after network hiccups with the original serial and time, so
+        # each (device, serial, time) is stored once. The time also keeps events whose serial
+        # was reused after a device reset, and a partitioned table's keys need the partition key.
+        UniqueConstraint("device_id", "serial_no", "date_time", name="uq_events_device_serial"),
+        # Keyset pagination on (date_time, id), alone or after an equality filter
+        Index("ix_events_date_time_id", "date_time", "id"),
+        Index("ix_events_device_id_date_time_id", "device_id", "date_time", "id"),
+        Index("ix_events_person_id_date_time_id", "person_id", "date_time", "id"),
+        Index("ix_events_attendance_status_date_time_id", "attendance_status", "date_time", "id"),
+        # Monthly partitions, see operations.partitions
+        {"postgresql_partition_by": "RANGE (date_time)"},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
 
     # Common event fields
-    date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     active_post_count: Mapped[int]
     event_type: Mapped[str] = mapped_column()
     event_state: Mapped[str]
     event_description: Mapped[str]
-    device_id: Mapped[str] = mapped_column(index=True)
+    device_id: Mapped[str] = mapped_column()
 
     # Access controller related (nullable if not applicable)
     major_event: Mapped[int] = mapped_column()
     minor_event: Mapped[int] = mapped_column()
     serial_no: Mapped[Optional[int]] = mapped_column(default=None)
     verify_no: Mapped[Optional[int]] = mapped_column(default=None)
-    person_id: Mapped[Optional[str]] = mapped_column(default=None, index=True)
+    person_id: Mapped[Optional[str]] = mapped_column(default=None)
     person_name: Mapped[Optional[str]] = mapped_column(default=None, index=True)
     purpose: Mapped[Optional[PersonPurpose]] = mapped_column(person_purpose_enum, default=None)
     zone_type: Mapped[Optional[int]] = mapped_column(default=None)
@@ -55,7 +68,7 @@ class Event(Base):
     current_verify_mode: Mapped[Optional[str]] = mapped_column(default=None)
     current_event: Mapped[Optional[bool]] = mapped_column(default=None)
     front_serial_no: Mapped[Optional[int]] = mapped_column(default=None)
-    attendance_status: Mapped[Optional[str]] = mapped_column(default=None, index=True)
+    attendance_status: Mapped[Optional[str]] = mapped_column(default=None)
     pictures_number: Mapped[Optional[int]] = mapped_column(default=None)
     mask: Mapped[Optional[str]] = mapped_column(default=None)
     picture_url: Mapped[Optional[str]] = mapped_column(String, default=None, index=True)
@@ -63,7 +76,7 @@ class Event(Base):
     # # Optional structured metadata (can store raw nested values)
     # event_metadata: Mapped[Optional[dict]] = mapped_column(MutableDict.as_mutable(JSONB), default=None)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     def is_attendance_event(self) -> bool:
         return (
@@ -74,13 +87,14 @@ class Event(Base):
 
 class Heartbeat(Base):
     __tablename__ = "heartbeats"
+    __table_args__ = {"postgresql_partition_by": "RANGE (date_time)"}
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
 
-    date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, index=True)
     active_post_count: Mapped[int]
     event_type: Mapped[str] = mapped_column(default="heartBeat")
     event_state: Mapped[str]
     event_description: Mapped[str]
 
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.now(timezone.utc))
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import String, delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import config
+from db import AsyncSessionLocal
+from models.attendance import DailyAttendance
+from models.event import Event, PersonPurpose
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = ZoneInfo(config.TIME_ZONE)
+CHECK_IN = "checkIn"
+CHECK_OUT = "checkOut"
+
+# Columns returned by the event INSERTs that feed ``record_events``
+EVENT_COLUMNS = (
+    Event.person_id, Event.person_name, Event.purpose, Event.attendance_status, Event.date_time, Event.device_id,
+)
+
+_DEVICE_UNION = literal_column(
+    "ARRAY(SELECT DISTINCT d FROM unnest(daily_attendance.device_ids || excluded.device_ids) AS d ORDER BY d)",
+    ARRAY(String),
+)
+
+
+def is_attendance(row) -> bool:
+    """Same rule as ``Event.is_attendance_event``, plus a person to attribute it to."""
+    return (
+        row["person_id"] is not None
+        and row["attendance_status"] is not None
+        and row["purpose"] == PersonPurpose.ATTENDANCE
+    )
+
+
+def local_date(at: datetime) -> date:
+    return at.astimezone(LOCAL_TZ).date()
+
+
+def summarize(rows: Iterable) -> list[dict]:
+    """
+    Fold event rows into one ``daily_attendance`` row per person and local day.
+
+    The result is sorted by key, so concurrent upserts lock rows in the same
+    order and cannot deadlock each other.
+    """
+    now = datetime.now(timezone.utc)
+    days: dict[tuple[str, date], dict] = {}
+    for row in rows:
+        if not is_attendance(row):
+            continue
+        at = row["date_time"]
+        key = (row["person_id"], local_date(at))
+        day = days.get(key)
+        if day is None:
+            day = days[key] = {
+                "person_id": key[0],
+                "local_date": key[1],
+                "person_name": None,
+                "first_in": None,
+                "last_out": None,
+                "first_seen": at,
+                "last_seen": at,
+                "swipe_count": 0,
+                "device_ids": set(),
+                "updated_at": now,
+            }
+        day["person_name"] = row["person_name"] or day["person_name"]
+        day["first_seen"] = min(day["first_seen"], at)
+        day["last_seen"] = max(day["last_seen"], at)
+        day["swipe_count"] += 1
+        day["device_ids"].add(row["device_id"])
+        status = row["attendance_status"]
+        if status == CHECK_IN and (day["first_in"] is None or at < day["first_in"]):
+            day["first_in"] = at
+        elif status == CHECK_OUT and (day["last_out"] is None or at > day["last_out"]):
+            day["last_out"] = at
+    return [{**day, "device_ids": sorted(day["device_ids"])} for _, day in sorted(days.items())]
+
+
+async def record_events(session: AsyncSession, rows: Iterable) -> None:
+    """
+    Merge newly inserted events into ``daily_attendance``.
+
+    Must run in the transaction that inserted the events and only be given
+    rows that were actually inserted (``RETURNING`` of an insert that skips
+    conflicts), so retransmitted events are not counted twice.
+    """
+    days = summarize(rows)
+    if not days:
+        return
+    statement = insert(DailyAttendance)
+    current, new = DailyAttendance.__table__.c, statement.excluded
+    # least()/greatest() ignore NULLs, so a day without checkIn keeps first_in NULL until one arrives
+    statement = statement.on_conflict_do_update(
+        constraint="uq_daily_attendance_person_date",
+        set_={
+            "person_name": func.coalesce(new.person_name, current.person_name),
+            "first_in": func.least(current.first_in, new.first_in),
+            "last_out": func.greatest(current.last_out, new.last_out),
+            "first_seen": func.least(current.first_seen, new.first_seen),
+            "last_seen": func.greatest(current.last_seen, new.last_seen),
+            "swipe_count": current.swipe_count + new.swipe_count,
+            "device_ids": _DEVICE_UNION,
+            "updated_at": new.updated_at,
+        },
+    )
+    await session.execute(statement, days)
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time(), LOCAL_TZ)
+
+
+async def rebuild(session: AsyncSession, since: date | None = None, until: date | None = None) -> int:
+    """
+    Recompute ``daily_attendance`` from ``events`` for the local days ``since``..``until`` (inclusive).
+
+    The table is locked against the ingest upserts for the duration, so
+    events stored while the rebuild runs are counted exactly once. The
+    caller commits.
+
+    :return: Number of day rows written.
+    """
+    await session.execute(text("LOCK TABLE daily_attendance IN SHARE ROW EXCLUSIVE MODE"))
+
+    # The zone is inlined: as a bound parameter the GROUP BY expression would not match the selected one
+    event_date = func.date(func.timezone(literal_column(f"'{config.TIME_ZONE}'"), Event.date_time))
+    conditions = [
+        Event.purpose == PersonPurpose.ATTENDANCE,
+        Event.attendance_status.is_not(None),
+        Event.person_id.is_not(None),
+    ]
+    stale = delete(DailyAttendance)
+    if since is not None:
+        conditions.append(Event.date_time >= day_start(since))
+        stale = stale.where(DailyAttendance.local_date >= since)
+    if until is not None:
+        conditions.append(Event.date_time < day_start(until + timedelta(days=1)))
+        stale = stale.where(DailyAttendance.local_date <= until)
+
+    days = (
+        select(
+            Event.person_id,
+            event_date,
+            func.max(Event.person_name),
+            func.min(Event.date_time).filter(Event.attendance_status == CHECK_IN),
+            func.max(Event.date_time).filter(Event.attendance_status == CHECK_OUT),
+            func.min(Event.date_time),
+            func.max(Event.date_time),
+            func.count(),
+            func.array_agg(aggregate_order_by(Event.device_id.distinct(), Event.device_id)),
+            func.now(),
+        )
+        .where(*conditions)
+        .group_by(Event.person_id, event_date)
+    )
+    columns = [
+        "person_id", "local_date", "person_name", "first_in", "last_out",
+        "first_seen", "last_seen", "swipe_count", "device_ids", "updated_at",
+    ]
+    await session.execute(stale)
+    result = await session.execute(insert(DailyAttendance).from_select(columns, days))
+    return result.rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild daily_attendance from the stored events.")
+    parser.add_argument("--since", type=date.fromisoformat, help="first local day to rebuild (YYYY-MM-DD), default all")
+    parser.add_argument("--until", type=date.fromisoformat, help="last local day to rebuild (YYYY-MM-DD), default all")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run() -> int:
+        async with AsyncSessionLocal() as session:
+            rows = await rebuild(session, args.since, args.until)
+            await session.commit()
+        return rows
+
+    rows = asyncio.run(run())
+    print(f"Rebuilt {rows} daily attendance rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from core import config
+from db import AsyncSessionLocal
+from models.event import Event
+from operations import attendance
+from operations.crud import event_values, log_event_values
+from operations.devices import device_registry
+from operations.partitions import month_start, partition_manager
+from schemas.events import EventNotificationAlert
+from services.isapi.async_isapi_client import AsyncISAPIService
+
+logger = logging.getLogger(__name__)
+
+# Every column the loader fills; id and created_at come from their defaults
+COLUMNS = [column.name for column in Event.__table__.columns if column.name not in ("id", "created_at")]
+_COLUMN_LIST = ", ".join(COLUMNS)
+_DATE_TIME = COLUMNS.index("date_time")
+
+
+def asyncpg_dsn(url: str) -> str:
+    """The SQLAlchemy ``postgresql+asyncpg://`` URL in the form asyncpg connects with."""
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _record(values: dict) -> tuple:
+    return tuple(value.value if isinstance(value, Enum) else value for value in (values[name] for name in COLUMNS))
+
+
+async def _aiter(rows: Iterable[dict] | AsyncIterable[dict]) -> AsyncIterator[dict]:
+    if hasattr(rows, "__aiter__"):
+        async for values in rows:
+            yield values
+    else:
+        for values in rows:
+            yield values
+
+
+async def load_events(
+    rows: Iterable[dict] | AsyncIterable[dict],
+    chunk_size: int = config.BULK_LOAD_CHUNK_SIZE,
+    dsn: str | None = None,
+) -> dict:
+    """
+    Load events into ``events`` with binary COPY.
+
+    Rows are collected ``chunk_size`` at a time, copied into a temporary
+    staging table and merged with ``INSERT ... SELECT ... ON CONFLICT DO
+    NOTHING``, so events already stored (same device, serial and time) are
+    skipped and a load can be rerun after an interruption. The unique
+    constraint never matches a NULL ``serial_no``, so events without a serial
+    are instead skipped when an event without one with the same device,
+    time, major/minor type and person is already stored. Each chunk commits
+    on its own and is released before the next is read, so memory does not
+    grow with the size of the load.
+
+    History usually predates the partitions the partition manager keeps
+    ahead of the clock, so the month partitions of every chunk are created
+    before it is merged; otherwise its rows would all pile up in the
+    default partition.
+
+    :param rows: Parameter dicts from ``crud.event_values`` or ``crud.log_event_values``.
+    :return: Counts of rows read and inserted, and the date_time range of the inserted ones.
+    """
+    stats = {"rows": 0, "inserted": 0, "seconds": 0.0, "first": None, "last": None}
+    started = time.perf_counter()
+    conn = await asyncpg.connect(dsn or asyncpg_dsn(config.DATABASE_URL))
+    try:
+        await conn.execute(f"CREATE TEMPORARY TABLE events_staging AS SELECT {_COLUMN_LIST} FROM events WITH NO DATA")
+        chunk: list[tuple] = []
+        months: set[date] = set()
+        async for values in _aiter(rows):
+            chunk.append(_record(values))
+            if len(chunk) >= chunk_size:
+                await _ensure_partitions(chunk, months)
+                await _merge(conn, chunk, stats)
+                chunk = []
+        if chunk:
+            await _ensure_partitions(chunk, months)
+            await _merge(conn, chunk, stats)
+    finally:
+        await conn.close()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+async def _ensure_partitions(chunk: list[tuple], ensured: set[date]) -> None:
+    """Create the missing month partitions of ``chunk``; ``ensured`` collects the months already handled."""
+    months = {month_start(record[_DATE_TIME].astimezone(timezone.utc)) for record in chunk} - ensured
+    if months:
+        await partition_manager.ensure_months("events", months)
+        ensured.update(months)
+
+
+async def _merge(conn: asyncpg.Connection, chunk: list[tuple], stats: dict) -> None:
+    started = time.perf_counter()
+    async with conn.transaction():
+        await conn.copy_records_to_table("events_staging", records=chunk, columns=COLUMNS)
+        inserted, first, last = await conn.fetchrow(
+            f"""
+            WITH inserted AS (
+                INSERT INTO events ({_COLUMN_LIST})
+                SELECT {_COLUMN_LIST} FROM events_staging s
+                WHERE s.serial_no IS NOT NULL OR NOT EXISTS (
+                    SELECT 1 FROM events e
+                    WHERE e.serial_no IS NULL
+                      AND e.device_id = s.device_id
+                      AND e.date_time = s.date_time
+                      AND e.major_event = s.major_event
+                      AND e.minor_event = s.minor_event
+                      AND e.person_id IS NOT DISTINCT FROM s.person_id
+                )
+                ON CONFLICT DO NOTHING
+                RETURNING date_time
+            )
+            SELECT count(*), min(date_time), max(date_time) FROM inserted
+            """
+        )
+        await conn.execute("TRUNCATE events_staging")
+    elapsed = time.perf_counter() - started
+    stats["rows"] += len(chunk)
+    stats["inserted"] += inserted
+    if inserted:
+        stats["first"] = min(first, stats["first"] or first)
+        stats["last"] = max(last, stats["last"] or last)
+    logger.info(
+        f"Merged {len(chunk)} rows ({inserted} new) in {elapsed * 1000:.0f} ms, "
+        f"{len(chunk) / elapsed:.0f} rows/s, {stats['rows']} so far"
+    )
+
+
+async def read_ndjson(path: str) -> AsyncIterator[dict]:
+    """Events pushed by terminals, one ``EventNotificationAlert`` JSON per line; invalid lines are skipped."""
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                event = EventNotificationAlert.model_validate_json(line)
+            except ValueError:
+                logger.warning(f"{path}:{number} is not a valid access controller event, skipped")
+                continue
+            yield event_values(event)
+
+
+async def read_devices(device_ids: list[str], since: datetime | None, until: datetime | None) -> AsyncIterator[dict]:
+    """The event logs of several devices, read concurrently through the gateway."""
+    by_index = {await device_registry.dev_index(device_id): device_id for device_id in device_ids}
+    async for dev_index, info in AsyncISAPIService().iter_events_many(by_index, since, until):
+        yield log_event_values(by_index[dev_index], info)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk load past events into the events table.")
+    parser.add_argument("--chunk-size", type=int, default=config.BULK_LOAD_CHUNK_SIZE)
+    parser.add_argument("--no-attendance", action="store_true", help="do not rebuild daily_attendance for the loaded days")
+    sources = parser.add_subparsers(dest="source", required=True)
+    from_file = sources.add_parser("file", help="NDJSON of pushed event JSON")
+    from_file.add_argument("path")
+    from_devices = sources.add_parser("devices", help="event logs of terminals")
+    from_devices.add_argument("device_ids", nargs="+", help="deviceID of every terminal")
+    from_devices.add_argument("--since", type=datetime.fromisoformat)
+    from_devices.add_argument("--until", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run() -> dict:
+        if args.source == "file":
+            rows = read_ndjson(args.path)
+        else:
+            rows = read_devices(args.device_ids, args.since, args.until)
+        try:
+            stats = await load_events(rows, args.chunk_size)
+        finally:
+            if args.source == "devices":
+                await AsyncISAPIService.close()
+        if stats["inserted"] and config.DAILY_ATTENDANCE_ENABLED and not args.no_attendance:
+            async with AsyncSessionLocal() as session:
+                days = await attendance.rebuild(
+                    session, attendance.local_date(stats["first"]), attendance.local_date(stats["last"])
+                )
+                await session.commit()
+            logger.info(f"Rebuilt {days} daily attendance rows")
+        return stats
+
+    stats = asyncio.run(run())
+    rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"Read {stats['rows']} events, inserted {stats['inserted']} in {stats['seconds']} s ({rate:.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,124 @@
-import json
+from typing import Optional
+
+from sqlalchemy import RowMapping
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from models.event import Event, Heartbeat
+
+from db import Base
+from models.event import PersonPurpose
 from schemas import events
-from typing import Optional
 
-async def create_event(event: Event, db: AsyncSession) -> Event:
+
+def access_event_values(info: events.AccessControllerEvent) -> dict:
     """
-    Create a new event in the database.
-    
-    :param event: The event to create.
-    :param db: The database session.
-    :return: The created event.
+    Column values of the access controller part of an ``events`` row.
+
+    :param info: The ``AccessControllerEvent`` of a pushed event or an event log entry.
+    :return: A value for every access controller column, None where the device sent nothing.
+    """
+    return {
+        "major_event": info.major_event,
+        "minor_event": info.minor_event,
+        "serial_no": info.serial_no,
+        "verify_no": info.verify_no,
+        "person_id": info.person_id,
+        "person_name": info.person_name,
+        "purpose": PersonPurpose.ATTENDANCE if info.person_name else PersonPurpose.INFORMATION,
+        "zone_type": info.zone_type,
+        "swipe_card_type": info.swipe_card_type,
+        "card_no": info.card_no,
+        "card_type": info.card_type,
+        "user_type": info.user_type,
+        "current_verify_mode": info.current_verify_mode.value if info.current_verify_mode else None,
+        "current_event": info.current_event,
+        "front_serial_no": info.front_serial_no,
+        "attendance_status": info.attendance_status,
+        "pictures_number": info.pictures_number,
+        "mask": info.mask,
+    }
+
+
+def event_values(event: events.EventNotificationAlert, picture_url: Optional[str] = None) -> dict:
+    """
+    Insert parameters of an ``events`` row for a validated event.
+
+    Every column except ``id`` and ``created_at`` is present, so rows of
+    different events can go into the same executemany.
+
+    :param event: The validated event.
+    :param picture_url: Store key of the event picture, if one was uploaded.
+    :return: The column values.
     """
-    db.add(event)
-    await db.commit()
-    await db.refresh(event)
-    return event
+    return {
+        "date_time": event.date_time,
+        "active_post_count": event.active_post_count,
+        "event_type": event.event_type,
+        "event_state": event.event_state,
+        "event_description": event.event_description,
+        "device_id": event.device_id,
+        **access_event_values(event.access_controller_event),
+        "picture_url": picture_url,
+    }
 
 
-async def create_heartbeat(
-    heartbeat: Heartbeat, db: AsyncSession
-) -> Heartbeat:
+def log_event_values(device_id: str, info: events.AcsEventInfo) -> dict:
     """
-    Create a new heartbeat event in the database.
+    Insert parameters of an ``events`` row for an entry read back from the device event log.
+
+    The log has no push envelope, so those columns get the values a pushed
+    access controller event carries.
+
+    :param device_id: The device the log was read from, as pushed in ``deviceID``.
+    :param info: The log entry.
+    :return: The column values, with the same keys as ``event_values``.
+    """
+    return {
+        "date_time": info.date_time,
+        "active_post_count": 1,
+        "event_type": "AccessControllerEvent",
+        "event_state": "active",
+        "event_description": "Access Controller Event",
+        "device_id": device_id,
+        **access_event_values(info),
+        "picture_url": None,
+    }
+
+
+def heartbeat_values(heartbeat: events.HeartbeatInfo) -> dict:
+    """
+    Insert parameters of a ``heartbeats`` row.
+
+    :param heartbeat: The validated heartbeat.
+    :return: The column values.
+    """
+    return {
+        "date_time": heartbeat.date_time,
+        "active_post_count": heartbeat.active_post_count,
+        "event_type": heartbeat.event_type,
+        "event_state": heartbeat.event_state,
+        "event_description": heartbeat.event_description,
+    }
+
+
+async def insert_rows(
+    model: type[Base], values: dict | list[dict], db: AsyncSession, returning: tuple = ()
+) -> list[RowMapping]:
+    """
+    Insert rows with a Core ``INSERT ... ON CONFLICT DO NOTHING RETURNING``, bypassing the ORM unit of work.
+
+    A list is sent as a single executemany. Rows hitting a unique constraint
+    (events already stored: same device, serial and time) are skipped and
+    return nothing. The caller commits.
 
-    :param heartbeat: The heartbeat event to create.
+    :param model: ``Event`` or ``Heartbeat``.
+    :param values: Parameters from ``event_values``, ``log_event_values`` or ``heartbeat_values``.
     :param db: The database session.
-    :return: The created heartbeat event.
+    :param returning: Columns to return for every inserted row, default the id.
+    :return: The ``returning`` columns of the rows that were inserted.
     """
-    db.add(heartbeat)
-    await db.commit()
-    await db.refresh(heartbeat)
-    return heartbeat
+    rows = [values] if isinstance(values, dict) else values
+    if not rows:
+        return []
+    statement = insert(model).on_conflict_do_nothing().returning(*(returning or (model.id,)))
+    result = await db.execute(statement, rows)
+    return result.mappings().all()
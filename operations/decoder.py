@@ -0,0 +1,45 @@
+from typing import Iterable, Protocol
+
+from pydantic import TypeAdapter
+
+from schemas.events import HeartbeatInfo, EventNotificationAlert, EventUnion
+
+# Building a TypeAdapter compiles the pydantic-core validator, so do it once per process.
+EVENT_ADAPTER: TypeAdapter[HeartbeatInfo | EventNotificationAlert] = TypeAdapter(EventUnion)
+
+# Form field names Hikvision terminals use for the event JSON part.
+EVENT_PART_NAMES = frozenset({"event_log", "AccessControllerEvent", "EventNotificationAlert", "heartBeat"})
+
+
+class EventPart(Protocol):
+    name: str
+    content_type: str | None
+    data: bytes | bytearray
+
+
+def find_event_part(parts: Iterable[EventPart]) -> bytes | None:
+    """
+    Pick the part carrying the event JSON.
+
+    Known field names win, then a JSON content type; scanning the payload for
+    "eventType" is only the fallback for terminals that send neither.
+    """
+    parts = list(parts)
+    for part in parts:
+        if part.name in EVENT_PART_NAMES:
+            return bytes(part.data)
+    for part in parts:
+        if part.content_type and part.content_type.split(";", 1)[0].strip() == "application/json":
+            return bytes(part.data)
+    return next((bytes(p.data) for p in parts if b"eventType" in p.data), None)
+
+
+def decode_event(raw: bytes | bytearray | str) -> HeartbeatInfo | EventNotificationAlert:
+    """
+    Parse and validate an event in a single pass.
+
+    :param raw: The JSON document as sent by the terminal.
+    :return: The validated heartbeat or access controller event.
+    :raises pydantic.ValidationError: On malformed JSON or an invalid event.
+    """
+    return EVENT_ADAPTER.validate_json(raw)
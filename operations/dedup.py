@@ -0,0 +1,78 @@
+from collections import deque
+from datetime import datetime
+
+from core import config
+from schemas.events import HeartbeatInfo, EventNotificationAlert
+
+
+class RecentSerials:
+    """
+    Bounded per-device index of recently seen event serial numbers.
+
+    Terminals retransmit an ``AccessControllerEvent`` with the same ``serialNo``
+    and ``dateTime`` after a network hiccup; those copies are answered from
+    here without touching the database or writing the image again. The
+    index is per worker process, so a copy landing on another worker is
+    caught by the unique ``(device_id, serial_no, date_time)`` constraint on
+    ``events`` instead.
+
+    The time is part of the key because a device reset (or a replaced
+    terminal keeping its deviceID) starts numbering again: a reused serial
+    with a different time is a new event and must not be dropped.
+    """
+
+    def __init__(self, per_device: int):
+        self.per_device = per_device
+        self._serials: dict[str, set[tuple[int, datetime]]] = {}
+        self._order: dict[str, deque[tuple[int, datetime]]] = {}
+
+        self.duplicates = 0
+        self.unique = 0
+
+    def seen(self, device_id: str, serial_no: int, date_time: datetime) -> bool:
+        serials = self._serials.get(device_id)
+        return serials is not None and (serial_no, date_time) in serials
+
+    def add(self, device_id: str, serial_no: int, date_time: datetime) -> None:
+        serials = self._serials.get(device_id)
+        if serials is None:
+            serials = self._serials[device_id] = set()
+            self._order[device_id] = deque()
+        key = (serial_no, date_time)
+        if key in serials:
+            return
+        order = self._order[device_id]
+        if len(order) >= self.per_device:
+            serials.discard(order.popleft())
+        order.append(key)
+        serials.add(key)
+
+    def is_new(self, event: HeartbeatInfo | EventNotificationAlert) -> bool:
+        """Heartbeats and events without a serial number are always new."""
+        if not isinstance(event, EventNotificationAlert) or event.access_controller_event.serial_no is None:
+            return True
+        if self.seen(event.device_id, event.access_controller_event.serial_no, event.date_time):
+            self.duplicates += 1
+            return False
+        self.unique += 1
+        return True
+
+    def remember(self, event: HeartbeatInfo | EventNotificationAlert) -> None:
+        """
+        Record an event once it has been queued for insertion.
+
+        Only stored events are remembered, so a request that fails half way
+        does not cause the terminal's retry to be dropped.
+        """
+        if isinstance(event, EventNotificationAlert) and event.access_controller_event.serial_no is not None:
+            self.add(event.device_id, event.access_controller_event.serial_no, event.date_time)
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._serials),
+            "duplicates": self.duplicates,
+            "unique": self.unique,
+        }
+
+
+recent_serials = RecentSerials(per_device=config.DEDUP_SERIALS_PER_DEVICE)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from core import config
+from core.metrics import device_registry_devices, device_registry_lookups, device_registry_refreshes
+from services.isapi.async_isapi_client import AsyncISAPIService, ISAPIError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DeviceRecord:
+    ehome_id: str
+    dev_index: str
+    name: str | None = None
+    model: str | None = None
+    dev_type: str | None = None
+    status: str | None = None
+
+    @classmethod
+    def from_device(cls, device: dict) -> "DeviceRecord | None":
+        params = device.get("EhomeParams") or device.get("ISUPParams") or {}
+        ehome_id = params.get("EhomeID") or params.get("ISUPID")
+        if not ehome_id or not device.get("devIndex"):
+            return None
+        return cls(
+            ehome_id=ehome_id,
+            dev_index=device["devIndex"],
+            name=device.get("devName"),
+            model=device.get("devMode"),
+            dev_type=device.get("devType"),
+            status=device.get("devStatus"),
+        )
+
+
+class DeviceRegistry:
+    """
+    In-memory copy of the gateway device list, keyed by EhomeID.
+
+    Terminals report their EhomeID as ``deviceID`` in events while the
+    gateway addresses them by ``devIndex``. The whole list is loaded page by
+    page and swapped in atomically every ``refresh_interval`` seconds, so
+    lookups are a dict access. A lookup of an unknown device triggers an
+    early reload, at most once per ``miss_refresh_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float,
+        page_size: int,
+        miss_refresh_interval: float,
+        service: AsyncISAPIService | None = None,
+    ):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.miss_refresh_interval = miss_refresh_interval
+        self._service = service or AsyncISAPIService()
+        self._devices: dict[str, DeviceRecord] = {}
+        self._loaded_at: float | None = None
+        self._last_attempt = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="device-registry")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def get(self, ehome_id: str) -> DeviceRecord | None:
+        """Look a device up without touching the gateway."""
+        device = self._devices.get(ehome_id)
+        if device is None:
+            self.misses += 1
+            device_registry_lookups.inc("miss")
+        else:
+            self.hits += 1
+            device_registry_lookups.inc("hit")
+        return device
+
+    async def resolve(self, ehome_id: str) -> DeviceRecord | None:
+        """Look a device up, reloading the list first if it is unknown and a reload is allowed."""
+        device = self.get(ehome_id)
+        if device is None and time.monotonic() - self._last_attempt >= self.miss_refresh_interval:
+            await self.refresh()
+            device = self._devices.get(ehome_id)
+        return device
+
+    async def dev_index(self, ehome_id: str) -> str:
+        device = await self.resolve(ehome_id)
+        if device is None:
+            raise LookupError(f"Device {ehome_id} is not registered on the gateway")
+        return device.dev_index
+
+    async def refresh(self) -> None:
+        """Reload the full device list; concurrent callers share one reload."""
+        started = time.monotonic()
+        async with self._lock:
+            if self._last_attempt > started:
+                # Another caller finished a reload while this one was waiting
+                return
+            try:
+                devices = {}
+                async for raw in self._service.iter_devices(self.page_size):
+                    device = DeviceRecord.from_device(raw)
+                    if device is not None:
+                        devices[device.ehome_id] = device
+            except Exception:
+                self.refresh_failures += 1
+                device_registry_refreshes.inc("failed")
+                raise
+            finally:
+                self._last_attempt = time.monotonic()
+            self._devices = devices
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+            device_registry_refreshes.inc("ok")
+            logger.info(f"Loaded {len(devices)} devices from the gateway")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "devices": len(self._devices),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except ISAPIError as e:
+                logger.error(f"Device registry refresh failed, keeping {len(self._devices)} known devices: {e}")
+            except Exception:
+                # Anything else (a malformed device entry, a bug) must not end the refresh loop
+                logger.exception(f"Device registry refresh failed, keeping {len(self._devices)} known devices")
+            await asyncio.sleep(self.refresh_interval)
+
+
+device_registry = DeviceRegistry(
+    refresh_interval=config.DEVICE_REGISTRY_REFRESH_INTERVAL,
+    page_size=config.DEVICE_REGISTRY_PAGE_SIZE,
+    miss_refresh_interval=config.DEVICE_REGISTRY_MISS_REFRESH_INTERVAL,
+)
+device_registry_devices.set_function(lambda: {(): len(device_registry._devices)})
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import sys
+from datetime import date, datetime, time
+from enum import Enum
+from typing import AsyncIterator
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Select
+
+from core import config
+from db import AsyncSessionLocal
+from models.event import Event
+from operations.queries import DEFAULT_EVENT_COLUMNS, EventFilter, InvalidQuery, filter_events, select_columns
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_query(event_filter: EventFilter, columns: tuple[str, ...] = DEFAULT_EVENT_COLUMNS) -> Select:
+    """
+    All matching events, oldest first, in the order of the ``(date_time, id)`` indexes.
+
+    :raises InvalidQuery: For unknown columns, before anything is streamed.
+    """
+    return filter_events(select_columns(columns), event_filter).order_by(Event.date_time, Event.id)
+
+
+async def stream_rows(query: Select, chunk_size: int, session_factory=AsyncSessionLocal) -> AsyncIterator[list]:
+    """
+    Rows of ``query`` in chunks of up to ``chunk_size``, read through a server-side cursor.
+
+    The session is opened here rather than taken from the request, since the
+    response body is produced after the endpoint has returned.
+    """
+    async with session_factory() as session:
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+async def encode_csv(columns: list[str], chunks: AsyncIterator[list]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in chunks:
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        # Header only: nothing matched
+        yield buffer.getvalue()
+
+
+async def encode_ndjson(columns: list[str], chunks: AsyncIterator[list]) -> AsyncIterator[str]:
+    async for rows in chunks:
+        yield "".join(
+            json.dumps({name: _plain(value) for name, value in zip(columns, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+
+def export_events(
+    event_filter: EventFilter,
+    columns: tuple[str, ...] = DEFAULT_EVENT_COLUMNS,
+    output_format: str = "csv",
+    chunk_size: int = config.EXPORT_CHUNK_SIZE,
+    session_factory=AsyncSessionLocal,
+) -> AsyncIterator[str]:
+    """
+    Stream matching events as CSV (with a header row) or NDJSON.
+
+    One text block is yielded per chunk of ``chunk_size`` rows, so memory
+    stays the same however many rows are exported. The query is built and
+    checked immediately; the database is only read once iteration starts.
+
+    :raises InvalidQuery: For unknown columns or formats.
+    """
+    if output_format not in ENCODERS:
+        raise InvalidQuery(f"Unknown format: {output_format}")
+    query = export_query(event_filter, columns)
+    names = [column.name for column in query.selected_columns]
+    return ENCODERS[output_format](names, stream_rows(query, chunk_size, session_factory))
+
+
+def month_range(month: str) -> tuple[datetime, datetime]:
+    """Start and end of a ``YYYY-MM`` month in ``config.TIME_ZONE``."""
+    first = date.fromisoformat(f"{month}-01")
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    zone = ZoneInfo(config.TIME_ZONE)
+    return datetime.combine(first, time(), zone), datetime.combine(following, time(), zone)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export events as CSV or NDJSON.")
+    parser.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    parser.add_argument("--fields", help="comma-separated columns, default " + ",".join(DEFAULT_EVENT_COLUMNS))
+    parser.add_argument("--device-id")
+    parser.add_argument("--person-id")
+    parser.add_argument("--attendance-status")
+    parser.add_argument("--month", help=f"YYYY-MM in {config.TIME_ZONE}, instead of --since/--until")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="inclusive lower bound on date_time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="exclusive upper bound on date_time")
+    parser.add_argument("--chunk-size", type=int, default=config.EXPORT_CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="file to write, default stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stderr)
+    since, until = month_range(args.month) if args.month else (args.since, args.until)
+    columns = tuple(name.strip() for name in args.fields.split(",") if name.strip()) if args.fields else DEFAULT_EVENT_COLUMNS
+    event_filter = EventFilter(args.device_id, args.person_id, args.attendance_status, since, until)
+    try:
+        blocks = export_events(event_filter, columns, args.format, args.chunk_size)
+    except InvalidQuery as e:
+        raise SystemExit(str(e))
+
+    async def run(out) -> None:
+        async for block in blocks:
+            out.write(block)
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            asyncio.run(run(out))
+        logger.info(f"Wrote {args.output}")
+    else:
+        asyncio.run(run(sys.stdout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from core import config
+from core.metrics import events_backfilled, serial_gap_lag, serial_gaps, serial_gaps_open
+from db import AsyncSessionLocal
+from models.event import Event
+from operations import attendance
+from operations.crud import insert_rows, log_event_values
+from operations.devices import DeviceRegistry, device_registry
+from services.isapi.async_isapi_client import AsyncISAPIService
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key shared by all workers scanning for gaps
+LOCK_KEY = 0x68696B67
+
+
+@dataclass
+class SerialGap:
+    device_id: str
+    first: int
+    last: int
+    # Times of the stored events around the gap; a serial reused after a device reset lies outside
+    after: datetime | None = None
+    before: datetime | None = None
+    detected_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    retry_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return self.last - self.first + 1
+
+
+class GapBackfiller:
+    """
+    Finds holes in the event serial numbers stored per device and fills them from the device event log.
+
+    Terminals number their events consecutively, so a stored ``serialNo``
+    more than one above the previous one of the same device means pushes
+    were lost in between. Detection reads ``events`` rather than what one
+    process received, so it sees the pushes of every uvicorn worker. The
+    scan runs under a transaction advisory lock, so only one worker scans
+    at a time; the lock and its connection are given back before any device
+    is asked. Two workers may therefore backfill the same gap at once,
+    which costs a second log search but no duplicate rows: the missing
+    serials are read again right before the search and inserts skip
+    conflicting rows.
+
+    Every ``interval`` seconds the events whose ``date_time`` lies between
+    the previous scan and ``grace`` seconds ago (late or out-of-order pushes
+    have arrived by then) are compared with their predecessor, looked for up
+    to ``lookback`` seconds further back; events pushed later than that are
+    not checked. Jumps of more than ``max_size`` serials are taken for a reset of
+    the device's numbering, not for lost events. Only serials still missing
+    are searched on the device with ``beginSerialNo``/``endSerialNo`` and
+    inserted if their time lies between the stored neighbours of the gap;
+    failed gaps are retried with a growing delay.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        grace: float,
+        lookback: float,
+        max_size: int,
+        max_open: int,
+        max_attempts: int = 5,
+        registry: DeviceRegistry = device_registry,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.interval = interval
+        self.grace = grace
+        self.lookback = lookback
+        self.max_size = max_size
+        self.max_open = max_open
+        self.max_attempts = max_attempts
+        self._session_factory = session_factory
+        self._registry = registry
+        self._service = AsyncISAPIService()
+        self._task: asyncio.Task | None = None
+        self._scanned_until: datetime | None = None
+        self._retrying: list[SerialGap] = []
+
+        self.gaps_detected = 0
+        self.gaps_resolved = 0
+        self.gaps_failed = 0
+        self.gaps_discarded = 0
+        self.rows_recovered = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="gap-backfill")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def open_gaps(self) -> int:
+        return len(self._retrying)
+
+    def stats(self) -> dict:
+        return {
+            "gaps_detected": self.gaps_detected,
+            "gaps_open": self.open_gaps,
+            "gaps_discarded": self.gaps_discarded,
+            "gaps_resolved": self.gaps_resolved,
+            "gaps_failed": self.gaps_failed,
+            "rows_recovered": self.rows_recovered,
+            "last_lag_seconds": round(self.last_lag_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Serial gap scan failed")
+
+    async def run_once(self, now: datetime | None = None) -> None:
+        """Scan for new gaps and backfill them along with the failed ones that are due again."""
+        async with self._session_factory() as session:
+            locked = (await session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": LOCK_KEY})).scalar()
+            if not locked:
+                logger.debug("Another worker is scanning for serial gaps")
+                return
+            gaps = await self.find_gaps(session, now or datetime.now(timezone.utc))
+        # Closing the session ended the transaction, releasing the lock and the connection
+        for gap in self._take_due() + gaps:
+            await self._attempt(gap)
+
+    async def find_gaps(self, session, now: datetime) -> list[SerialGap]:
+        """Gaps before the events timed since the previous scan, up to ``grace`` seconds before ``now``."""
+        until = now - timedelta(seconds=self.grace)
+        # After a restart, or when another worker did the last scans, look back the whole window
+        since = until - timedelta(seconds=self.lookback)
+        if self._scanned_until is not None:
+            since = max(since, self._scanned_until)
+        window = {"partition_by": Event.device_id, "order_by": Event.serial_no}
+        stored = (
+            select(
+                Event.device_id,
+                Event.serial_no,
+                Event.date_time,
+                func.lag(Event.serial_no).over(**window).label("previous"),
+                func.lag(Event.date_time).over(**window).label("previous_time"),
+            )
+            .where(
+                Event.date_time >= since - timedelta(seconds=self.lookback),
+                Event.date_time < until,
+                Event.serial_no.is_not(None),
+            )
+            .subquery()
+        )
+        skipped = stored.c.serial_no - stored.c.previous - 1
+        result = await session.execute(
+            select(
+                stored.c.device_id, stored.c.previous + 1, stored.c.serial_no - 1, skipped,
+                stored.c.previous_time, stored.c.date_time,
+            )
+            .where(stored.c.date_time >= since, skipped > 0)
+            .order_by(stored.c.device_id, stored.c.serial_no)
+        )
+        self._scanned_until = until
+
+        gaps = []
+        for device_id, first, last, size, after, before in result:
+            if size > self.max_size:
+                logger.warning(f"Serial numbers of {device_id} jumped from {first - 1} to {last + 1}, taken for a reset")
+                continue
+            gaps.append(SerialGap(device_id, first, last, after, before))
+            self.gaps_detected += 1
+            serial_gaps.inc("detected")
+            logger.info(f"Serial gap on {device_id}: {first}-{last} ({size} events)")
+        return gaps
+
+    def _take_due(self) -> list[SerialGap]:
+        now = time.monotonic()
+        due = [gap for gap in self._retrying if gap.retry_at <= now]
+        self._retrying = [gap for gap in self._retrying if gap.retry_at > now]
+        return due
+
+    async def _attempt(self, gap: SerialGap) -> None:
+        try:
+            await self.backfill(gap)
+        except Exception:
+            gap.attempts += 1
+            if gap.attempts >= self.max_attempts:
+                self.gaps_failed += 1
+                serial_gaps.inc("failed")
+                logger.exception(f"Giving up on backfill of {gap.device_id} {gap.first}-{gap.last}")
+                return
+            if len(self._retrying) >= self.max_open:
+                self.gaps_discarded += 1
+                serial_gaps.inc("discarded")
+                logger.exception(f"Too many open serial gaps, not retrying {gap.device_id} {gap.first}-{gap.last}")
+                return
+            logger.exception(f"Backfill of {gap.device_id} {gap.first}-{gap.last} failed, retrying later")
+            gap.retry_at = time.monotonic() + self.interval * gap.attempts
+            self._retrying.append(gap)
+
+    async def backfill(self, gap: SerialGap) -> int:
+        """Insert the events of ``gap`` that are still missing and return how many were recovered."""
+        missing = await self._missing_serials(gap)
+        recovered = 0
+        if missing:
+            dev_index = await self._registry.dev_index(gap.device_id)
+            events = self._service.iter_events(dev_index, begin_serial_no=min(missing), end_serial_no=max(missing))
+            rows = [
+                log_event_values(gap.device_id, info) async for info in events
+                if info.serial_no in missing and self._within(gap, info.date_time)
+            ]
+            if rows:
+                async with self._session_factory() as session:
+                    for start in range(0, len(rows), 1000):
+                        inserted = await insert_rows(Event, rows[start:start + 1000], session, attendance.EVENT_COLUMNS)
+                        recovered += len(inserted)
+                        if config.DAILY_ATTENDANCE_ENABLED:
+                            await attendance.record_events(session, inserted)
+                    await session.commit()
+
+        lag = time.monotonic() - gap.detected_at
+        self.gaps_resolved += 1
+        self.rows_recovered += recovered
+        serial_gaps.inc("resolved")
+        events_backfilled.inc(amount=recovered)
+        serial_gap_lag.observe(lag)
+        self.last_lag_seconds = lag
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        logger.info(f"Backfilled {gap.device_id} {gap.first}-{gap.last}: {len(missing)} missing, {recovered} recovered")
+        return recovered
+
+    @staticmethod
+    def _between(gap: SerialGap) -> list:
+        conditions = []
+        if gap.after is not None:
+            conditions.append(Event.date_time >= gap.after)
+        if gap.before is not None:
+            conditions.append(Event.date_time <= gap.before)
+        return conditions
+
+    @staticmethod
+    def _within(gap: SerialGap, when: datetime) -> bool:
+        """Whether a log entry's time fits between the stored neighbours, like ``_between`` in SQL."""
+        if when.tzinfo is None:
+            # Devices without a configured offset; compared as UTC
+            when = when.replace(tzinfo=timezone.utc)
+        return (gap.after is None or when >= gap.after) and (gap.before is None or when <= gap.before)
+
+    async def _missing_serials(self, gap: SerialGap) -> set[int]:
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(Event.serial_no).where(
+                    Event.device_id == gap.device_id,
+                    Event.serial_no.between(gap.first, gap.last),
+                    *self._between(gap),
+                )
+            )
+            present = set(result.scalars())
+        return set(range(gap.first, gap.last + 1)) - present
+
+
+backfiller = GapBackfiller(
+    interval=config.GAP_BACKFILL_INTERVAL,
+    grace=config.GAP_BACKFILL_GRACE,
+    lookback=config.GAP_SCAN_LOOKBACK,
+    max_size=config.GAP_MAX_SIZE,
+    max_open=config.GAP_MAX_OPEN,
+)
+serial_gaps_open.set_function(lambda: {(): backfiller.open_gaps})
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from core import config
+from db import AsyncSessionLocal
+from models.device import DeviceLiveness, HeartbeatMinute
+from schemas.events import HeartbeatInfo
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatCoalescer:
+    """
+    Keeps the latest heartbeat per device in memory and upserts it periodically.
+
+    Instead of one ``heartbeats`` row per beat, every ``flush_interval`` seconds
+    each device that beat since the last flush costs one upsert into
+    ``device_liveness`` and, with ``minute_history`` enabled, one upsert per
+    device-minute into ``heartbeat_minutes``. Counters are additive, so several
+    uvicorn workers can flush into the same rows.
+    """
+
+    def __init__(self, flush_interval: float, minute_history: bool = False, session_factory=AsyncSessionLocal):
+        self.flush_interval = flush_interval
+        self.minute_history = minute_history
+        self._session_factory = session_factory
+        self._latest: dict[str, tuple[HeartbeatInfo, int]] = {}
+        self._minutes: Counter[tuple[str, datetime]] = Counter()
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.beats_received = 0
+        self.rows_written = 0
+        self.last_flush_seconds = 0.0
+
+    def record(self, device_id: str, heartbeat: HeartbeatInfo) -> None:
+        _, count = self._latest.get(device_id, (None, 0))
+        self._latest[device_id] = (heartbeat, count + 1)
+        if self.minute_history:
+            self._minutes[(device_id, heartbeat.date_time.replace(second=0, microsecond=0))] += 1
+        self.beats_received += 1
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="heartbeat-coalescer")
+
+    async def stop(self) -> None:
+        """Write out the pending state and stop the worker."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "devices_pending": len(self._latest),
+            "beats_received": self.beats_received,
+            "rows_written": self.rows_written,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if self._stopping.is_set():
+                return
+
+    async def flush(self) -> None:
+        if not self._latest and not self._minutes:
+            return
+        latest, self._latest = self._latest, {}
+        minutes, self._minutes = self._minutes, Counter()
+
+        now = datetime.now(timezone.utc)
+        liveness_rows = [
+            {
+                "device_id": device_id,
+                "last_seen": hb.date_time,
+                "active_post_count": hb.active_post_count,
+                "event_state": hb.event_state,
+                "event_description": hb.event_description,
+                "beat_count": count,
+                "updated_at": now,
+            }
+            for device_id, (hb, count) in latest.items()
+        ]
+        minute_rows = [
+            {"device_id": device_id, "minute": minute, "beat_count": count}
+            for (device_id, minute), count in minutes.items()
+        ]
+
+        started = time.perf_counter()
+        try:
+            async with self._session_factory() as session:
+                for rows in _chunks(liveness_rows):
+                    stmt = insert(DeviceLiveness).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[DeviceLiveness.device_id],
+                        set_={
+                            "last_seen": func.greatest(DeviceLiveness.last_seen, stmt.excluded.last_seen),
+                            "active_post_count": stmt.excluded.active_post_count,
+                            "event_state": stmt.excluded.event_state,
+                            "event_description": stmt.excluded.event_description,
+                            "beat_count": DeviceLiveness.beat_count + stmt.excluded.beat_count,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                    await session.execute(stmt)
+                for rows in _chunks(minute_rows):
+                    stmt = insert(HeartbeatMinute).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[HeartbeatMinute.device_id, HeartbeatMinute.minute],
+                        set_={"beat_count": HeartbeatMinute.beat_count + stmt.excluded.beat_count},
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            logger.exception(f"Heartbeat flush for {len(liveness_rows)} devices failed, keeping state for the next one")
+            self._merge_back(latest, minutes)
+            return
+
+        self.rows_written += len(liveness_rows) + len(minute_rows)
+        self.last_flush_seconds = time.perf_counter() - started
+        logger.debug(f"Upserted liveness for {len(liveness_rows)} devices in {self.last_flush_seconds * 1000:.1f} ms")
+
+    def _merge_back(self, latest: dict[str, tuple[HeartbeatInfo, int]], minutes: Counter) -> None:
+        for device_id, (hb, count) in latest.items():
+            newer, newer_count = self._latest.get(device_id, (hb, 0))
+            self._latest[device_id] = (newer, count + newer_count)
+        self._minutes.update(minutes)
+
+
+def _chunks(rows: list[dict], size: int = 1000):
+    """Keep each multi-row VALUES well below the 32767 bind parameter limit."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+coalescer = HeartbeatCoalescer(
+    flush_interval=config.HEARTBEAT_FLUSH_INTERVAL,
+    minute_history=config.HEARTBEAT_HISTORY == "minute",
+)
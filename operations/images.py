@@ -0,0 +1,206 @@
+import os
+import re
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from operations.packs import PackedImage
+from operations.storage import ImageStore, image_store
+from operations.thumbnails import VARIANT_SIZES, ThumbnailPool, thumbnails
+
+# Content-addressed keys never change content, so clients may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Pre-store flat names (20240101_120000_Picture.jpg) could be overwritten, so revalidate
+LEGACY_CACHE_CONTROL = "no-cache"
+# The original sent in place of a variant that could not be made in time
+FALLBACK_CACHE_CONTROL = "no-store"
+
+CONTENT_KEY = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$")
+
+
+class ImageResponse(FileResponse):
+    """
+    ``FileResponse`` that sends whole images with as few reads and sends as possible.
+
+    When the ASGI server offers the ``http.response.pathsend`` extension
+    (Granian, Hypercorn) the file is sent by path and the server copies it
+    in the kernel. Uvicorn, which compose/fastapi/start runs, has no such
+    extension and no other zero-copy path, so there an image up to
+    ``single_read_limit`` is read with one worker-thread call and sent as a
+    single body message instead of ``FileResponse``'s 64 KiB chunks, each
+    of which costs a thread hop and an event loop round trip. Ranges, HEAD
+    and larger files take the regular chunked path.
+    ``benchmarks/image_serving.py`` measures the difference under uvicorn.
+    """
+    single_read_limit = 1024 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["method"] == "HEAD"
+            or any(name == b"range" for name, _ in scope["headers"])
+            or self.stat_result is None
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        if "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+        elif self.stat_result.st_size <= self.single_read_limit:
+            try:
+                body = await anyio.to_thread.run_sync(_read_file, self.path)
+            except FileNotFoundError:
+                # Moved into a pack after it was located; the client retries
+                await Response(status_code=404)(scope, receive, send)
+                return
+            self.headers["content-length"] = str(len(body))
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": body})
+        else:
+            await super().__call__(scope, receive, send)
+            return
+        if self.background is not None:
+            await self.background()
+
+
+class PackedImageResponse(Response):
+    """
+    Sends an image straight out of a memory-mapped pack file.
+
+    Supports a single ``bytes=`` range; other range forms get the whole image,
+    which RFC 9110 allows.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, image: PackedImage, headers: dict[str, str], media_type: str = "image/jpeg"):
+        self.image = image
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, "accept-ranges": "bytes"})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        view = self.image.view()
+        start, end = 0, len(view)
+        http_range = next((value for name, value in scope["headers"] if name == b"range"), None)
+        if http_range is not None:
+            byte_range = _single_range(http_range.decode("latin-1"), len(view))
+            if byte_range == "unsatisfiable":
+                await Response(status_code=416, headers={"content-range": f"bytes */{len(view)}"})(scope, receive, send)
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {start}-{end - 1}/{len(view)}"
+        self.headers["content-length"] = str(end - start)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        for offset in range(start, end, self.chunk_size):
+            chunk_end = min(offset + self.chunk_size, end)
+            await send({"type": "http.response.body", "body": bytes(view[offset:chunk_end]), "more_body": chunk_end < end})
+        if start == end:
+            await send({"type": "http.response.body", "body": b""})
+
+
+async def image_response(
+    request: Request,
+    key: str,
+    size: str | None = None,
+    store: ImageStore = image_store,
+    pool: ThumbnailPool = thumbnails,
+) -> Response:
+    """
+    Serve an image store key, or its ``size`` variant, with validators and caching headers.
+
+    Content-addressed keys get the digest as a strong ETag and an immutable
+    Cache-Control; a matching ``If-None-Match`` is answered with 304 without
+    touching the file. Byte ranges are handled by ``FileResponse``, or by
+    ``PackedImageResponse`` for images that were moved into a pack. A
+    variant that is not there yet is rendered on the spot; if that takes
+    longer than the pool allows, the original is sent uncached.
+    """
+    if size is not None and size not in VARIANT_SIZES:
+        return Response(status_code=400, content=f"Unknown size {size!r}")
+    source = store.locate(key)
+    if source is None:
+        return Response(status_code=404)
+    fallback = False
+    if size is not None:
+        variant_path = await pool.get(key, size)
+        if variant_path is not None:
+            source = variant_path
+        else:
+            size = None
+            fallback = True
+
+    match = CONTENT_KEY.match(key)
+    suffix = f"-{size}" if size else ""
+    stat_result = None
+    if match:
+        etag = f'"{match.group(1)}{suffix}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        try:
+            stat_result = os.stat(source)
+        except FileNotFoundError:
+            return Response(status_code=404)
+        etag = f'W/"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{suffix}"'
+        cache_control = LEGACY_CACHE_CONTROL
+    if fallback:
+        cache_control = FALLBACK_CACHE_CONTROL
+    headers = {"etag": etag, "cache-control": cache_control}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if isinstance(source, PackedImage):
+        return PackedImageResponse(source, headers)
+    if stat_result is None:
+        try:
+            stat_result = os.stat(source)
+        except FileNotFoundError:
+            # Moved into a pack since it was located
+            packed = store.locate(key)
+            if not isinstance(packed, PackedImage):
+                return Response(status_code=404)
+            return PackedImageResponse(packed, headers)
+    return ImageResponse(source, headers=headers, media_type="image/jpeg", stat_result=stat_result)
+
+
+def _single_range(header: str, size: int) -> tuple[int, int] | str | None:
+    """``(start, end)`` with ``end`` exclusive, "unsatisfiable", or None to ignore the header."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length == 0:
+                return "unsatisfiable"
+            return max(size - length, 0), size
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        return "unsatisfiable"
+    return start, end
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def _read_file(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
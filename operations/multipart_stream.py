@@ -0,0 +1,224 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from core import config
+from operations.storage import ImageStore, ImageWriter, image_store
+from operations.decoder import decode_event, find_event_part
+from schemas.events import HeartbeatInfo, EventNotificationAlert
+
+logger = logging.getLogger(__name__)
+
+
+class MultipartStreamError(ValueError):
+    """Raised when a request body cannot be parsed as an event upload."""
+
+
+@dataclass
+class StreamedPart:
+    name: str
+    content_type: str | None = None
+    filename: str | None = None
+    data: bytearray = field(default_factory=bytearray)
+    path: str | None = None
+    skipped: bool = False
+
+    @property
+    def is_file(self) -> bool:
+        return self.filename is not None
+
+
+@dataclass
+class StreamedForm:
+    fields: list[StreamedPart] = field(default_factory=list)
+    files: dict[str, str] = field(default_factory=dict)
+    event: HeartbeatInfo | EventNotificationAlert | None = None
+    accepted: bool = True
+
+
+class EventMultipartReader:
+    """
+    Parses a Hikvision event upload straight off the request stream.
+
+    Non-file parts (the event JSON) are kept in memory up to ``max_field_size``.
+    File parts (Picture, VisibleLight, Thermal) are never buffered: every
+    chunk is hashed and written to ``store`` as soon as it is parsed, so
+    memory per request is bounded by the size of one network chunk.
+    ``StreamedForm.files`` maps each part name to its image store key.
+
+    The event part is decoded as soon as it is complete and passed to
+    ``accept_event``; when that returns False, image parts that follow are
+    read off the wire but never written.
+
+    ``validate_seconds`` and ``image_write_seconds`` add up the time spent
+    decoding the event and writing images, for the ingest stage metrics.
+    """
+
+    def __init__(
+        self,
+        headers,
+        stream: AsyncIterator[bytes],
+        store: ImageStore = image_store,
+        max_field_size: int = config.MAX_EVENT_FIELD_SIZE,
+        accept_event: Callable[[HeartbeatInfo | EventNotificationAlert], bool] | None = None,
+    ):
+        self.headers = headers
+        self.stream = stream
+        self.store = store
+        self.max_field_size = max_field_size
+        self.accept_event = accept_event
+
+        self._form = StreamedForm()
+        self._part: StreamedPart | None = None
+        self._header_name = b""
+        self._header_value = b""
+        self._part_headers: dict[bytes, bytes] = {}
+        # File I/O has to be awaited, so the sync parser callbacks only record it here.
+        self._pending: list[tuple[str, StreamedPart, bytes]] = []
+        self._open_files: dict[int, ImageWriter] = {}
+        self.validate_seconds = 0.0
+        self.image_write_seconds = 0.0
+
+    async def read(self) -> StreamedForm:
+        content_type, params = parse_options_header(self.headers.get("content-type"))
+        if content_type != b"multipart/form-data":
+            return await self._read_plain()
+
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise MultipartStreamError("Missing boundary in multipart.")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+        try:
+            async for chunk in self.stream:
+                parser.write(chunk)
+                await self._drain()
+            parser.finalize()
+            await self._drain()
+            if self._open_files:
+                raise MultipartStreamError("Multipart body ended inside a file part.")
+            if self._form.event is None:
+                self._decode(find_event_part(self._form.fields))
+        except MultipartParseError as e:
+            await self._discard()
+            raise MultipartStreamError(f"Malformed multipart body: {e}") from e
+        except BaseException:
+            await self._discard()
+            raise
+        if not self._form.accepted:
+            # The event part came after the images, so they were already stored.
+            # A retransmission carries the same photo, i.e. the same key as the
+            # original event, so the files stay.
+            self._form.files.clear()
+        return self._form
+
+    async def _read_plain(self) -> StreamedForm:
+        """Bodies that are not multipart (e.g. a bare JSON heartbeat) form a single field."""
+        part = StreamedPart(name="", content_type=self.headers.get("content-type"))
+        async for chunk in self.stream:
+            self._append_field(part, chunk)
+        self._form.fields.append(part)
+        self._decode(find_event_part(self._form.fields))
+        return self._form
+
+    def _decode(self, raw: bytes | None) -> None:
+        if raw is None:
+            return
+        started = time.perf_counter()
+        try:
+            self._form.event = decode_event(raw)
+        finally:
+            self.validate_seconds += time.perf_counter() - started
+        if self.accept_event is not None:
+            self._form.accepted = self.accept_event(self._form.event)
+
+    def _append_field(self, part: StreamedPart, data: bytes) -> None:
+        if len(part.data) + len(data) > self.max_field_size:
+            raise MultipartStreamError(f"Field {part.name!r} exceeds {self.max_field_size} bytes.")
+        part.data.extend(data)
+
+    def _on_part_begin(self) -> None:
+        self._part_headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._part_headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._part_headers.get(b"content-disposition"))
+        if b"name" not in options:
+            raise MultipartStreamError('The Content-Disposition header field "name" must be provided.')
+        content_type = self._part_headers.get(b"content-type")
+        filename = options.get(b"filename")
+        self._part = StreamedPart(
+            name=options[b"name"].decode("latin-1"),
+            content_type=content_type.decode("latin-1") if content_type else None,
+            filename=filename.decode("latin-1") if filename is not None else None,
+        )
+        if self._part.is_file:
+            if self._form.accepted:
+                self._pending.append(("open", self._part, b""))
+            else:
+                self._part.skipped = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._part.skipped:
+            return
+        if self._part.is_file:
+            self._pending.append(("write", self._part, data[start:end]))
+        else:
+            self._append_field(self._part, data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._part.skipped:
+            pass
+        elif self._part.is_file:
+            self._pending.append(("close", self._part, b""))
+        else:
+            self._form.fields.append(self._part)
+            if self._form.event is None:
+                self._decode(find_event_part([self._part]))
+        self._part = None
+
+    async def _drain(self) -> None:
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        for action, part, data in self._pending:
+            if action == "open":
+                self._open_files[id(part)] = self.store.open_writer()
+            elif action == "write":
+                await self._open_files[id(part)].write(data)
+            else:
+                part.path = await self._open_files.pop(id(part)).commit()
+                self._form.files[part.name] = part.path
+                logger.info(f"Saved Image: {part.path}")
+        self._pending.clear()
+        self.image_write_seconds += time.perf_counter() - started
+
+    async def _discard(self) -> None:
+        """Drop partially written images after a failed parse; complete ones may be shared and stay."""
+        self._pending.clear()
+        for writer in self._open_files.values():
+            await writer.abort()
+        self._open_files.clear()
+        self._form.files.clear()
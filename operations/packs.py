@@ -0,0 +1,242 @@
+import argparse
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+import uuid
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"HIKPACK1"
+INDEX_HEADER = struct.Struct("<8sQ")
+# sha256 digest, offset in the .dat file, length
+INDEX_RECORD = struct.Struct("<32sQI")
+
+
+@dataclass(frozen=True)
+class PackedImage:
+    pack: "Pack"
+    offset: int
+    length: int
+
+    def view(self) -> memoryview:
+        return self.pack.data_view()[self.offset:self.offset + self.length]
+
+
+class Pack:
+    """
+    One ``pack-*.dat`` file of concatenated images and its ``.idx``.
+
+    The index is a header followed by fixed-size records sorted by digest,
+    searched in place through ``mmap``; neither file is read into memory.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.data_path = index_path[:-len(".idx")] + ".dat"
+        with open(index_path, "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path} is not a pack index")
+        self._data: mmap.mmap | None = None
+
+    def _digest_at(self, i: int) -> bytes:
+        start = INDEX_HEADER.size + i * INDEX_RECORD.size
+        return self._index[start:start + 32]
+
+    def find(self, digest: bytes) -> PackedImage | None:
+        i = bisect_left(_DigestColumn(self), digest)
+        if i == self.count or self._digest_at(i) != digest:
+            return None
+        _, offset, length = INDEX_RECORD.unpack_from(self._index, INDEX_HEADER.size + i * INDEX_RECORD.size)
+        return PackedImage(self, offset, length)
+
+    def data_view(self) -> memoryview:
+        if self._data is None:
+            with open(self.data_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._data)
+
+
+class _DigestColumn:
+    """Sequence view of the sorted digests for ``bisect``."""
+
+    def __init__(self, pack: Pack):
+        self.pack = pack
+
+    def __len__(self) -> int:
+        return self.pack.count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.pack._digest_at(i)
+
+
+class PackArchive:
+    """
+    Read side of the pack directory.
+
+    The set of packs is re-read when the directory changes, which is checked
+    with one ``stat`` on lookups, so packs written by the compaction job
+    become visible to running workers without a restart.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._packs: list[Pack] = []
+        self._mtime_ns: int | None = None
+
+    def find(self, digest_hex: str) -> PackedImage | None:
+        self._refresh()
+        digest = bytes.fromhex(digest_hex)
+        for pack in self._packs:
+            found = pack.find(digest)
+            if found is not None:
+                return found
+        return None
+
+    def _refresh(self) -> None:
+        try:
+            mtime_ns = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        known = {pack.index_path: pack for pack in self._packs}
+        packs = []
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if name.endswith(".idx"):
+                path = os.path.join(self.root, name)
+                try:
+                    packs.append(known.get(path) or Pack(path))
+                except (OSError, ValueError):
+                    logger.exception(f"Skipping unreadable pack index {path}")
+        self._packs = packs
+        self._mtime_ns = mtime_ns
+
+
+class PackWriter:
+    """Appends images to a new pack and publishes its index on ``close``."""
+
+    def __init__(self, root: str):
+        self.root = root
+        name = f"pack-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.data_path = os.path.join(root, f"{name}.dat")
+        self.index_path = os.path.join(root, f"{name}.idx")
+        self._data = open(self.data_path, "wb")
+        self._records: list[tuple[bytes, int, int]] = []
+        self.size = 0
+
+    def add(self, digest: bytes, content: bytes) -> None:
+        self._data.write(content)
+        self._records.append((digest, self.size, len(content)))
+        self.size += len(content)
+
+    def close(self) -> None:
+        """Make the pack durable; the index rename is the commit point."""
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        self._data.close()
+        self._records.sort()
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self._records)))
+            for record in self._records:
+                f.write(INDEX_RECORD.pack(*record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        _fsync_dir(self.root)
+
+
+def compact(store, older_than: float, pack_size: int) -> dict:
+    """
+    Move content-addressed images last modified more than ``older_than`` seconds ago into packs.
+
+    Loose files are removed only after the pack holding them is durable. An
+    image whose content no longer matches its name is left alone. Only one
+    compaction runs at a time per store.
+
+    :return: Counts of packed and skipped images and packs written.
+    """
+    os.makedirs(store.archive.root, exist_ok=True)
+    cutoff = time.time() - older_than
+    stats = {"packs": 0, "images": 0, "bytes": 0, "corrupt": 0}
+
+    with open(os.path.join(store.archive.root, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        writer: PackWriter | None = None
+        packed: list[str] = []
+
+        def finish() -> None:
+            writer.close()
+            for path in packed:
+                os.remove(path)
+            stats["packs"] += 1
+            logger.info(f"Wrote {writer.index_path} with {len(packed)} images ({writer.size} bytes)")
+            packed.clear()
+
+        for path, digest_hex in store.iter_content_files():
+            try:
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+                with open(path, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                continue
+            digest = hashlib.sha256(content).digest()
+            if digest.hex() != digest_hex:
+                stats["corrupt"] += 1
+                logger.warning(f"Not packing {path}: content does not match its name")
+                continue
+            if store.archive.find(digest_hex) is not None:
+                # Already packed by an earlier run that stopped before removing it
+                os.remove(path)
+                continue
+            if writer is None:
+                writer = PackWriter(store.archive.root)
+            writer.add(digest, content)
+            packed.append(path)
+            stats["images"] += 1
+            stats["bytes"] += len(content)
+            if writer.size >= pack_size:
+                finish()
+                writer = None
+        if writer is not None:
+            finish()
+    return stats
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def main() -> None:
+    from operations.storage import image_store
+
+    parser = argparse.ArgumentParser(description="Move old images from SAVE_DIR into pack files.")
+    parser.add_argument("--older-than-days", type=float, default=config.PACK_AFTER_DAYS)
+    parser.add_argument("--pack-size-mb", type=int, default=config.PACK_SIZE_MB)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        stats = compact(image_store, args.older_than_days * 86400, args.pack_size_mb * 1024 * 1024)
+    except BlockingIOError:
+        raise SystemExit("Another compaction is running.")
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+
+from core import config
+from db import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key shared by all workers running the manager
+LOCK_KEY = 0x68696B70
+
+
+def month_start(at: date) -> date:
+    return date(at.year, at.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def month_bounds(month: date) -> tuple[datetime, datetime]:
+    following = add_months(month, 1)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        datetime(following.year, following.month, 1, tzinfo=timezone.utc),
+    )
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    """Partition of ``table`` for one calendar month, bounded in UTC."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+    )
+
+
+class PartitionManager:
+    """
+    Keeps the monthly partitions of ``events`` and ``heartbeats`` ahead of the clock.
+
+    On start and every ``interval`` seconds it creates the partitions for the
+    current month and the ``months_ahead`` following ones, so inserts never
+    land in the default partition, and detaches partitions whose month lies
+    more than the table's retention before the current one; with
+    ``drop_expired`` they are dropped as well. A retention of 0 keeps every
+    month. Every partition is created or expired in its own savepoint, so one
+    that fails is logged and retried on the next pass while the rest go
+    ahead. Several uvicorn workers may run it: each pass holds an advisory
+    lock, so they take turns instead of racing on the DDL.
+    """
+
+    def __init__(
+        self,
+        retention_months: dict[str, int],
+        months_ahead: int,
+        interval: float,
+        drop_expired: bool = False,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.retention_months = retention_months
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.drop_expired = drop_expired
+        self._session_factory = session_factory
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.partitions_created = 0
+        self.partitions_detached = 0
+        self.partitions_dropped = 0
+        self.rows_moved_from_default = 0
+        self.last_run: datetime | None = None
+        self.failures = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="partition-manager")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "partitions_created": self.partitions_created,
+            "partitions_detached": self.partitions_detached,
+            "partitions_dropped": self.partitions_dropped,
+            "rows_moved_from_default": self.rows_moved_from_default,
+            "failures": self.failures,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+    async def maintain(self, now: datetime | None = None) -> None:
+        """One pass over all tables; whatever fails is logged and retried on the next pass."""
+        now = now or datetime.now(timezone.utc)
+        current = month_start(now)
+        months = [add_months(current, offset) for offset in range(self.months_ahead + 1)]
+        for table, retention in self.retention_months.items():
+            expire_before = add_months(current, -retention) if retention > 0 else None
+            await self._maintain_table(table, months, expire_before)
+        self.last_run = now
+
+    async def ensure_months(self, table: str, months: Iterable[date]) -> None:
+        """Create the partitions of ``table`` for ``months`` that do not exist yet, e.g. before loading history."""
+        await self._maintain_table(table, months, None)
+
+    async def _maintain_table(self, table: str, months: Iterable[date], expire_before: date | None) -> None:
+        try:
+            async with self._session_factory() as session:
+                await session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+                existing, has_default = await self._partitions(session, table)
+                # One savepoint per partition, so a month that cannot be created or
+                # expired is logged and retried without holding back the others
+                for month in sorted(set(months) - existing):
+                    try:
+                        async with session.begin_nested():
+                            await self._create(session, table, month, has_default)
+                    except Exception:
+                        self.failures += 1
+                        logger.exception(f"Creating partition {partition_name(table, month)} failed")
+                if expire_before is not None:
+                    for month in sorted(month for month in existing if month < expire_before):
+                        try:
+                            async with session.begin_nested():
+                                await self._expire(session, table, partition_name(table, month))
+                        except Exception:
+                            self.failures += 1
+                            logger.exception(f"Expiring partition {partition_name(table, month)} failed")
+                await session.commit()
+        except Exception:
+            self.failures += 1
+            logger.exception(f"Partition maintenance of {table} failed")
+
+    async def _partitions(self, session, table: str) -> tuple[set[date], bool]:
+        """Months that have a partition, and whether the table has a default partition."""
+        result = await session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table"
+            ),
+            {"table": table},
+        )
+        pattern = re.compile(rf"^{re.escape(table)}_(\d{{4}})_(\d{{2}})$")
+        months, has_default = set(), False
+        for name in result.scalars():
+            match = pattern.match(name)
+            if match:
+                months.add(date(int(match[1]), int(match[2]), 1))
+            has_default = has_default or name == f"{table}_default"
+        return months, has_default
+
+    async def _create(self, session, table: str, month: date, has_default: bool) -> None:
+        """
+        Create the partition of ``month``, taking over rows the default partition holds for it.
+
+        Postgres refuses to create a partition for a range the default
+        partition has rows in (devices with a wrong clock put them there), so
+        the default is detached, the month created, its rows moved over and
+        the default attached again.
+        """
+        name = partition_name(table, month)
+        default = f"{table}_default"
+        start, end = month_bounds(month)
+        stray = 0
+        if has_default:
+            stray = (await session.execute(
+                text(f"SELECT count(*) FROM {default} WHERE date_time >= :start AND date_time < :end"),
+                {"start": start, "end": end},
+            )).scalar()
+        if not stray:
+            await session.execute(text(create_partition_sql(table, month)))
+        else:
+            await session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+            await session.execute(text(create_partition_sql(table, month)))
+            await session.execute(
+                text(f"INSERT INTO {name} SELECT * FROM {default} WHERE date_time >= :start AND date_time < :end"),
+                {"start": start, "end": end},
+            )
+            await session.execute(
+                text(f"DELETE FROM {default} WHERE date_time >= :start AND date_time < :end"),
+                {"start": start, "end": end},
+            )
+            await session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+            self.rows_moved_from_default += stray
+        self.partitions_created += 1
+        logger.info(f"Created partition {name}" + (f", moved {stray} rows from {default}" if stray else ""))
+
+    async def _expire(self, session, table: str, name: str) -> None:
+        await session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        self.partitions_detached += 1
+        if self.drop_expired:
+            await session.execute(text(f"DROP TABLE {name}"))
+            self.partitions_dropped += 1
+            logger.info(f"Dropped expired partition {name}")
+        else:
+            logger.info(f"Detached expired partition {name}")
+
+    async def _run(self) -> None:
+        while True:
+            await self.maintain()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping.is_set():
+                return
+
+
+partition_manager = PartitionManager(
+    retention_months={"events": config.EVENTS_RETENTION_MONTHS, "heartbeats": config.HEARTBEATS_RETENTION_MONTHS},
+    months_ahead=config.PARTITION_MONTHS_AHEAD,
+    interval=config.PARTITION_CHECK_INTERVAL,
+    drop_expired=config.PARTITION_DROP_EXPIRED,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create upcoming and expire old monthly partitions once.")
+    parser.add_argument("--months-ahead", type=int, default=config.PARTITION_MONTHS_AHEAD)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    partition_manager.months_ahead = args.months_ahead
+    asyncio.run(partition_manager.maintain())
+    print(partition_manager.stats())
+    if partition_manager.failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Select, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.event import Event
+
+# Columns a caller may ask for; "id" and "date_time" are always returned since they form the cursor
+EVENT_COLUMNS = {column.name: column for column in Event.__table__.columns if column.name != "created_at"}
+DEFAULT_EVENT_COLUMNS = (
+    "id", "date_time", "device_id", "serial_no", "major_event", "minor_event",
+    "person_id", "person_name", "attendance_status", "picture_url",
+)
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidQuery(ValueError):
+    """Raised for unknown columns or a malformed cursor."""
+
+
+@dataclass(frozen=True)
+class EventFilter:
+    device_id: str | None = None
+    person_id: str | None = None
+    attendance_status: str | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+
+def encode_cursor(date_time: datetime, event_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date_time.isoformat()}|{event_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_time, event_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_time), int(event_id)
+    except ValueError as e:
+        raise InvalidQuery(f"Invalid cursor: {cursor!r}") from e
+
+
+def select_columns(columns: tuple[str, ...]) -> Select:
+    """SELECT of the named event columns, each once, in the given order."""
+    unknown = set(columns) - EVENT_COLUMNS.keys()
+    if unknown:
+        raise InvalidQuery(f"Unknown columns: {', '.join(sorted(unknown))}")
+    return select(*(EVENT_COLUMNS[name] for name in dict.fromkeys(columns)))
+
+
+def filter_events(query: Select, event_filter: EventFilter) -> Select:
+    if event_filter.device_id is not None:
+        query = query.where(Event.device_id == event_filter.device_id)
+    if event_filter.person_id is not None:
+        query = query.where(Event.person_id == event_filter.person_id)
+    if event_filter.attendance_status is not None:
+        query = query.where(Event.attendance_status == event_filter.attendance_status)
+    if event_filter.since is not None:
+        query = query.where(Event.date_time >= event_filter.since)
+    if event_filter.until is not None:
+        query = query.where(Event.date_time < event_filter.until)
+    return query
+
+
+def event_page_query(
+    event_filter: EventFilter,
+    columns: tuple[str, ...] = DEFAULT_EVENT_COLUMNS,
+    cursor: str | None = None,
+    limit: int = 100,
+    descending: bool = True,
+) -> Select:
+    """
+    One page of events ordered by ``(date_time, id)``, continuing after ``cursor``.
+
+    The seek condition is a row comparison on ``(date_time, id)``, so every
+    page is an index range scan on one of the composite indexes, however deep
+    into the table it is. ``limit + 1`` rows are selected to tell whether
+    another page follows.
+    """
+    query = filter_events(select_columns(("id", "date_time", *columns)), event_filter)
+
+    key = tuple_(Event.date_time, Event.id)
+    if cursor is not None:
+        date_time, event_id = decode_cursor(cursor)
+        after = tuple_(literal(date_time, Event.date_time.type), literal(event_id, Event.id.type))
+        query = query.where(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(Event.date_time.desc(), Event.id.desc())
+    else:
+        query = query.order_by(Event.date_time, Event.id)
+    return query.limit(min(limit, MAX_PAGE_SIZE) + 1)
+
+
+async def list_events(
+    db: AsyncSession,
+    event_filter: EventFilter,
+    columns: tuple[str, ...] = DEFAULT_EVENT_COLUMNS,
+    cursor: str | None = None,
+    limit: int = 100,
+    descending: bool = True,
+) -> tuple[list[dict], str | None]:
+    """
+    Fetch a page of events as plain dicts.
+
+    :return: The rows and the cursor of the next page, or None on the last page.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    result = await db.execute(event_page_query(event_filter, columns, cursor, limit, descending))
+    rows = [dict(row) for row in result.mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["date_time"], rows[-1]["id"])
+    return rows, next_cursor
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import uuid
+from typing import BinaryIO
+
+import aiofiles
+
+from core import config
+from core.metrics import images_stored
+from operations.packs import PackArchive, PackedImage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore:
+    """
+    Content-addressed image storage under ``root``.
+
+    An image is stored once under the SHA-256 of its bytes, sharded by the
+    first two byte pairs of the digest: ``ab/cd/abcd….jpg``. That key is
+    what goes into ``Event.picture_url``. Two different photos can never
+    share a name, a retransmitted photo is not stored twice, and no
+    directory grows beyond a few thousand entries.
+
+    Files are written to ``root/.tmp`` while the hash is computed and then
+    renamed into place, so a key only ever points at a complete image.
+    Stored files may be shared by several events and are never removed here.
+    Old images may have been moved into the pack archive under ``.packs``;
+    ``locate`` finds an image in either place.
+    """
+
+    def __init__(self, root: str, extension: str = ".jpg"):
+        self.root = root
+        self.extension = extension
+        self.tmp_dir = os.path.join(root, ".tmp")
+        self.variants_dir = os.path.join(root, ".variants")
+        self.archive = PackArchive(os.path.join(root, ".packs"))
+
+    def key_for(self, digest: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{self.extension}"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def variant_path(self, key: str, variant: str) -> str:
+        """Where a derived image (e.g. a thumbnail) of ``key`` is kept."""
+        return os.path.join(self.variants_dir, variant, key)
+
+    def resolve(self, key: str) -> str | None:
+        """Path of a key from a URL, or None if it would leave the store or point into its internal directories."""
+        path = os.path.normpath(os.path.join(self.root, key))
+        root = os.path.normpath(self.root)
+        if os.path.commonpath([root, path]) != root or path == root:
+            return None
+        if os.path.relpath(path, root).split(os.sep)[0] in (".tmp", ".variants", ".packs"):
+            return None
+        return path
+
+    def locate(self, key: str) -> str | PackedImage | None:
+        """The loose file path of a key, its place in a pack, or None."""
+        path = self.resolve(key)
+        if path is None:
+            return None
+        if os.path.exists(path):
+            return path
+        digest = _content_digest(key)
+        return self.archive.find(digest) if digest else None
+
+    def iter_content_files(self):
+        """Yield ``(path, digest)`` of every loose content-addressed image."""
+        for first in _hex_dirs(self.root):
+            for second in _hex_dirs(os.path.join(self.root, first)):
+                directory = os.path.join(self.root, first, second)
+                for name in os.listdir(directory):
+                    digest = _content_digest(f"{first}/{second}/{name}")
+                    if digest:
+                        yield os.path.join(directory, name), digest
+
+    def open_writer(self) -> "ImageWriter":
+        return ImageWriter(self)
+
+    async def save_stream(self, chunks) -> str:
+        """Store an async iterable of byte chunks and return its key."""
+        writer = self.open_writer()
+        try:
+            async for chunk in chunks:
+                await writer.write(chunk)
+        except BaseException:
+            await writer.abort()
+            raise
+        return await writer.commit()
+
+    def save_file(self, file: BinaryIO) -> str:
+        """Store a blocking file object and return its key."""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = self._tmp_path()
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                while chunk := file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+        return self._place(tmp_path, digest.hexdigest())
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+
+    def _place(self, tmp_path: str, digest: str) -> str:
+        key = self.key_for(digest)
+        path = self.path(key)
+        if os.path.exists(path):
+            _remove(tmp_path)
+            images_stored.inc("duplicate")
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        images_stored.inc("new")
+        return key
+
+
+class ImageWriter:
+    """Incremental writer handed out by ``ImageStore.open_writer``; hashes while it writes."""
+
+    def __init__(self, store: ImageStore):
+        self.store = store
+        self._digest = hashlib.sha256()
+        self._tmp_path: str | None = None
+        self._file = None
+
+    async def write(self, chunk: bytes) -> None:
+        if self._file is None:
+            os.makedirs(self.store.tmp_dir, exist_ok=True)
+            self._tmp_path = self.store._tmp_path()
+            self._file = await aiofiles.open(self._tmp_path, "wb")
+        self._digest.update(chunk)
+        await self._file.write(chunk)
+
+    async def commit(self) -> str:
+        """Move the image to its content address and return the key."""
+        if self._file is None:
+            # Empty part: still give it the (shared) key of zero bytes
+            await self.write(b"")
+        await self._file.close()
+        self._file = None
+        return self.store._place(self._tmp_path, self._digest.hexdigest())
+
+    async def abort(self) -> None:
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        if self._tmp_path is not None:
+            _remove(self._tmp_path)
+
+
+def _content_digest(key: str) -> str | None:
+    """The SHA-256 hex digest a content-addressed key is named after."""
+    parts = key.split("/")
+    if len(parts) != 3:
+        return None
+    digest = parts[2].split(".", 1)[0]
+    if len(digest) != 64 or not digest.startswith(parts[0] + parts[1]):
+        return None
+    try:
+        bytes.fromhex(digest)
+    except ValueError:
+        return None
+    return digest
+
+
+def _hex_dirs(path: str) -> list[str]:
+    try:
+        return sorted(name for name in os.listdir(path) if len(name) == 2 and all(c in "0123456789abcdef" for c in name))
+    except FileNotFoundError:
+        return []
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        logger.warning(f"Could not remove temporary image {path}")
+
+
+image_store = ImageStore(config.SAVE_DIR)
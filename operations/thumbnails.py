@@ -0,0 +1,149 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from core import config
+from core.metrics import thumbnails_generated
+from operations.packs import PackedImage
+from operations.storage import ImageStore, image_store
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {"thumb": config.THUMBNAIL_SIZE}
+
+
+def render_thumbnail(src: str | tuple[str, int, int], dst: str, size: int) -> None:
+    """
+    Write a JPEG of at most ``size`` x ``size`` pixels; runs in a pool process.
+
+    :param src: Image file, or ``(pack file, offset, length)`` of a packed image.
+    """
+    if isinstance(src, tuple):
+        pack_path, offset, length = src
+        with open(pack_path, "rb") as f:
+            f.seek(offset)
+            src = io.BytesIO(f.read(length))
+    with Image.open(src) as image:
+        # Lets the JPEG decoder skip most of the pixels of a large photo
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_path = f"{dst}.{os.getpid()}.part"
+        image.save(tmp_path, "JPEG", quality=80, optimize=True)
+    os.replace(tmp_path, dst)
+
+
+def _warm_up() -> None:
+    """Runs once per worker at startup, so the first render does not pay for the import of Pillow."""
+
+
+class ThumbnailPool:
+    """
+    Generates image variants in worker processes, off the event loop.
+
+    ``submit`` is called after an image is stored and never waits: when
+    ``max_pending`` renders are already running the image is skipped and its
+    thumbnail is made on first request instead. ``get`` returns the variant
+    path, rendering it on a miss; concurrent requests for the same variant
+    share one render. ``start`` spawns the workers, so no request waits for
+    interpreters to start; only a pool broken by a dead worker is replaced
+    on demand.
+    """
+
+    def __init__(self, workers: int, max_pending: int, wait: float, store: ImageStore = image_store):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait = wait
+        self.store = store
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the pool must not inherit the logging and event loop threads
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def start(self) -> None:
+        pool = self._pool()
+        for _ in range(self.workers):
+            pool.submit(_warm_up)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
+
+    def submit(self, key: str, variant: str = "thumb") -> None:
+        """Queue eager generation of a variant if there is room."""
+        if len(self._pending) >= self.max_pending:
+            thumbnails_generated.inc("skipped")
+            return
+        path = self.store.variant_path(key, variant)
+        if path not in self._pending and not os.path.exists(path):
+            self._render(key, variant)
+
+    async def get(self, key: str, variant: str = "thumb") -> str | None:
+        """Path of the variant, or None when it cannot be made in time."""
+        path = self.store.variant_path(key, variant)
+        if os.path.exists(path):
+            return path
+        future = self._pending.get(path)
+        if future is None:
+            if len(self._pending) >= self.max_pending:
+                thumbnails_generated.inc("skipped")
+                return None
+            future = self._render(key, variant)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.wait)
+        except Exception:
+            return None
+        return path
+
+    def _render(self, key: str, variant: str) -> asyncio.Future:
+        path = self.store.variant_path(key, variant)
+        source = self.store.locate(key)
+        if isinstance(source, PackedImage):
+            source = (source.pack.data_path, source.offset, source.length)
+        args = (render_thumbnail, source, path, VARIANT_SIZES[variant])
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._pool(), *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool
+            self._executor = None
+            future = loop.run_in_executor(self._pool(), *args)
+        self._pending[path] = future
+        future.add_done_callback(lambda f: self._done(path, f))
+        return future
+
+    def _done(self, path: str, future: asyncio.Future) -> None:
+        self._pending.pop(path, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            thumbnails_generated.inc("ok")
+        else:
+            thumbnails_generated.inc("failed")
+            logger.warning(f"Thumbnail {path} failed: {error!r}")
+            if isinstance(error, BrokenProcessPool):
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "workers": self.workers}
+
+
+thumbnails = ThumbnailPool(
+    workers=config.THUMBNAIL_WORKERS,
+    max_pending=config.THUMBNAIL_MAX_PENDING,
+    wait=config.THUMBNAIL_WAIT,
+)
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from core import config
+from core.metrics import ingest_stage_duration, write_behind_depth
+from db import AsyncSessionLocal, Base
+from operations.crud import insert_rows
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Collects insert parameters in memory and persists them as multi-row INSERTs.
+
+    A flush happens once ``batch_size`` rows are pending or every
+    ``flush_interval`` seconds, whichever comes first. Rows still in the
+    queue when the process dies are lost, so ``stop()`` has to be awaited
+    on shutdown to drain it.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_size: int,
+        retries: int = 3,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._session_factory = session_factory
+        self._queue: asyncio.Queue[tuple[type[Base], dict]] = asyncio.Queue(maxsize=max_size)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+        self._hooks: dict[type[Base], tuple[tuple, Callable[..., Awaitable[None]]]] = {}
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    async def stop(self) -> None:
+        """Flush everything that is still queued and stop the worker."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def put(self, model: type[Base], values: dict) -> None:
+        """
+        Queue a row of ``model`` for insertion. Waits when the queue is full.
+
+        Rows of one model are sent together as an executemany, so they
+        should all carry the same keys (see ``crud.event_values``).
+        """
+        await self._queue.put((model, values))
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def on_insert(self, model: type[Base], columns: tuple, hook: Callable[..., Awaitable[None]]) -> None:
+        """
+        Call ``await hook(session, rows)`` after every flush of ``model`` rows.
+
+        ``rows`` holds ``columns`` of the rows that were actually inserted,
+        not the ones skipped as conflicts, and the hook runs in the flush
+        transaction, so whatever it writes commits or retries with them.
+        """
+        self._hooks[model] = (columns, hook)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+            "max_flush_seconds": round(self.max_flush_seconds, 6),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while not self._queue.empty():
+                size = min(self.batch_size, self._queue.qsize())
+                batch = [self._queue.get_nowait() for _ in range(size)]
+                await self._flush(batch)
+
+            if self._closing:
+                return
+
+    async def _flush(self, batch: list[tuple[type[Base], dict]]) -> None:
+        grouped: dict[type[Base], list[dict]] = defaultdict(list)
+        for model, values in batch:
+            grouped[model].append(values)
+
+        for attempt in range(1, self.retries + 1):
+            started = time.perf_counter()
+            try:
+                async with self._session_factory() as session:
+                    written = await self._insert(session, grouped)
+                    await session.commit()
+            except Exception:
+                logger.exception(f"Write-behind flush of {len(batch)} rows failed (attempt {attempt}/{self.retries})")
+                if attempt < self.retries:
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+                continue
+
+            elapsed = time.perf_counter() - started
+            ingest_stage_duration.observe(elapsed, "db_persist")
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            logger.debug(f"Flushed {len(batch)} rows ({written} new) in {elapsed * 1000:.1f} ms, queue depth {self.depth}")
+            return
+
+        await self._flush_rows(batch)
+
+    async def _insert(self, session, grouped: dict[type[Base], list[dict]]) -> int:
+        """Insert the rows, run the hooks and return how many rows were new."""
+        written = 0
+        for model, rows in grouped.items():
+            # Rows hitting a unique constraint (retransmitted events) are skipped
+            columns, hook = self._hooks.get(model, ((), None))
+            inserted = await insert_rows(model, rows, session, columns)
+            if hook is not None:
+                await hook(session, inserted)
+            written += len(inserted)
+        return written
+
+    async def _flush_rows(self, batch: list[tuple[type[Base], dict]]) -> None:
+        """
+        Last resort after every batch attempt failed: insert row by row.
+
+        Each row gets its own savepoint, so a row the database rejects is
+        dropped on its own instead of taking the whole batch with it.
+        """
+        written = dropped = 0
+        try:
+            async with self._session_factory() as session:
+                for model, values in batch:
+                    try:
+                        async with session.begin_nested():
+                            written += await self._insert(session, {model: [values]})
+                    except Exception:
+                        dropped += 1
+                        logger.exception(f"Dropped a {model.__tablename__} row the database rejects: {values}")
+                await session.commit()
+        except Exception:
+            self.rows_dropped += len(batch)
+            logger.exception(f"Dropped {len(batch)} rows after {self.retries} failed flush attempts")
+            return
+        self.flushes += 1
+        self.rows_written += written
+        self.rows_dropped += dropped
+        logger.warning(f"Flushed {len(batch)} rows one by one: {written} new, {dropped} dropped")
+
+writer = WriteBehindQueue(
+    batch_size=config.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=config.WRITE_BEHIND_FLUSH_INTERVAL,
+    max_size=config.WRITE_BEHIND_MAX_SIZE,
+)
+write_behind_depth.set_function(lambda: {(): writer.depth})
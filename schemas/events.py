@@ -11,6 +11,7 @@ class HeartbeatInfo(BaseModel):
     event_type: Literal["heartBeat"] = Field(alias="eventType", description='Event type. Expected to be "heartBeat".')
     event_state: str = Field(alias="eventState", description='Durative alarm/event status: "active" or "inactive".')
     event_description: str = Field(alias="eventDescription", description='Event description, expected to be "Heartbeat".')
+    device_id: Optional[str] = Field(alias="deviceID", default=None, description="Device ID, if the terminal reports one.")
     
     model_config = ConfigDict(extra='ignore')
 
@@ -51,4 +52,14 @@ class AccessControllerEvent(BaseModel):
 EventUnion = Annotated[
     Union[HeartbeatInfo, EventNotificationAlert],
     Field(discriminator="event_type")
-]
\ No newline at end of file
+]
+
+
+class AcsEventInfo(AccessControllerEvent):
+    """An entry of the ``AcsEvent.InfoList`` returned by an event log search on the device."""
+    major_event: int = Field(alias="major", description="Major event type.")
+    minor_event: int = Field(alias="minor", description="Minor event type.")
+    date_time: datetime = Field(alias="time", description="Event time in ISO 8601 format.")
+    picture_url: Optional[str] = Field(alias="pictureURL", default=None, description="URL of the captured picture on the device.")
+
+    model_config = ConfigDict(extra='ignore')
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class PersonRecord(BaseModel):
+    employee_no: str = Field(alias="employeeNo", description="Employee No. (person ID) on the device.")
+    name: str = Field(description="Person name.")
+    valid_begin: datetime = Field(alias="beginTime", default=datetime(2020, 1, 1), description="Start of the validity period.")
+    valid_end: datetime = Field(alias="endTime", default=datetime(2030, 12, 31, 23, 59, 59), description="End of the validity period.")
+
+    def user_info(self) -> dict:
+        """The ``UserInfo`` entry the device expects for this person."""
+        return {
+            "employeeNo": self.employee_no,
+            "name": self.name,
+            "Valid": {
+                "beginTime": self.valid_begin.strftime("%Y-%m-%dT%H:%M:%S"),
+                "endTime": self.valid_end.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+        }
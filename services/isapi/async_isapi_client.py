@@ -0,0 +1,522 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+
+import httpx
+from pydantic import ValidationError
+
+from core import config
+from schemas.events import AcsEventInfo
+from schemas.persons import PersonRecord
+from services.isapi.multipart import AsyncFaceMultipartBody, ImageSource, spooled
+from services.isapi.isapi_client import ISAPIService
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Page size used when a device does not report AcsEventCond.maxResults
+DEFAULT_EVENT_PAGE_SIZE = 30
+
+
+class ISAPIError(RuntimeError):
+    """Raised by the iterators, which cannot hand back an error response, and for non-JSON answers."""
+
+
+class AsyncISAPIService:
+    """
+    Asyncio counterpart of ``ISAPIService`` with the same methods.
+
+    All instances share one ``httpx.AsyncClient`` so connections to the
+    gateway are pooled per process (``ISAPI_MAX_CONNECTIONS``). Requests to a
+    single ``devIndex`` are additionally capped at
+    ``ISAPI_PER_DEVICE_CONCURRENCY`` so fanning out over hundreds of devices
+    does not pile up on one terminal. Transport errors and 429/5xx gateway
+    responses are retried with exponential backoff and full jitter, those
+    that may follow a processed request only for idempotent calls.
+    """
+    BASE_URL = ISAPIService.BASE_URL
+    AUTH = ISAPIService.AUTH
+
+    _client: httpx.AsyncClient | None = None
+    _device_limits: dict[str, asyncio.Semaphore] = {}
+    _event_page_sizes: dict[str, int] = {}
+
+    def __init__(
+        self,
+        retries: int = config.ISAPI_RETRIES,
+        backoff: float = config.ISAPI_RETRY_BACKOFF,
+        per_device_concurrency: int = config.ISAPI_PER_DEVICE_CONCURRENCY,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.per_device_concurrency = per_device_concurrency
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                auth=cls.AUTH,
+                timeout=httpx.Timeout(config.ISAPI_TIMEOUT, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=config.ISAPI_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.ISAPI_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+        return cls._client
+
+    def _device_limit(self, device_id: str | None) -> asyncio.Semaphore | None:
+        if device_id is None:
+            return None
+        limit = self._device_limits.get(device_id)
+        if limit is None:
+            limit = self._device_limits[device_id] = asyncio.Semaphore(self.per_device_concurrency)
+        return limit
+
+    async def _request(
+        self, method: str, endpoint: str, device_id: str | None = None, idempotent: bool | None = None, **kwargs
+    ) -> dict:
+        """
+        Send one request, retrying where that cannot apply it twice.
+
+        Refused connections and 429 responses never reached the device and
+        are always retried. Other transport errors and 502-504 may come after
+        the device acted, so they are only retried for ``idempotent``
+        requests: GETs, unless the caller says otherwise.
+
+        :raises ISAPIError: When a successful response is not JSON.
+        """
+        if idempotent is None:
+            idempotent = method == "GET"
+        url = f"{self.BASE_URL}{endpoint}"
+        limit = self._device_limit(device_id)
+        for attempt in range(self.retries + 1):
+            try:
+                if limit is None:
+                    response = await self.client().request(method, url, **kwargs)
+                else:
+                    async with limit:
+                        response = await self.client().request(method, url, **kwargs)
+                retry = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUS_CODES)
+                if retry and attempt < self.retries:
+                    await self._sleep(attempt)
+                    continue
+                response.raise_for_status()
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise ISAPIError(f"{method} {endpoint} answered with non-JSON: {response.text[:200]!r}") from e
+            except httpx.HTTPStatusError as e:
+                return {"error": f"HTTP error: {e.response.status_code}", "details": e.response.text}
+            except httpx.TransportError as e:
+                unsent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if (idempotent or unsent) and attempt < self.retries:
+                    await self._sleep(attempt)
+                    continue
+                return {"error": "Request error", "details": str(e)}
+            except httpx.RequestError as e:
+                return {"error": "Request error", "details": str(e)}
+
+    async def _sleep(self, attempt: int) -> None:
+        await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def _post(self, endpoint: str, data: dict, device_id: str | None = None, idempotent: bool = False) -> dict:
+        return await self._request("POST", endpoint, device_id, idempotent, json=data)
+
+    async def _post_files(self, endpoint: str, data: dict = None, files: dict = None, device_id: str | None = None) -> dict:
+        return await self._request("POST", endpoint, device_id, json=data, files=files)
+
+    async def _get(self, endpoint: str, data: str = None, device_id: str | None = None) -> dict:
+        return await self._request("GET", endpoint, device_id)
+
+    async def _put(self, endpoint: str, data: dict, device_id: str | None = None) -> dict:
+        return await self._request("PUT", endpoint, device_id, json=data)
+
+    async def fan_out(
+        self,
+        device_ids: Iterable[str],
+        operation: Callable[..., Awaitable[dict]],
+        *args,
+        **kwargs,
+    ) -> dict[str, dict]:
+        """
+        Run ``operation(device_id, *args, **kwargs)`` for every device concurrently.
+
+        :return: The response per device.
+        """
+        device_ids = list(device_ids)
+        results = await asyncio.gather(*(operation(device_id, *args, **kwargs) for device_id in device_ids))
+        return dict(zip(device_ids, results))
+
+    async def get_all_devices(self, position: int = 0, max_results: int = 100) -> dict:
+        endpoint = "ContentMgmt/DeviceMgmt/deviceList?format=json"
+        payload = {
+            "SearchDescription": {
+                "position": position,
+                "maxResult": max_results,
+                "Filter": {
+                    "key": "",
+                    "devType": "",
+                    "protocolType": ["ehomeV5"],
+                    "devStatus": ["online", "offline"]
+                }
+            }
+        }
+        return await self._post(endpoint, payload, idempotent=True)
+
+    async def iter_devices(self, page_size: int = 100) -> AsyncIterator[dict]:
+        """
+        Yield the ``Device`` entry of every device registered on the gateway.
+
+        :raises ISAPIError: When a page of the device list cannot be fetched.
+        """
+        position = 0
+        while True:
+            response = await self.get_all_devices(position, page_size)
+            if "error" in response:
+                raise ISAPIError(f"Device list failed at position {position}: {response}")
+            result = response.get("SearchResult", {})
+            matches = result.get("MatchList", [])
+            for match in matches:
+                yield match.get("Device", {})
+            position += len(matches)
+            if not matches or position >= result.get("totalMatches", 0):
+                return
+
+    async def get_users_from_device(self, device_id: str) -> dict:
+        endpoint = f"AccessControl/UserInfo/Search?format=json&devIndex={device_id}"
+        payload = {
+            "UserInfoSearchCond": {
+                "searchID": str(uuid.uuid4()),
+                "searchResultPosition": 0,
+                "maxResults": 30
+            }
+        }
+        return await self._post(endpoint, payload, device_id, idempotent=True)
+
+    async def add_person(self, device_id: str, name: str, employee_no: str) -> dict:
+        endpoint = f"AccessControl/UserInfo/Record?format=json&devIndex={device_id}"
+        payload = {
+            "UserInfo": [
+                {
+                    "employeeNo": employee_no,
+                    "name": name,
+                    "Valid": {
+                        "beginTime": "2020-01-01T00:00:00",
+                        "endTime": "2030-12-31T23:59:59"
+                    }
+                }
+            ]
+        }
+        return await self._post(endpoint, payload, device_id)
+
+    async def add_persons(self, device_id: str, persons: Iterable[PersonRecord]) -> dict:
+        """ Records several persons on a device in one request """
+        endpoint = f"AccessControl/UserInfo/Record?format=json&devIndex={device_id}"
+        payload = {
+            "UserInfo": [person.user_info() for person in persons]
+        }
+        return await self._post(endpoint, payload, device_id)
+
+    async def delete_user(self, device_id: str, emp_no: str) -> dict:
+        endpoint = f"AccessControl/UserInfoDetail/Delete?format=json&devIndex={device_id}"
+        payload = {
+            "UserInfoDetail": {
+                "mode": "byEmployeeNo",
+                "EmployeeNoList": [
+                    {
+                        "employeeNo": emp_no
+                    }
+                ]
+            }
+        }
+        return await self._put(endpoint, payload, device_id)
+
+    async def delete_persons(self, device_id: str, *emp_nos: str) -> dict:
+        endpoint = f"AccessControl/UserInfo/Delete?format=json&devIndex={device_id}"
+        payload = {
+            "UserInfoDelCond": {
+                "EmployeeNoList": [
+                    {
+                        "employeeNo": emp_no
+                    } for emp_no in emp_nos
+                ]
+            }
+        }
+        return await self._put(endpoint, payload, device_id)
+
+    async def total_number_of_user(self, device_id: str) -> dict:
+        endpoint = f"AccessControl/UserInfo/Count?format=json&devIndex={device_id}"
+        return await self._get(endpoint, {}, device_id)
+
+    async def add_user_face(
+        self, device_id: str, employee_no: str, image: ImageSource | AsyncIterable[bytes], size: int | None = None
+    ) -> dict:
+        """
+        Uploads a face image for a specific user, streaming it from a path or a stream factory.
+
+        A one-shot async byte stream (e.g. an upload being received) is
+        spooled to a temporary file first, since the body may have to be sent
+        again after the digest challenge or a retry.
+        """
+        if hasattr(image, "__aiter__"):
+            async with spooled(image) as path:
+                return await self.add_user_face(device_id, employee_no, path)
+        endpoint = f"Intelligent/FDLib/FaceDataRecord?format=json&devIndex={device_id}"
+        face_data = {
+            "FaceInfo": {
+                "employeeNo": employee_no,
+                "faceLibType": "blackFD",
+            }
+        }
+        body = AsyncFaceMultipartBody(face_data, image, size)
+        headers = {
+            "Accept": "text/html, application/xhtml+xml",
+            "Accept-Language": "en-US",
+            **body.headers,
+            "Cache-Control": "no-cache"
+        }
+        return await self._request("POST", endpoint, device_id, headers=headers, content=body)
+
+    async def delete_user_face(self, device_id: str, *emp_nos: str) -> dict:
+        """ Deletes face images for a specific user """
+        endpoint = f"Intelligent/FDLib/FDSearch/Delete?format=json&devIndex={device_id}"
+        payload = {
+            "FaceInfoDelCond": {
+                "EmployeeNoList": [
+                    {
+                        "employeeNo": emp_no
+                    } for emp_no in emp_nos
+                ]
+            }
+        }
+        return await self._put(endpoint, payload, device_id)
+
+    async def unlock_all_fucking_doors(self, device_id: str) -> dict:
+        """ Unlocks all doors """
+        endpoint = f"AccessControl/AcsWorkStatus?format=json&devIndex={device_id}"
+        payload = {
+            "DoorOperation": {
+                "doorIndex": 0,
+                "cmd": "unlock"
+            }
+        }
+        return await self._put(endpoint, payload, device_id)
+
+    async def get_events_deprecated(self, device_id: str) -> dict:
+        endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
+        payload = {
+            "AcsEventCond": {
+                "searchID": "123",
+                "searchResultPosition": 100,
+                "maxResults": 30,
+                "major": 5,
+                "minor": 0
+            }
+        }
+        return await self._post(endpoint, payload, device_id, idempotent=True)
+
+    async def get_events(self, device_id: str = ..., position: int = 0, max_results: int = 30) -> dict:
+        endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
+        payload = {
+            "AcsEventCond": {
+                "searchID": str(uuid.uuid4()),
+                "searchResultPosition": position,
+                "maxResults": max_results,
+                "major": 5,
+                "minor": 0,
+                "timeReverseOrder": True
+            }
+        }
+        return await self._post(endpoint, payload, device_id, idempotent=True)
+
+    async def get_events_by_serial(self, device_id: str, begin_serial_no: int, end_serial_no: int, position: int = 0, max_results: int = 30) -> dict:
+        """ Searches the device event log for a range of event serial numbers """
+        endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
+        payload = {
+            "AcsEventCond": {
+                "searchID": str(uuid.uuid4()),
+                "searchResultPosition": position,
+                "maxResults": max_results,
+                "major": 0,
+                "minor": 0,
+                "beginSerialNo": begin_serial_no,
+                "endSerialNo": end_serial_no
+            }
+        }
+        return await self._post(endpoint, payload, device_id, idempotent=True)
+
+    async def get_event_capabilities(self, device_id: str) -> dict:
+        endpoint = f"AccessControl/AcsEvent/capabilities?format=json&devIndex={device_id}"
+        return await self._get(endpoint, None, device_id)
+
+    async def search_events(
+        self,
+        device_id: str,
+        search_id: str,
+        position: int = 0,
+        max_results: int = DEFAULT_EVENT_PAGE_SIZE,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        major: int = 0,
+        minor: int = 0,
+        begin_serial_no: int | None = None,
+        end_serial_no: int | None = None,
+    ) -> dict:
+        """ Fetches one page of an AcsEvent search; ``major``/``minor`` 0 match every type """
+        endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
+        cond = {
+            "searchID": search_id,
+            "searchResultPosition": position,
+            "maxResults": max_results,
+            "major": major,
+            "minor": minor,
+        }
+        if start_time is not None:
+            cond["startTime"] = start_time.isoformat(timespec="seconds")
+        if end_time is not None:
+            cond["endTime"] = end_time.isoformat(timespec="seconds")
+        if begin_serial_no is not None:
+            cond["beginSerialNo"] = begin_serial_no
+        if end_serial_no is not None:
+            cond["endSerialNo"] = end_serial_no
+        return await self._post(endpoint, {"AcsEventCond": cond}, device_id, idempotent=True)
+
+    async def event_page_size(self, device_id: str) -> int:
+        """The largest ``maxResults`` the device accepts for event searches, cached per device."""
+        page_size = self._event_page_sizes.get(device_id)
+        if page_size is None:
+            response = await self.get_event_capabilities(device_id)
+            max_results = response.get("AcsEvent", {}).get("AcsEventCond", {}).get("maxResults", {})
+            try:
+                page_size = int(max_results.get("@max", DEFAULT_EVENT_PAGE_SIZE))
+            except (AttributeError, TypeError, ValueError):
+                page_size = DEFAULT_EVENT_PAGE_SIZE
+            page_size = max(page_size, 1)
+            if "error" in response:
+                # Not cached, so the next scan asks again
+                logger.warning(f"No AcsEvent capabilities from {device_id}, using pages of {page_size}: {response}")
+            else:
+                self._event_page_sizes[device_id] = page_size
+        return page_size
+
+    async def iter_events(
+        self,
+        device_id: str,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        major: int = 0,
+        minor: int = 0,
+        begin_serial_no: int | None = None,
+        end_serial_no: int | None = None,
+        page_size: int | None = None,
+    ) -> AsyncIterator[AcsEventInfo]:
+        """
+        Walk the device event log page by page and yield every matching event.
+
+        Each scan gets its own ``searchID`` so concurrent scans of the same
+        device do not step on each other's cursor. Entries that fail
+        validation are logged and skipped.
+
+        :raises ISAPIError: When the device or gateway answers with an error.
+        """
+        page_size = page_size or await self.event_page_size(device_id)
+        search_id = str(uuid.uuid4())
+        position = 0
+        while True:
+            response = await self.search_events(
+                device_id, search_id, position, page_size, start_time, end_time,
+                major, minor, begin_serial_no, end_serial_no,
+            )
+            if "error" in response:
+                raise ISAPIError(f"Event search on {device_id} failed: {response}")
+            result = response.get("AcsEvent", {})
+            infos = result.get("InfoList", [])
+            for raw in infos:
+                try:
+                    yield AcsEventInfo.model_validate(raw)
+                except ValidationError as ve:
+                    logger.warning(f"Skipping unparseable event from {device_id}: {ve}")
+            position += len(infos)
+            if result.get("responseStatusStrg") != "MORE" or not infos:
+                return
+
+    async def iter_events_many(
+        self,
+        device_ids: Iterable[str],
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        major: int = 0,
+        minor: int = 0,
+        buffer_size: int = 1000,
+    ) -> AsyncIterator[tuple[str, AcsEventInfo]]:
+        """
+        Scan several devices at once and yield ``(device_id, event)`` as pages arrive.
+
+        Events of one device keep their order; devices are interleaved. At most
+        ``buffer_size`` events are held while the consumer catches up. A device
+        whose scan fails is logged and dropped without stopping the others.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        done = object()
+
+        async def scan(device_id: str) -> None:
+            try:
+                async for info in self.iter_events(device_id, start_time, end_time, major, minor):
+                    await queue.put((device_id, info))
+            except ISAPIError as e:
+                logger.error(str(e))
+            except Exception:
+                logger.exception(f"Event scan of {device_id} failed")
+            # Not in a finally: once the consumer has stopped and cancelled the
+            # scans, nothing drains the queue and this put would never return
+            await queue.put(done)
+
+        tasks = [asyncio.create_task(scan(device_id)) for device_id in device_ids]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_device_info(self, device_name: str) -> dict:
+        endpoint = "ContentMgmt/DeviceMgmt/deviceList?format=json"
+        payload = {
+            "SearchDescription": {
+                "position": 0,
+                "maxResult": 100,
+                "Filter": {
+                    "key": "",
+                    "devType": "AccessControl",
+                    "protocolType": [
+                        "ehomeV5"
+                    ],
+                    "devStatus": [
+                        "online",
+                        "offline"
+                    ],
+                    "EhomeParams": {
+                        "EhomeID": device_name
+                    }
+                }
+            }
+        }
+        return await self._post(endpoint, payload, idempotent=True)
+
+    @classmethod
+    async def close(cls):
+        """Close the shared client; the next request opens a new one."""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
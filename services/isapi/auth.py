@@ -0,0 +1,60 @@
+import threading
+import typing
+
+import httpx
+
+
+class DigestAuthSession(httpx.DigestAuth):
+    """
+    Digest auth that keeps one challenge per gateway and counts how it is used.
+
+    After the first 401 the server nonce and realm are cached and every
+    later request is signed up front with an incremented nonce count, so a
+    call costs a single round-trip. Only when the gateway rejects the cached
+    nonce (it went stale) is the challenge repeated. The instance is meant to
+    be shared by all clients talking to the same gateway; nonce-count updates
+    are serialised so threads using the sync client do not reuse a count.
+    """
+
+    def __init__(self, username: str | bytes, password: str | bytes) -> None:
+        super().__init__(username, password)
+        self._lock = threading.Lock()
+        self.challenges = 0
+        self.reused = 0
+        self.stale = 0
+
+    def auth_flow(self, request: httpx.Request) -> typing.Generator[httpx.Request, httpx.Response, None]:
+        flow = super().auth_flow(request)
+        request = next(flow)
+        preemptive = "Authorization" in request.headers
+        response = yield request
+
+        try:
+            retry = flow.send(response)
+        except StopIteration:
+            if preemptive:
+                self.reused += 1
+            return
+
+        # The gateway answered 401: either the first challenge or a stale nonce
+        if preemptive:
+            self.stale += 1
+        self.challenges += 1
+        response = yield retry
+        try:
+            flow.send(response)
+        except StopIteration:
+            pass
+
+    def _build_auth_header(self, request: httpx.Request, challenge) -> str:
+        with self._lock:
+            return super()._build_auth_header(request, challenge)
+
+    def stats(self) -> dict:
+        signed = self.reused + self.challenges
+        return {
+            "challenges": self.challenges,
+            "reused": self.reused,
+            "stale": self.stale,
+            "reuse_rate": round(self.reused / signed, 4) if signed else 0.0,
+        }
@@ -1,7 +1,9 @@
 import httpx
-import json
 import os
-from httpx import DigestAuth
+import uuid
+
+from services.isapi.auth import DigestAuthSession
+from services.isapi.multipart import FaceMultipartBody
 
 
 
@@ -13,7 +15,8 @@ class ISAPIService:
         raise ValueError("DEVICE_GATEWAY_USERNAME or DEVICE_GATEWAY_PASSWORD environment variable is not set.")
     if not BASE_URL:
         raise ValueError("BASE_URL environment variable is not set.")
-    AUTH = DigestAuth(username, password)
+    # One digest session per process: the cached nonce is reused by every client
+    AUTH = DigestAuthSession(username, password)
 
     def __init__(self, terminal_id: str = None):
         self.client = httpx.Client(auth=self.AUTH, timeout=90.0)
@@ -146,31 +149,20 @@ class ISAPIService:
                 "faceLibType": "blackFD",
             }
         }
-        boundary = "---------------------------7e13971310878"
-        multipart_data = f"--{boundary}\r\n"
-        multipart_data += 'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
-        multipart_data += "Content-Type: application/json\r\n\r\n"
-        multipart_data += json.dumps(face_data) + "\r\n"
-        multipart_data += f"--{boundary}\r\n"
-        multipart_data += 'Content-Disposition: form-data; name="FaceImage"; filename="face.jpg"\r\n'
-        multipart_data += "Content-Type: image/jpeg\r\n\r\n"
-        
-        with open(image_path, "rb") as img_file:
-            image_data = img_file.read()
-        
-        multipart_data = multipart_data.encode() + image_data + f"\r\n--{boundary}--\r\n".encode()
+        # Streamed from disk: only the multipart framing is held in memory
+        body = FaceMultipartBody(face_data, image_path)
         
         headers = {
             "Accept": "text/html, application/xhtml+xml",
             "Accept-Language": "en-US",
-            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            **body.headers,
             "User-Agent": "Mozilla/5.0 (compatible; MSIE 9.0; Windows NT 6.1; WOW64; Trident/5.0)",
             "Accept-Encoding": "gzip, deflate",
             "Connection": "Keep-Alive",
             "Cache-Control": "no-cache"
         }
         
-        response = self.client.post(f"{self.BASE_URL}{endpoint}", headers=headers, content=multipart_data)
+        response = self.client.post(f"{self.BASE_URL}{endpoint}", headers=headers, content=body)
         
         try:
             response.raise_for_status()
@@ -222,7 +214,7 @@ class ISAPIService:
         endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
         payload = {
             "AcsEventCond": {
-                "searchID": "123",
+                "searchID": str(uuid.uuid4()),
                 "searchResultPosition": position,
                 "maxResults": max_results,
                 "major": 5,
@@ -232,6 +224,22 @@ class ISAPIService:
         }
         return self._post(endpoint, payload)
     
+    def get_events_by_serial(self, device_id: str, begin_serial_no: int, end_serial_no: int, position: int = 0, max_results: int = 30) -> dict:
+        """ Searches the device event log for a range of event serial numbers """
+        endpoint = f"AccessControl/AcsEvent?format=json&devIndex={device_id}"
+        payload = {
+            "AcsEventCond": {
+                "searchID": str(uuid.uuid4()),
+                "searchResultPosition": position,
+                "maxResults": max_results,
+                "major": 0,
+                "minor": 0,
+                "beginSerialNo": begin_serial_no,
+                "endSerialNo": end_serial_no
+            }
+        }
+        return self._post(endpoint, payload)
+    
     def get_device_info(self, device_name: str) -> dict:
         endpoint = "ContentMgmt/DeviceMgmt/deviceList?format=json"
         payload = {
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, AsyncIterator, Callable, Iterator
+
+import aiofiles
+
+CHUNK_SIZE = 64 * 1024
+
+# Called once per send, so the body can be resent after a digest challenge or a retry
+ImageFactory = Callable[[], AsyncIterable[bytes]]
+ImageSource = str | os.PathLike | ImageFactory
+
+
+class _FaceMultipart:
+    """
+    The ``FaceDataRecord`` multipart body: a JSON part followed by the JPEG.
+
+    Only the two small framing blocks are held in memory; the image is read
+    from its source in ``chunk_size`` pieces while the request is sent.
+    The source is opened anew on every iteration, so a digest-auth
+    challenge or a retry resends the body without buffering it.
+    """
+
+    def __init__(self, face_data: dict, image: ImageSource, size: int | None = None, chunk_size: int = CHUNK_SIZE):
+        if hasattr(image, "__aiter__"):
+            raise TypeError("A one-shot stream cannot be resent; pass a path or a factory, or spool it first")
+        self.boundary = f"---------------------------{uuid.uuid4().hex}"
+        self.image = image
+        self.chunk_size = chunk_size
+        self.head = (
+            f"--{self.boundary}\r\n"
+            'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
+            "Content-Type: application/json\r\n\r\n"
+            f"{json.dumps(face_data)}\r\n"
+            f"--{self.boundary}\r\n"
+            'Content-Disposition: form-data; name="FaceImage"; filename="face.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        if size is None and isinstance(image, (str, os.PathLike)):
+            size = os.path.getsize(image)
+        self.size = size
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+        if self.size is not None:
+            headers["Content-Length"] = str(len(self.head) + self.size + len(self.tail))
+        return headers
+
+
+class FaceMultipartBody(_FaceMultipart):
+    """Blocking variant for ``httpx.Client``; the image has to be a path."""
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.head
+        with open(self.image, "rb") as img_file:
+            while chunk := img_file.read(self.chunk_size):
+                yield chunk
+        yield self.tail
+
+
+class AsyncFaceMultipartBody(_FaceMultipart):
+    """Variant for ``httpx.AsyncClient``; the image is a path or a factory of async byte streams."""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self.head
+        if isinstance(self.image, (str, os.PathLike)):
+            async with aiofiles.open(self.image, "rb") as img_file:
+                while chunk := await img_file.read(self.chunk_size):
+                    yield chunk
+        else:
+            async for chunk in self.image():
+                yield chunk
+        yield self.tail
+
+
+@asynccontextmanager
+async def spooled(stream: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Copy a one-shot byte stream into a temporary file, removed on exit, so it can be sent more than once."""
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    os.close(fd)
+    try:
+        async with aiofiles.open(path, "wb") as img_file:
+            async for chunk in stream:
+                await img_file.write(chunk)
+        yield path
+    finally:
+        os.remove(path)
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+from typing import Iterable
+
+from core import config
+from schemas.persons import PersonRecord
+from services.isapi.async_isapi_client import AsyncISAPIService
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+
+# device_id -> employee_no -> "ok" or the error reported for that person
+ResultMatrix = dict[str, dict[str, str]]
+
+
+def load_progress(path: str | None) -> ResultMatrix:
+    """Replay a progress log; later lines win, a line cut short by a crash is ignored."""
+    results: ResultMatrix = {}
+    if not path or not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring incomplete line in {path}")
+                continue
+            results.setdefault(entry["device"], {}).update(entry["statuses"])
+    return results
+
+
+class ProgressLog:
+    """
+    Append-only JSON Lines log of the statuses of a run.
+
+    Every batch or face appends one short line with only the statuses it
+    changed, so the cost of saving does not grow with the size of the
+    matrix. On open, the previous log is compacted to one line per device.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._file = None
+
+    def open(self) -> ResultMatrix:
+        results = load_progress(self.path)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for device_id, statuses in results.items():
+                    f.write(_progress_line(device_id, statuses))
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+        return results
+
+    def append(self, device_id: str, statuses: dict[str, str]) -> None:
+        if self._file is not None:
+            self._file.write(_progress_line(device_id, statuses))
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _progress_line(device_id: str, statuses: dict[str, str]) -> str:
+    return json.dumps({"device": device_id, "statuses": statuses}) + "\n"
+
+
+def response_status(response: dict) -> str:
+    """``ok`` or the error of a response that covers a single record."""
+    if "error" in response:
+        return f"{response['error']}: {response.get('details', '')}".strip(": ")
+    if response.get("statusCode", 1) != 1:
+        return response.get("subStatusCode") or response.get("statusString") or json.dumps(response)
+    return OK
+
+
+def batch_statuses(persons: list[PersonRecord], response: dict) -> dict[str, str]:
+    """
+    Split a ``UserInfo/Record`` response into a status per employee number.
+
+    The device either answers for the whole request or lists the failed
+    persons in ``UserInfoOutList``; everyone not listed there was recorded.
+    """
+    failed = response.get("UserInfoOutList", {}).get("UserInfoOut", [])
+    if not failed:
+        status = response_status(response)
+        return {person.employee_no: status for person in persons}
+
+    statuses = {person.employee_no: OK for person in persons}
+    for entry in failed:
+        if entry.get("errorCode", 1) != 1 and entry.get("employeeNo") in statuses:
+            statuses[entry["employeeNo"]] = entry.get("errorMsg") or f"error code {entry['errorCode']}"
+    return statuses
+
+
+async def provision_persons(
+    device_ids: Iterable[str],
+    persons: Iterable[PersonRecord],
+    batch_size: int = config.PROVISION_BATCH_SIZE,
+    concurrency: int = config.PROVISION_CONCURRENCY,
+    progress_path: str | None = None,
+    service: AsyncISAPIService | None = None,
+) -> ResultMatrix:
+    """
+    Record every person on every device.
+
+    Persons are sent ``batch_size`` per request and up to ``concurrency``
+    devices are worked on at the same time. With ``progress_path`` the
+    statuses of every batch are appended to a ``ProgressLog`` that is read
+    back on the next run, so only pairs that did not succeed are sent again.
+
+    :return: Status per device and employee number.
+    """
+    service = service or AsyncISAPIService()
+    persons = list(persons)
+    progress = ProgressLog(progress_path)
+    results = progress.open()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def provision_device(device_id: str) -> None:
+        done = results.setdefault(device_id, {})
+        pending = [person for person in persons if done.get(person.employee_no) != OK]
+        async with limit:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                response = await service.add_persons(device_id, batch)
+                statuses = batch_statuses(batch, response)
+                done.update(statuses)
+                progress.append(device_id, statuses)
+        failures = sum(1 for status in done.values() if status != OK)
+        logger.info(f"Provisioned {len(pending)} persons on {device_id}, {failures} failed")
+
+    try:
+        await asyncio.gather(*(provision_device(device_id) for device_id in device_ids))
+    finally:
+        progress.close()
+    return results
+
+
+async def enrol_faces(
+    device_ids: Iterable[str],
+    faces: dict[str, str],
+    concurrency: int = config.PROVISION_CONCURRENCY,
+    progress_path: str | None = None,
+    service: AsyncISAPIService | None = None,
+) -> ResultMatrix:
+    """
+    Upload a face image per employee number to every device.
+
+    Images are streamed from disk, so memory does not grow with the number
+    of uploads in flight; at most ``concurrency`` run at once. Progress is
+    kept the same way as for ``provision_persons``.
+
+    :param faces: Image path per employee number.
+    :return: Status per device and employee number.
+    """
+    service = service or AsyncISAPIService()
+    progress = ProgressLog(progress_path)
+    results = progress.open()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def enrol(device_id: str, employee_no: str, image_path: str) -> None:
+        async with limit:
+            response = await service.add_user_face(device_id, employee_no, image_path)
+        status = results[device_id][employee_no] = response_status(response)
+        progress.append(device_id, {employee_no: status})
+
+    uploads = []
+    for device_id in device_ids:
+        done = results.setdefault(device_id, {})
+        uploads.extend(
+            enrol(device_id, employee_no, image_path)
+            for employee_no, image_path in faces.items()
+            if done.get(employee_no) != OK
+        )
+    try:
+        await asyncio.gather(*uploads)
+    finally:
+        progress.close()
+    return results
+
+
+def read_persons(path: str) -> list[PersonRecord]:
+    """Read persons from a CSV file with ``employeeNo`` and ``name`` columns."""
+    with open(path, newline="") as f:
+        return [PersonRecord.model_validate(row) for row in csv.DictReader(f)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record persons on many devices.")
+    parser.add_argument("persons", help="CSV file with employeeNo,name[,beginTime,endTime] columns")
+    parser.add_argument("devices", nargs="+", help="devIndex of every target device")
+    parser.add_argument("--progress", default="provisioning.jsonl", help="progress log, reused to resume")
+    parser.add_argument("--batch-size", type=int, default=config.PROVISION_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=config.PROVISION_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run() -> ResultMatrix:
+        try:
+            return await provision_persons(
+                args.devices, read_persons(args.persons), args.batch_size, args.concurrency, args.progress
+            )
+        finally:
+            await AsyncISAPIService.close()
+
+    results = asyncio.run(run())
+    failed = {device: {no: status for no, status in row.items() if status != OK} for device, row in results.items()}
+    failed = {device: row for device, row in failed.items() if row}
+    print(json.dumps(failed, indent=2) if failed else "All persons provisioned.")
+
+
+if __name__ == "__main__":
+    main()
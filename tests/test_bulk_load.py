@@ -0,0 +1,32 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from operations import bulk_load
+
+
+def record(at: datetime) -> tuple:
+    values = [None] * len(bulk_load.COLUMNS)
+    values[bulk_load.COLUMNS.index("date_time")] = at
+    return tuple(values)
+
+
+def test_month_partitions_are_created_once_before_merging(monkeypatch):
+    calls = []
+
+    async def ensure_months(table, months):
+        calls.append((table, sorted(months)))
+
+    monkeypatch.setattr(bulk_load.partition_manager, "ensure_months", ensure_months)
+    tashkent = timezone(timedelta(hours=5))
+    ensured = set()
+
+    async def run():
+        # 2025-03-01 02:00 in Tashkent is still February in UTC
+        await bulk_load._ensure_partitions([record(datetime(2025, 3, 1, 2, tzinfo=tashkent))], ensured)
+        await bulk_load._ensure_partitions(
+            [record(datetime(2025, 2, 10, tzinfo=timezone.utc)), record(datetime(2025, 4, 2, tzinfo=timezone.utc))],
+            ensured,
+        )
+
+    asyncio.run(run())
+    assert calls == [("events", [date(2025, 2, 1)]), ("events", [date(2025, 4, 1)])]
@@ -0,0 +1,37 @@
+from operations.dedup import RecentSerials
+from schemas.events import EventNotificationAlert
+
+
+def event(serial_no: int, date_time: str) -> EventNotificationAlert:
+    return EventNotificationAlert.model_validate({
+        "dateTime": date_time,
+        "activePostCount": 1,
+        "eventType": "AccessControllerEvent",
+        "eventState": "active",
+        "eventDescription": "Access Controller Event",
+        "deviceID": "door-1",
+        "AccessControllerEvent": {"majorEventType": 5, "subEventType": 75, "serialNo": serial_no},
+    })
+
+
+def test_retransmission_is_dropped():
+    serials = RecentSerials(per_device=10)
+    first = event(41, "2026-10-17T08:00:00+05:00")
+    assert serials.is_new(first)
+    serials.remember(first)
+    assert not serials.is_new(event(41, "2026-10-17T08:00:00+05:00"))
+    assert serials.stats()["duplicates"] == 1
+
+
+def test_serial_reused_after_a_reset_is_new():
+    serials = RecentSerials(per_device=10)
+    serials.remember(event(1, "2026-10-16T08:00:00+05:00"))
+    assert serials.is_new(event(1, "2026-10-17T09:30:00+05:00"))
+
+
+def test_oldest_serials_are_forgotten():
+    serials = RecentSerials(per_device=2)
+    for serial_no in (1, 2, 3):
+        serials.remember(event(serial_no, "2026-10-17T08:00:00+05:00"))
+    assert serials.is_new(event(1, "2026-10-17T08:00:00+05:00"))
+    assert not serials.is_new(event(3, "2026-10-17T08:00:00+05:00"))
@@ -0,0 +1,52 @@
+import asyncio
+
+from operations.devices import DeviceRecord, DeviceRegistry
+
+
+class FlakyService:
+    """The first device list fails with an unexpected error, later ones succeed."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def iter_devices(self, page_size):
+        self.calls += 1
+        if self.calls == 1:
+            raise KeyError("devIndex")
+        yield {"devIndex": "IDX-1", "EhomeParams": {"EhomeID": "terminal-1"}}
+
+
+def test_refresh_loop_survives_unexpected_errors():
+    service = FlakyService()
+    registry = DeviceRegistry(refresh_interval=0, page_size=10, miss_refresh_interval=0, service=service)
+
+    async def run():
+        registry.start()
+        while service.calls < 2:
+            await asyncio.sleep(0)
+        await registry.stop()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=2))
+    stats = registry.stats()
+    assert stats["refresh_failures"] == 1
+    assert stats["refreshes"] >= 1
+    assert registry.get("terminal-1").dev_index == "IDX-1"
+
+
+def test_lookups_are_counted_for_metrics():
+    from core.metrics import device_registry_lookups
+
+    def lookups() -> dict:
+        return {tuple(labels): value for labels, value in device_registry_lookups._series()}
+
+    registry = DeviceRegistry(refresh_interval=0, page_size=10, miss_refresh_interval=0, service=FlakyService())
+    registry._devices = {"terminal-1": DeviceRecord("terminal-1", "IDX-1")}
+    before = lookups()
+
+    registry.get("terminal-1")
+    registry.get("terminal-1")
+    registry.get("terminal-2")
+
+    after = lookups()
+    assert after[("hit",)] - before.get(("hit",), 0) == 2
+    assert after[("miss",)] - before.get(("miss",), 0) == 1
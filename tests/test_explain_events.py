@@ -0,0 +1,35 @@
+"""
+Plan checks of the event query shapes against a real database.
+
+Runs ``benchmarks.explain_events`` when ``DATABASE_URL`` points at a
+migrated PostgreSQL; skipped otherwise.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks import explain_events
+from core import config
+
+
+def events_table_available() -> bool:
+    async def check() -> bool:
+        engine = create_async_engine(config.DATABASE_URL)
+        try:
+            async with engine.connect() as conn:
+                return (await conn.execute(text("SELECT to_regclass('events')"))).scalar() is not None
+        finally:
+            await engine.dispose()
+
+    try:
+        return asyncio.run(check())
+    except Exception:
+        return False
+
+
+@pytest.mark.skipif(not events_table_available(), reason="needs a migrated PostgreSQL at DATABASE_URL")
+def test_every_query_shape_walks_an_index(capsys):
+    failures = asyncio.run(explain_events.main(50_000))
+    assert failures == 0, capsys.readouterr().out
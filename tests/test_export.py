@@ -0,0 +1,83 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from models.event import PersonPurpose
+from operations.export import encode_csv, encode_ndjson, export_events
+from operations.queries import EventFilter, InvalidQuery
+
+AT = datetime(2026, 10, 17, 3, 0, tzinfo=timezone.utc)
+COLUMNS = ["id", "date_time", "person_name", "purpose"]
+CHUNKS = [
+    [(1, AT, "Dilnoza, \"Ops\"", PersonPurpose.ATTENDANCE)],
+    [(2, AT, None, PersonPurpose.INFORMATION), (3, AT, "Ørsted", PersonPurpose.ATTENDANCE)],
+]
+
+
+async def chunks(blocks=CHUNKS):
+    for rows in blocks:
+        yield rows
+
+
+async def collect(blocks) -> list[str]:
+    return [block async for block in blocks]
+
+
+def test_csv_has_a_header_and_one_block_per_chunk():
+    blocks = asyncio.run(collect(encode_csv(COLUMNS, chunks())))
+    assert len(blocks) == 2
+    rows = list(csv.reader(io.StringIO("".join(blocks))))
+    assert rows[0] == COLUMNS
+    assert rows[1] == ["1", AT.isoformat(), "Dilnoza, \"Ops\"", PersonPurpose.ATTENDANCE.value]
+    assert rows[2][2] == ""
+    assert len(rows) == 4
+
+
+def test_csv_of_nothing_is_the_header():
+    assert asyncio.run(collect(encode_csv(COLUMNS, chunks([])))) == ["id,date_time,person_name,purpose\r\n"]
+
+
+def test_ndjson_is_one_object_per_line():
+    text = "".join(asyncio.run(collect(encode_ndjson(COLUMNS, chunks()))))
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert [line["id"] for line in lines] == [1, 2, 3]
+    assert lines[0]["date_time"] == AT.isoformat()
+    assert lines[1]["person_name"] is None
+    assert lines[2]["person_name"] == "Ørsted"
+    assert text.endswith("\n")
+
+
+def test_export_reads_through_a_server_side_cursor():
+    seen = {}
+
+    class Result:
+        async def partitions(self):
+            for rows in CHUNKS:
+                yield rows
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def stream(self, query):
+            seen["query"] = query
+            return Result()
+
+    blocks = export_events(EventFilter(), tuple(COLUMNS), "ndjson", chunk_size=2, session_factory=Session)
+    assert "query" not in seen
+    assert len(asyncio.run(collect(blocks))) == 2
+    assert seen["query"].get_execution_options()["yield_per"] == 2
+
+
+def test_unknown_format_or_column_fails_before_streaming():
+    with pytest.raises(InvalidQuery):
+        export_events(EventFilter(), output_format="xlsx")
+    with pytest.raises(InvalidQuery):
+        export_events(EventFilter(), columns=("id", "nope"))
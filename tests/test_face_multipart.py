@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+import pytest
+
+from services.isapi.async_isapi_client import AsyncISAPIService
+from services.isapi.multipart import AsyncFaceMultipartBody
+
+IMAGE = b"\xff\xd8" + bytes(range(256)) * 1000 + b"\xff\xd9"
+
+
+async def image_stream():
+    for start in range(0, len(IMAGE), 4096):
+        yield IMAGE[start:start + 4096]
+
+
+async def collect(body) -> bytes:
+    return b"".join([chunk async for chunk in body])
+
+
+def test_body_is_resent_whole_from_a_path(tmp_path):
+    path = tmp_path / "face.jpg"
+    path.write_bytes(IMAGE)
+    body = AsyncFaceMultipartBody({"FaceInfo": {}}, path, chunk_size=1000)
+
+    async def run():
+        return await collect(body), await collect(body)
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(first) == int(body.headers["Content-Length"])
+    assert IMAGE in first
+
+
+def test_body_is_resent_whole_from_a_factory():
+    body = AsyncFaceMultipartBody({"FaceInfo": {}}, image_stream, size=len(IMAGE))
+
+    async def run():
+        return await collect(body), await collect(body)
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(first) == int(body.headers["Content-Length"])
+
+
+def test_one_shot_stream_is_rejected():
+    with pytest.raises(TypeError):
+        AsyncFaceMultipartBody({"FaceInfo": {}}, image_stream())
+
+
+def test_add_user_face_spools_a_one_shot_stream():
+    class ChallengedService(AsyncISAPIService):
+        """Sends the body twice, like a digest challenge followed by the authenticated request."""
+
+        async def _request(self, method, endpoint, device_id=None, **kwargs):
+            self.sent = [await collect(kwargs["content"]) for _ in range(2)]
+            self.spool = kwargs["content"].image
+            return {"statusCode": 1}
+
+    service = ChallengedService()
+    assert asyncio.run(service.add_user_face("dev", "42", image_stream())) == {"statusCode": 1}
+    assert service.sent[0] == service.sent[1]
+    assert IMAGE in service.sent[0]
+    assert not os.path.exists(service.spool)
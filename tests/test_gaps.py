@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from core import config
+from core.metrics import serial_gap_lag
+from operations import gaps as gaps_module
+from operations.gaps import GapBackfiller, SerialGap
+from schemas.events import AcsEventInfo
+
+NOW = datetime(2026, 10, 17, 12, tzinfo=timezone.utc)
+
+
+class FakeSession:
+    """Answers the gap query with ``rows`` and keeps the statements it got."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return self.rows
+
+
+def backfiller(**kwargs) -> GapBackfiller:
+    options = {"interval": 60, "grace": 120, "lookback": 3600, "max_size": 1000, "max_open": 2, **kwargs}
+    return GapBackfiller(**options)
+
+
+def test_gaps_are_found_in_stored_serials_and_resets_skipped():
+    gaps = backfiller()
+    before = NOW - timedelta(minutes=5)
+    session = FakeSession([
+        ("door-1", 11, 12, 2, before - timedelta(seconds=30), before),
+        ("door-2", 101, 5099, 4999, before - timedelta(seconds=30), before),
+    ])
+    found = asyncio.run(gaps.find_gaps(session, NOW))
+
+    assert [(gap.device_id, gap.first, gap.last) for gap in found] == [("door-1", 11, 12)]
+    assert (found[0].after, found[0].before) == (before - timedelta(seconds=30), before)
+    assert gaps.gaps_detected == 1
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "lag(events.serial_no) OVER (PARTITION BY events.device_id ORDER BY events.serial_no)" in sql
+
+
+def test_scans_continue_where_the_previous_one_stopped():
+    gaps = backfiller()
+    session = FakeSession([])
+    asyncio.run(gaps.find_gaps(session, NOW))
+    asyncio.run(gaps.find_gaps(session, NOW + timedelta(seconds=60)))
+
+    def bounds(statement):
+        return sorted(value for value in statement.compile().params.values() if isinstance(value, datetime))
+
+    hour, grace = timedelta(hours=1), timedelta(seconds=120)
+    # The first scan after a start looks back a whole window, with a window of context before it
+    assert bounds(session.statements[0]) == [NOW - grace - 2 * hour, NOW - grace - hour, NOW - grace]
+    assert bounds(session.statements[1]) == [NOW - grace - hour, NOW - grace, NOW + timedelta(seconds=60) - grace]
+
+
+def test_failed_backfills_are_retried_until_the_limit():
+    class Failing(GapBackfiller):
+        async def backfill(self, gap):
+            raise ConnectionError("device offline")
+
+    gaps = Failing(interval=0, grace=0, lookback=60, max_size=10, max_open=1, max_attempts=2)
+
+    async def run():
+        await gaps._attempt(SerialGap("door-1", 1, 2))
+        await gaps._attempt(SerialGap("door-2", 5, 5))
+        assert gaps.stats()["gaps_open"] == 1
+        assert gaps.stats()["gaps_discarded"] == 1
+        for gap in gaps._take_due():
+            await gaps._attempt(gap)
+
+    asyncio.run(run())
+    assert gaps.stats()["gaps_failed"] == 1
+    assert gaps.stats()["gaps_open"] == 0
+
+
+class LockSession(FakeSession):
+    """Grants the advisory lock and records whether it is still open."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.open = False
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            self.statements.append(statement)
+            return FakeResult(True)
+        return await super().execute(statement, params)
+
+    async def __aenter__(self):
+        self.open = True
+        return self
+
+    async def __aexit__(self, *exc):
+        self.open = False
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+def test_lock_session_is_closed_before_devices_are_asked():
+    session = LockSession([("door-1", 11, 12, 2, NOW - timedelta(minutes=6), NOW - timedelta(minutes=5))])
+    backfilled = []
+
+    class Recording(GapBackfiller):
+        async def backfill(self, gap):
+            backfilled.append((gap.device_id, session.open))
+
+    gaps = Recording(interval=60, grace=120, lookback=3600, max_size=10, max_open=1, session_factory=lambda: session)
+    asyncio.run(gaps.run_once(NOW))
+
+    assert backfilled == [("door-1", False)]
+
+
+def test_backfill_keeps_log_entries_between_the_stored_neighbours(monkeypatch):
+    after, before = NOW - timedelta(minutes=10), NOW - timedelta(minutes=5)
+
+    def entry(serial_no, when):
+        return AcsEventInfo.model_validate({"major": 5, "minor": 75, "serialNo": serial_no, "time": when.isoformat()})
+
+    class Registry:
+        async def dev_index(self, device_id):
+            return "dev-1"
+
+    class Service:
+        def iter_events(self, dev_index, begin_serial_no, end_serial_no):
+            async def events():
+                yield entry(11, after + timedelta(minutes=1))
+                # Same serial from before a reset of the numbering
+                yield entry(12, after - timedelta(days=30))
+                yield entry(12, (before - timedelta(minutes=1)).replace(tzinfo=None))
+            return events()
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        async def commit(self):
+            pass
+
+    inserted = []
+
+    async def insert_rows(model, rows, session, returning):
+        inserted.extend(rows)
+        return rows
+
+    async def missing(gap):
+        return {11, 12}
+
+    monkeypatch.setattr(gaps_module, "insert_rows", insert_rows)
+    monkeypatch.setattr(config, "DAILY_ATTENDANCE_ENABLED", False)
+    gaps = GapBackfiller(
+        interval=60, grace=120, lookback=3600, max_size=10, max_open=1,
+        registry=Registry(), session_factory=Session,
+    )
+    gaps._service = Service()
+    gaps._missing_serials = missing
+    lag_count = sum(sum(counts) for _, (counts, _) in serial_gap_lag._series())
+
+    recovered = asyncio.run(gaps.backfill(SerialGap("door-1", 11, 12, after, before)))
+
+    assert recovered == 2
+    assert [(row["serial_no"], row["date_time"].day) for row in inserted] == [(11, 17), (12, 17)]
+    assert sum(sum(counts) for _, (counts, _) in serial_gap_lag._series()) == lag_count + 1
@@ -0,0 +1,89 @@
+import io
+import os
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from operations import images
+from operations.images import IMMUTABLE_CACHE_CONTROL, LEGACY_CACHE_CONTROL
+from operations.storage import ImageStore
+
+IMAGE = os.urandom(300 * 1024)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path))
+    monkeypatch.setattr(main, "image_response", partial(images.image_response, store=store))
+    return store
+
+
+@pytest.fixture
+def client():
+    # Without entering the client, the lifespan and its background workers do not start
+    return TestClient(main.app)
+
+
+def test_content_key_is_served_with_immutable_caching(store, client):
+    key = store.save_file(io.BytesIO(IMAGE))
+
+    response = client.get(f"/images/{key}")
+
+    assert response.status_code == 200
+    assert response.content == IMAGE
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["content-length"] == str(len(IMAGE))
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{key.split("/")[2].split(".")[0]}"'
+
+
+def test_matching_etag_gets_304(store, client):
+    key = store.save_file(io.BytesIO(IMAGE))
+    etag = client.get(f"/images/{key}").headers["etag"]
+
+    response = client.get(f"/images/{key}", headers={"if-none-match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_range_and_head(store, client):
+    key = store.save_file(io.BytesIO(IMAGE))
+
+    partial_response = client.get(f"/images/{key}", headers={"range": "bytes=100-199"})
+    head = client.head(f"/images/{key}")
+
+    assert partial_response.status_code == 206
+    assert partial_response.content == IMAGE[100:200]
+    assert head.status_code == 200
+    assert head.headers["content-length"] == str(len(IMAGE))
+    assert head.content == b""
+
+
+def test_large_file_takes_chunked_path(store, client, monkeypatch):
+    monkeypatch.setattr(images.ImageResponse, "single_read_limit", 1024)
+    key = store.save_file(io.BytesIO(IMAGE))
+
+    response = client.get(f"/images/{key}")
+
+    assert response.content == IMAGE
+
+
+def test_legacy_name_is_revalidated(store, client):
+    with open(os.path.join(store.root, "20240101_120000_Picture.jpg"), "wb") as f:
+        f.write(IMAGE)
+
+    response = client.get("/images/20240101_120000_Picture.jpg")
+
+    assert response.status_code == 200
+    assert response.content == IMAGE
+    assert response.headers["cache-control"] == LEGACY_CACHE_CONTROL
+    assert response.headers["etag"].startswith('W/"')
+
+
+def test_unknown_and_escaping_keys(store, client):
+    assert client.get("/images/00/00/missing.jpg").status_code == 404
+    assert client.get("/images/.tmp/anything.part").status_code == 404
+    assert client.get("/images/00/00/missing.jpg?size=huge").status_code == 400
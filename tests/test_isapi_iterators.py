@@ -0,0 +1,47 @@
+import asyncio
+
+from services.isapi.async_isapi_client import AsyncISAPIService, ISAPIError
+
+
+class EndlessLogService(AsyncISAPIService):
+    """A device log that never ends, or fails right away for ``broken``."""
+
+    async def iter_events(self, device_id, *args, **kwargs):
+        if device_id == "broken":
+            raise ISAPIError("no such device")
+        serial = 0
+        while True:
+            serial += 1
+            yield serial
+
+
+def test_iter_events_many_closes_early_with_a_full_buffer():
+    async def run():
+        events = EndlessLogService().iter_events_many(["a", "b", "broken"], buffer_size=2)
+        received = []
+        async for item in events:
+            received.append(item)
+            if len(received) == 5:
+                break
+        # The scans are parked on a full queue; closing must still return
+        await asyncio.wait_for(events.aclose(), timeout=2)
+        return received
+
+    received = asyncio.run(run())
+    assert len(received) == 5
+    assert {device_id for device_id, _ in received} <= {"a", "b"}
+
+
+def test_iter_events_many_ends_when_every_scan_is_done():
+    class ShortLogService(AsyncISAPIService):
+        async def iter_events(self, device_id, *args, **kwargs):
+            if device_id == "broken":
+                raise ISAPIError("no such device")
+            for serial in range(3):
+                yield serial
+
+    async def run():
+        return [item async for item in ShortLogService().iter_events_many(["a", "b", "broken"], buffer_size=1)]
+
+    received = asyncio.run(run())
+    assert sorted(received) == [("a", 0), ("a", 1), ("a", 2), ("b", 0), ("b", 1), ("b", 2)]
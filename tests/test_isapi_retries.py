@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.isapi.async_isapi_client import AsyncISAPIService, ISAPIError
+
+
+def run_with(handler, call):
+    """Run ``call(service)`` against a gateway answered by ``handler``; returns its result and the requests made."""
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request, len(requests))
+
+    async def run():
+        AsyncISAPIService._client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        try:
+            return await call(AsyncISAPIService(retries=2, backoff=0))
+        finally:
+            await AsyncISAPIService.close()
+
+    return asyncio.run(run()), requests
+
+
+def unavailable_once(request, count):
+    return httpx.Response(503) if count == 1 else httpx.Response(200, json={"ok": True})
+
+
+def test_get_is_retried():
+    result, requests = run_with(unavailable_once, lambda service: service.total_number_of_user("dev"))
+    assert result == {"ok": True}
+    assert len(requests) == 2
+
+
+def test_post_that_may_have_been_applied_is_not_retried():
+    result, requests = run_with(unavailable_once, lambda service: service.add_person("dev", "Ann", "42"))
+    assert result["error"] == "HTTP error: 503"
+    assert len(requests) == 1
+
+
+def test_idempotent_post_is_retried():
+    result, requests = run_with(unavailable_once, lambda service: service.get_users_from_device("dev"))
+    assert result == {"ok": True}
+    assert len(requests) == 2
+
+
+def test_refused_connection_is_retried_for_any_method():
+    def refused_once(request, count):
+        if count == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    result, requests = run_with(refused_once, lambda service: service.add_person("dev", "Ann", "42"))
+    assert result == {"ok": True}
+    assert len(requests) == 2
+
+
+def test_non_json_answer_raises():
+    with pytest.raises(ISAPIError):
+        run_with(lambda request, count: httpx.Response(200, text="<html>"), lambda service: service.total_number_of_user("dev"))
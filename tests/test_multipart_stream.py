@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from operations.multipart_stream import EventMultipartReader, MultipartStreamError
+from operations.storage import ImageStore, ImageWriter
+
+BOUNDARY = "MIME_boundary"
+IMAGE = os.urandom(1024 * 1024)
+EVENT = {
+    "dateTime": "2026-10-17T08:00:00+05:00",
+    "activePostCount": 1,
+    "eventType": "AccessControllerEvent",
+    "eventState": "active",
+    "eventDescription": "Access Controller Event",
+    "deviceID": "door-1",
+    "AccessControllerEvent": {"majorEventType": 5, "subEventType": 75, "serialNo": 41},
+}
+
+
+class RecordingWriter(ImageWriter):
+    async def write(self, chunk: bytes) -> None:
+        self.store.largest_write = max(self.store.largest_write, len(chunk))
+        await super().write(chunk)
+
+
+class RecordingStore(ImageStore):
+    """Stores for real and records how many images were opened and the largest single write."""
+
+    def __init__(self, root):
+        super().__init__(str(root))
+        self.opened = 0
+        self.largest_write = 0
+
+    def open_writer(self) -> ImageWriter:
+        self.opened += 1
+        return RecordingWriter(self)
+
+
+def body(image_first: bool = False) -> bytes:
+    event = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="event_log"\r\n'
+        "Content-Type: application/json\r\n\r\n"
+        f"{json.dumps(EVENT)}\r\n"
+    ).encode()
+    image = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="Picture"; filename="Picture.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + IMAGE + b"\r\n"
+    parts = image + event if image_first else event + image
+    return parts + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def chunked(data: bytes, size: int = 8192):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def read(store, data: bytes, **kwargs):
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    reader = EventMultipartReader(headers, chunked(data), store=store, **kwargs)
+    return asyncio.run(reader.read())
+
+
+def test_images_are_streamed_to_the_store_chunk_by_chunk(tmp_path):
+    store = RecordingStore(tmp_path)
+    form = read(store, body())
+
+    assert form.event.access_controller_event.serial_no == 41
+    key = form.files["Picture"]
+    with open(store.path(key), "rb") as f:
+        assert f.read() == IMAGE
+    # Never more than one network chunk of the image in memory
+    assert 0 < store.largest_write <= 8192
+    assert all(not part.data for part in form.fields if part.is_file)
+
+
+def test_duplicate_event_skips_the_images_that_follow(tmp_path):
+    store = RecordingStore(tmp_path)
+    form = read(store, body(), accept_event=lambda event: False)
+
+    assert not form.accepted
+    assert form.files == {}
+    assert store.opened == 0
+
+
+def test_duplicate_event_after_its_image_leaves_no_files_on_the_form(tmp_path):
+    store = RecordingStore(tmp_path)
+    form = read(store, body(image_first=True), accept_event=lambda event: False)
+
+    assert not form.accepted
+    assert form.files == {}
+
+
+def test_oversized_event_field_is_rejected(tmp_path):
+    with pytest.raises(MultipartStreamError):
+        read(RecordingStore(tmp_path), body(), max_field_size=64)
+
+
+@pytest.mark.parametrize("data", [
+    b"garbage",
+    f"--{BOUNDARY}\r\nnot a header line\r\n\r\nx\r\n--{BOUNDARY}--\r\n".encode(),
+])
+def test_malformed_body_is_a_stream_error(tmp_path, data):
+    with pytest.raises(MultipartStreamError):
+        read(RecordingStore(tmp_path), data)
+
+
+def test_malformed_body_is_rejected_with_400_and_counted():
+    from fastapi.testclient import TestClient
+
+    import main
+    from core.metrics import events_rejected
+
+    def malformed() -> float:
+        return dict((tuple(labels), value) for labels, value in events_rejected._series()).get(("malformed",), 0)
+
+    before = malformed()
+    # Without entering the client, the lifespan and its background workers do not start
+    response = TestClient(main.app).post(
+        "/hik/events", content=b"garbage", headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+    assert response.status_code == 400
+    assert malformed() == before + 1
@@ -0,0 +1,72 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from operations.packs import INDEX_HEADER, INDEX_RECORD, Pack, PackArchive, PackedImage, PackWriter, compact
+from operations.storage import ImageStore
+
+
+def images(count: int) -> list[bytes]:
+    return [os.urandom(1000 + n * 37) for n in range(count)]
+
+
+def test_pack_round_trip_through_the_mmapped_index(tmp_path):
+    contents = images(50)
+    writer = PackWriter(str(tmp_path))
+    for content in contents:
+        writer.add(hashlib.sha256(content).digest(), content)
+    writer.close()
+
+    assert os.path.getsize(writer.index_path) == INDEX_HEADER.size + 50 * INDEX_RECORD.size
+    pack = Pack(writer.index_path)
+    assert pack.count == 50
+    for content in contents:
+        found = pack.find(hashlib.sha256(content).digest())
+        assert bytes(found.view()) == content
+    # Digests below, between and above the stored ones
+    assert pack.find(b"\x00" * 32) is None
+    assert pack.find(b"\xff" * 32) is None
+    assert pack.find(hashlib.sha256(b"not packed").digest()) is None
+
+
+def test_foreign_file_is_not_taken_for_an_index(tmp_path):
+    path = tmp_path / "pack-0-x.idx"
+    path.write_bytes(b"x" * 64)
+
+    with pytest.raises(ValueError):
+        Pack(str(path))
+
+
+def test_compaction_moves_images_into_packs_and_keeps_them_locatable(tmp_path):
+    store = ImageStore(str(tmp_path))
+    contents = images(20)
+    keys = [store.save_file(io.BytesIO(content)) for content in contents]
+
+    stats = compact(store, older_than=-1, pack_size=10_000)
+
+    assert stats["images"] == 20
+    assert stats["packs"] > 1
+    assert list(store.iter_content_files()) == []
+    for key, content in zip(keys, contents):
+        located = store.locate(key)
+        assert isinstance(located, PackedImage)
+        assert bytes(located.view()) == content
+    # A second run has nothing left to pack
+    assert compact(store, older_than=-1, pack_size=10_000)["images"] == 0
+
+
+def test_archive_sees_packs_written_after_it_was_opened(tmp_path):
+    archive = PackArchive(str(tmp_path))
+    content = b"late image"
+    digest = hashlib.sha256(content)
+    assert archive.find(digest.hexdigest()) is None
+
+    writer = PackWriter(str(tmp_path))
+    writer.add(digest.digest(), content)
+    writer.close()
+    # The directory mtime may not have ticked since the first lookup
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+
+    assert bytes(archive.find(digest.hexdigest()).view()) == content
@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+from operations.partitions import PartitionManager, add_months, month_bounds
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalars(self):
+        return iter(self.value)
+
+    def scalar(self):
+        return self.value
+
+
+class FakeSession:
+    """Records statements; ``stray`` rows per month sit in the default partition, ``broken`` months fail."""
+
+    def __init__(self, partitions, stray=None, broken=()):
+        self.partitions = partitions
+        self.stray = stray or {}
+        self.broken = broken
+        self.statements = []
+        self.rolled_back = 0
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        try:
+            yield
+        except Exception:
+            self.rolled_back += 1
+            raise
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "pg_inherits" in sql:
+            return FakeResult(self.partitions)
+        if sql.startswith("SELECT count(*)"):
+            month = params["start"].date()
+            return FakeResult(self.stray.get(month, 0))
+        if sql.startswith("CREATE TABLE") and any(f"events_{m:%Y_%m} " in sql for m in self.broken):
+            raise RuntimeError("cannot create")
+        return FakeResult(None)
+
+    async def commit(self):
+        self.committed = True
+
+
+def maintain(session, now):
+    manager = PartitionManager({"events": 0}, months_ahead=2, interval=60, session_factory=lambda: session)
+    asyncio.run(manager.maintain(now))
+    return manager
+
+
+def test_month_bounds_span_one_utc_month():
+    assert month_bounds(date(2025, 12, 1)) == (
+        datetime(2025, 12, 1, tzinfo=timezone.utc), datetime(2026, 1, 1, tzinfo=timezone.utc),
+    )
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+
+
+def test_rows_in_default_partition_are_moved_into_the_new_month():
+    session = FakeSession(["events_2026_10", "events_default"], stray={date(2026, 11, 1): 7})
+    manager = maintain(session, datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    ddl = [sql for sql in session.statements if not sql.startswith("SELECT")]
+    assert ddl == [
+        "ALTER TABLE events DETACH PARTITION events_default",
+        ddl[1],
+        "INSERT INTO events_2026_11 SELECT * FROM events_default WHERE date_time >= :start AND date_time < :end",
+        "DELETE FROM events_default WHERE date_time >= :start AND date_time < :end",
+        "ALTER TABLE events ATTACH PARTITION events_default DEFAULT",
+        ddl[5],
+    ]
+    assert "events_2026_11 PARTITION OF events" in ddl[1]
+    assert "events_2026_12 PARTITION OF events" in ddl[5]
+    assert manager.partitions_created == 2
+    assert manager.rows_moved_from_default == 7
+    assert session.committed
+
+
+def test_a_failing_month_does_not_block_the_others():
+    session = FakeSession(["events_default"], broken=[date(2026, 11, 1)])
+    manager = maintain(session, datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    created = [sql for sql in session.statements if sql.startswith("CREATE TABLE")]
+    assert len(created) == 3
+    assert session.rolled_back == 1
+    assert manager.partitions_created == 2
+    assert manager.failures == 1
+    assert session.committed
@@ -0,0 +1,57 @@
+import asyncio
+
+from schemas.persons import PersonRecord
+from services.isapi.provisioning import OK, ProgressLog, load_progress, provision_persons
+
+
+class FakeService:
+    """Accepts every person except those in ``rejected``."""
+
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.sent = []
+
+    async def add_persons(self, device_id, batch):
+        self.sent.append((device_id, [person.employee_no for person in batch]))
+        failed = [
+            {"employeeNo": person.employee_no, "errorCode": 2, "errorMsg": "employeeNoAlreadyExist"}
+            for person in batch if person.employee_no in self.rejected
+        ]
+        return {"statusCode": 1, "UserInfoOutList": {"UserInfoOut": failed}} if failed else {"statusCode": 1}
+
+
+def persons(count: int) -> list[PersonRecord]:
+    return [PersonRecord.model_validate({"employeeNo": str(n), "name": f"Person {n}"}) for n in range(count)]
+
+
+def test_progress_is_appended_per_batch_and_resumed(tmp_path):
+    path = str(tmp_path / "progress.jsonl")
+    first = FakeService(rejected={"3"})
+    results = asyncio.run(provision_persons(["door-1", "door-2"], persons(5), 2, 2, path, first))
+
+    assert results["door-1"]["3"] == "employeeNoAlreadyExist"
+    # One line per batch: three batches on each of two devices
+    with open(path) as f:
+        assert len(f.readlines()) == 6
+    assert load_progress(path) == results
+
+    second = FakeService()
+    results = asyncio.run(provision_persons(["door-1", "door-2"], persons(5), 2, 2, path, second))
+
+    assert sorted(second.sent) == [("door-1", ["3"]), ("door-2", ["3"])]
+    assert all(status == OK for row in results.values() for status in row.values())
+    # Compacted on open, then one line per device for the retried batch
+    with open(path) as f:
+        assert len(f.readlines()) == 4
+
+
+def test_line_cut_short_by_a_crash_is_ignored(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    path.write_text('{"device": "door-1", "statuses": {"1": "ok"}}\n{"device": "door-1", "stat')
+
+    log = ProgressLog(str(path))
+    assert log.open() == {"door-1": {"1": "ok"}}
+    log.append("door-1", {"2": "ok"})
+    log.close()
+
+    assert load_progress(str(path)) == {"door-1": {"1": "ok", "2": "ok"}}
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+import asyncio
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from operations.queries import EventFilter, InvalidQuery, decode_cursor, encode_cursor, event_page_query, list_events
+
+
+def test_cursor_round_trip():
+    at = datetime(2026, 10, 17, 8, 30, 15, 123456, tzinfo=timezone(timedelta(hours=5)))
+    cursor = encode_cursor(at, 987654321)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (at, 987654321)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidQuery):
+        decode_cursor(cursor)
+
+
+def test_page_query_seeks_past_the_cursor_on_the_index_order():
+    cursor = encode_cursor(datetime(2026, 10, 17, tzinfo=timezone.utc), 42)
+    query = event_page_query(EventFilter(device_id="door-1"), cursor=cursor, limit=50)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert "(events.date_time, events.id) < (" in sql
+    assert "ORDER BY events.date_time DESC, events.id DESC" in sql
+    assert query._limit == 51
+    params = query.compile().params
+    assert datetime(2026, 10, 17, tzinfo=timezone.utc) in params.values() and 42 in params.values()
+
+
+def test_unknown_columns_are_rejected():
+    with pytest.raises(InvalidQuery):
+        event_page_query(EventFilter(), columns=("id", "password"))
+
+
+def test_next_page_starts_after_the_last_row_returned():
+    start = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    rows = [{"id": n, "date_time": start - timedelta(minutes=n)} for n in range(1, 5)]
+
+    class Result:
+        def mappings(self):
+            return rows
+
+    class Session:
+        async def execute(self, query):
+            return Result()
+
+    page, cursor = asyncio.run(list_events(Session(), EventFilter(), limit=3))
+    assert [row["id"] for row in page] == [1, 2, 3]
+    assert decode_cursor(cursor) == (start - timedelta(minutes=3), 3)
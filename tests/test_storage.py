@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import io
+import os
+
+from operations.storage import ImageStore
+
+IMAGE = os.urandom(200 * 1024)
+DIGEST = hashlib.sha256(IMAGE).hexdigest()
+
+
+async def chunks(content: bytes, size: int = 7000):
+    for start in range(0, len(content), size):
+        yield content[start:start + size]
+
+
+def test_key_is_sharded_by_digest(tmp_path):
+    store = ImageStore(str(tmp_path))
+
+    key = store.save_file(io.BytesIO(IMAGE))
+
+    assert key == f"{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.jpg"
+    with open(tmp_path / DIGEST[:2] / DIGEST[2:4] / f"{DIGEST}.jpg", "rb") as f:
+        assert f.read() == IMAGE
+    assert os.listdir(tmp_path / ".tmp") == []
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = ImageStore(str(tmp_path))
+
+    first = store.save_file(io.BytesIO(IMAGE))
+    second = asyncio.run(store.save_stream(chunks(IMAGE)))
+    other = store.save_file(io.BytesIO(IMAGE[::-1]))
+
+    assert first == second != other
+    assert sorted(digest for _, digest in store.iter_content_files()) == sorted([DIGEST, hashlib.sha256(IMAGE[::-1]).hexdigest()])
+    assert os.listdir(tmp_path / ".tmp") == []
+
+
+def test_aborted_stream_leaves_nothing(tmp_path):
+    store = ImageStore(str(tmp_path))
+
+    async def failing():
+        yield IMAGE[:1000]
+        raise ConnectionResetError
+
+    try:
+        asyncio.run(store.save_stream(failing()))
+    except ConnectionResetError:
+        pass
+
+    assert list(store.iter_content_files()) == []
+    assert os.listdir(tmp_path / ".tmp") == []
+
+
+def test_keys_outside_the_store_are_refused(tmp_path):
+    store = ImageStore(str(tmp_path))
+    key = store.save_file(io.BytesIO(IMAGE))
+
+    assert store.locate(key) == store.path(key)
+    assert store.locate("../etc/passwd") is None
+    assert store.locate(".tmp/x.part") is None
+    assert store.locate(".variants/thumb/" + key) is None
+    assert store.locate("00/00/" + "0" * 64 + ".jpg") is None
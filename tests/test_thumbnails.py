@@ -0,0 +1,74 @@
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from operations.packs import compact
+from operations.storage import ImageStore
+from operations.thumbnails import VARIANT_SIZES, ThumbnailPool
+
+
+def photo(width: int = 1600, height: int = 1200) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path))
+
+
+@pytest.fixture
+def pool(store):
+    pool = ThumbnailPool(workers=1, max_pending=4, wait=30, store=store)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def test_thumbnail_is_rendered_and_then_served_from_disk(store, pool):
+    key = store.save_file(io.BytesIO(photo()))
+
+    async def run():
+        first = await pool.get(key)
+        mtime = os.stat(first).st_mtime_ns
+        again = await pool.get(key)
+        return first, mtime, again
+
+    first, mtime, again = asyncio.run(run())
+
+    assert first == again == store.variant_path(key, "thumb")
+    # The second request found the file and did not render again
+    assert os.stat(again).st_mtime_ns == mtime
+    with Image.open(first) as thumbnail:
+        assert thumbnail.format == "JPEG"
+        assert max(thumbnail.size) == VARIANT_SIZES["thumb"]
+
+
+def test_submitted_thumbnails_are_rendered_once(store, pool):
+    key = store.save_file(io.BytesIO(photo()))
+
+    async def run():
+        pool.submit(key)
+        pool.submit(key)
+        assert pool.stats()["pending"] == 1
+        return await pool.get(key)
+
+    path = asyncio.run(run())
+
+    assert os.path.exists(path)
+    assert pool.stats()["pending"] == 0
+
+
+def test_thumbnail_of_a_packed_image(store, pool):
+    key = store.save_file(io.BytesIO(photo(640, 480)))
+    compact(store, older_than=-1, pack_size=1 << 20)
+    assert not os.path.exists(store.path(key))
+
+    path = asyncio.run(pool.get(key))
+
+    with Image.open(path) as thumbnail:
+        assert thumbnail.size[0] / thumbnail.size[1] == pytest.approx(640 / 480, rel=0.02)
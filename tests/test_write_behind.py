@@ -0,0 +1,137 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from models.event import Event, Heartbeat
+from operations.write_behind import WriteBehindQueue
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeDatabase:
+    """
+    Stands in for the session factory.
+
+    The first ``outages`` batches fail, any statement containing a ``bad``
+    row fails, and rows already stored under the same ``serial_no`` are
+    skipped like ``ON CONFLICT DO NOTHING``.
+    """
+
+    def __init__(self, outages=0):
+        self.outages = outages
+        self.stored = []
+        self.executions = 0
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        mark = len(self.pending)
+        try:
+            yield
+        except Exception:
+            del self.pending[mark:]
+            raise
+
+    async def execute(self, statement, rows):
+        self.db.executions += 1
+        if self.db.outages:
+            self.db.outages -= 1
+            raise ConnectionError("database unavailable")
+        if any(row.get("bad") for row in rows):
+            raise ValueError("value out of range")
+        seen = {row.get("serial_no") for row in self.db.stored + self.pending}
+        inserted = [row for row in rows if row.get("serial_no") is None or row["serial_no"] not in seen]
+        self.pending.extend(inserted)
+        return FakeResult(inserted)
+
+    async def commit(self):
+        self.db.stored.extend(self.pending)
+        self.pending = []
+
+
+def write(db, rows, **kwargs):
+    queue = WriteBehindQueue(batch_size=100, flush_interval=60, max_size=1000, session_factory=db, **kwargs)
+
+    async def run():
+        queue.start()
+        for model, values in rows:
+            await queue.put(model, values)
+        await queue.stop()
+
+    asyncio.run(run())
+    return queue
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda seconds: sleep(0))
+
+
+def test_flush_counts_only_inserted_rows():
+    db = FakeDatabase()
+    db.stored.append({"serial_no": 1})
+    queue = write(db, [(Event, {"serial_no": n}) for n in (1, 2, 3)] + [(Heartbeat, {"event_type": "heartBeat"})])
+    assert queue.stats()["rows_written"] == 3
+    assert queue.stats()["rows_dropped"] == 0
+    assert len(db.stored) == 4
+
+
+def test_hook_sees_the_inserted_rows_in_the_flush_transaction():
+    db = FakeDatabase()
+    seen = []
+
+    async def hook(session, rows):
+        seen.append((session.pending[:], rows))
+
+    queue = WriteBehindQueue(batch_size=100, flush_interval=60, max_size=1000, session_factory=db)
+    queue.on_insert(Event, (Event.serial_no,), hook)
+
+    async def run():
+        queue.start()
+        await queue.put(Event, {"serial_no": 7})
+        await queue.stop()
+
+    asyncio.run(run())
+    assert seen == [([{"serial_no": 7}], [{"serial_no": 7}])]
+
+
+def test_failed_flush_is_retried(no_backoff):
+    db = FakeDatabase(outages=2)
+    queue = write(db, [(Event, {"serial_no": n}) for n in range(5)], retries=3)
+    assert queue.stats()["rows_written"] == 5
+    assert queue.stats()["flushes"] == 1
+    assert len(db.stored) == 5
+
+
+def test_a_bad_row_is_dropped_alone_after_the_last_retry(no_backoff):
+    db = FakeDatabase()
+    rows = [(Event, {"serial_no": 1}), (Event, {"serial_no": 2, "bad": True}), (Event, {"serial_no": 3})]
+    queue = write(db, rows, retries=2)
+    assert queue.stats()["rows_written"] == 2
+    assert queue.stats()["rows_dropped"] == 1
+    assert [row["serial_no"] for row in db.stored] == [1, 3]
@@ -1,72 +1,88 @@
 import logging
+
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
 from rich.pretty import Pretty
+
+from core.logs import event_logger, sampler
 from schemas.events import EventNotificationAlert, HeartbeatInfo
 
 console = Console()
 
-def log_pretty_event(event: EventNotificationAlert) -> None:
-    """Pretty print and log an EventNotificationAlert."""
-    
-    # Prepare header
-    header_text = Text(f"📡 Event Type: {event.event_type}", style="bold cyan")
-    header_text.append(f" | 📅 Time: {event.date_time}", style="dim")
 
-    # Create core metadata block
-    core_data = {
-        "Device ID": event.device_id,
-        "Event State": event.event_state,
-        "Description": event.event_description,
-        "Post Count": event.active_post_count,
-        "Date Time": str(event.date_time),
-        "Major Event": event.access_controller_event.major_event,
-        "Minor Event": event.access_controller_event.minor_event,
-    }
+def log_event(event: EventNotificationAlert) -> None:
+    """Log a received EventNotificationAlert as a structured record, subject to sampling."""
+    if not sampler.should_log(event.event_type):
+        return
 
-    # Prepare inner AccessControllerEvent data if available
-    ace = event.access_controller_event or None
-    if ace:
-        ace_data = {
-            "Employee No": ace.person_id,
-            "Employee Name": ace.person_name,
-            "Verify Mode": ace.current_verify_mode,
-            "Attendance Status": ace.attendance_status,
-            "User Type": ace.user_type,
-            "Card No": ace.card_no,
-            "Swipe Type": ace.swipe_card_type,
-            "Mask": ace.mask,
-            "Pictures": ace.pictures_number,
-        }
+    ace = event.access_controller_event
+    fields = {
+        "event_type": event.event_type,
+        "device_id": event.device_id,
+        "date_time": event.date_time,
+        "event_state": event.event_state,
+        "description": event.event_description,
+        "post_count": event.active_post_count,
+        "major_event": ace.major_event,
+        "minor_event": ace.minor_event,
+        "serial_no": ace.serial_no,
+        "employee_no": ace.person_id,
+        "employee_name": ace.person_name,
+        "verify_mode": ace.current_verify_mode,
+        "attendance_status": ace.attendance_status,
+        "user_type": ace.user_type,
+        "card_no": ace.card_no,
+        "swipe_type": ace.swipe_card_type,
+        "mask": ace.mask,
+        "pictures": ace.pictures_number,
+    }
+    event_logger.info(
+        f"[Event] {event.event_type} from {event.device_id} at {event.date_time}",
+        extra={"fields": {k: v for k, v in fields.items() if v is not None}},
+    )
 
-        # Merge into core data for display
-        core_data |= {f"[AC] {k}": v for k, v in ace_data.items() if v is not None}
 
-    # Use rich Panel to output
-    console.print(Panel(Pretty(core_data, expand_all=True), title=header_text))
+def log_heartbeat(heartbeat: HeartbeatInfo) -> None:
+    """Log a received HeartbeatInfo as a structured record, subject to sampling."""
+    if not sampler.should_log(heartbeat.event_type):
+        return
 
-    # Additionally log to standard logger if needed
-    logging.info(f"[Event] {event.event_type} from {event.device_id} at {event.date_time}")
+    fields = {
+        "event_type": heartbeat.event_type,
+        "device_id": heartbeat.device_id,
+        "date_time": heartbeat.date_time,
+        "event_state": heartbeat.event_state,
+        "description": heartbeat.event_description,
+        "post_count": heartbeat.active_post_count,
+    }
+    event_logger.info(
+        f"[Heartbeat] at {heartbeat.date_time}",
+        extra={"fields": {k: v for k, v in fields.items() if v is not None}},
+    )
 
 
-def log_pretty_heartbeat(heartbeat: HeartbeatInfo) -> None:
-    """Pretty print and log a HeartbeatInfo."""
-    
-    # Prepare header
-    header_text = Text("💓 Heartbeat Event", style="bold green")
-    header_text.append(f" | 📅 Time: {heartbeat.date_time}", style="dim")
+class RichPanelHandler(logging.Handler):
+    """
+    Development sink that renders received events as rich panels.
 
-    # Create core metadata block
-    core_data = {
-        "Active Post Count": heartbeat.active_post_count,
-        "Event State": heartbeat.event_state,
-        "Description": heartbeat.event_description,
-        "Date Time": str(heartbeat.date_time),
-    }
+    Only records of the ``hik.events`` logger are rendered. It runs in the
+    logging listener thread, never in a request handler.
+    """
 
-    # Use rich Panel to output
-    console.print(Panel(Pretty(core_data, expand_all=True), title=header_text))
+    def __init__(self, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.addFilter(lambda record: record.name == event_logger.name and hasattr(record, "fields"))
 
-    # Additionally log to standard logger if needed
-    logging.info(f"[Heartbeat] at {heartbeat.date_time}")
\ No newline at end of file
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            fields = dict(record.fields)
+            event_type = fields.pop("event_type", "")
+            if event_type == "heartBeat":
+                header_text = Text("💓 Heartbeat Event", style="bold green")
+            else:
+                header_text = Text(f"📡 Event Type: {event_type}", style="bold cyan")
+            header_text.append(f" | 📅 Time: {fields.get('date_time')}", style="dim")
+            console.print(Panel(Pretty(fields, expand_all=True), title=header_text))
+        except Exception:
+            self.handleError(record)